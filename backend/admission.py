@@ -0,0 +1,271 @@
+"""
+Admission control: per-client rate limits and per-route-class concurrency
+caps, so a burst on one kind of route cannot starve the others.
+
+Every API request is put in a route class by method and path. A class
+has a token bucket per client (429 with ``Retry-After`` when it is
+empty) and a cap on requests in flight; requests over the cap wait in a
+short queue, and are shed with 503 once the queue is full or they have
+waited ``max_wait`` seconds. Shedding early keeps the event loop free for
+the classes that are within their limits, so catalog reads keep their
+latency while a misbehaving status client is throttled.
+
+Status check writes are bucketed by client IP and the ``client_name`` in
+their body, so clients behind one address get a rate each, plus a larger
+bucket per IP so that changing the name on every request gains little.
+Their bodies are read before the app sees them and are capped at
+``MAX_KEYED_BODY`` (413 past it). Everything else is bucketed by client
+IP. Catalog reads are cheap and usually cached, so they have a
+concurrency cap but no per-client rate. Image requests can wait on a
+remote origin for seconds on a cache miss, so they have slots of their
+own and cannot hold the catalog's. Admin calls (backups) are heavy
+and rare: two at a time, a few per minute per client. Limits are per
+process.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from metrics import Counter, Gauge, registry
+from serialization import dumps, loads
+
+# Clients whose buckets are remembered; the least recently seen are forgotten (with a full bucket)
+MAX_CLIENTS = 10_000
+# Status check bodies are a client name; larger ones are refused rather than buffered
+MAX_KEYED_BODY = 4096
+
+ADMITTED = registry.register(Counter(
+    "admission_admitted_total", "Requests admitted by admission control", ("route_class",)))
+REJECTED = registry.register(Counter(
+    "admission_rejected_total", "Requests turned away by admission control", ("route_class", "reason")))
+IN_FLIGHT = registry.register(Gauge(
+    "admission_in_flight", "Admitted requests in progress", ("route_class",)))
+QUEUED = registry.register(Gauge(
+    "admission_queued", "Requests waiting for a slot", ("route_class",)))
+
+
+class RouteClass(NamedTuple):
+    name: str
+    max_in_flight: int
+    # Requests allowed to wait for a slot; more are shed at once
+    max_queued: int
+    # Longest wait for a slot before the request is shed
+    max_wait: float
+    # Per-client requests per second and bucket size; 0 disables the per-client limit
+    rate: float = 0.0
+    burst: float = 0.0
+    # "ip", or "client_name" to key buckets on the client IP and the status check's client
+    client_key: str = "ip"
+    # With client_key "client_name": the limit for all names from one IP together
+    ip_rate: float = 0.0
+    ip_burst: float = 0.0
+
+
+ROUTE_CLASSES: Dict[str, RouteClass] = {
+    c.name: c for c in (
+        RouteClass("catalog", max_in_flight=256, max_queued=1024, max_wait=1.0),
+        # A miss holds its slot for the origin fetch (up to its timeout); hits are quick file sends
+        RouteClass("images", max_in_flight=64, max_queued=256, max_wait=2.0, rate=30, burst=120),
+        RouteClass("write", max_in_flight=32, max_queued=128, max_wait=2.0, rate=20, burst=40),
+        RouteClass("status_write", max_in_flight=16, max_queued=64, max_wait=0.5, rate=2, burst=10,
+                   client_key="client_name", ip_rate=20, ip_burst=50),
+        RouteClass("status_read", max_in_flight=4, max_queued=8, max_wait=1.0, rate=2, burst=10),
+        RouteClass("admin", max_in_flight=2, max_queued=4, max_wait=5.0, rate=0.1, burst=3),
+        # Held for the life of the connection; the rate limits reconnect storms
+        RouteClass("stream", max_in_flight=10_000, max_queued=0, max_wait=0.0, rate=1, burst=5),
+    )
+}
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Route class name for a request, or None for routes that are never limited"""
+    if method == "OPTIONS":
+        return None
+    if path.startswith("/api/status"):
+        return "status_write" if method == "POST" else "status_read"
+    if path.startswith("/api/changes"):
+        return "stream"
+    if path.startswith("/api/admin"):
+        return "admin"
+    if path.startswith("/api/images"):
+        return "images"
+    if path.startswith(("/api/destinations", "/api/itineraries")):
+        return "catalog" if method in ("GET", "HEAD") else "write"
+    return None
+
+
+class TokenBuckets:
+    """Token bucket per client, refilled lazily when the client is next seen"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, client: Hashable, now: float) -> float:
+        """Spend a token; returns 0, or the seconds until a token is available"""
+        tokens, stamp = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class Slots:
+    """Concurrency cap with a bounded FIFO of waiters"""
+
+    def __init__(self, route_class: RouteClass):
+        self.route_class = route_class
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot; returns None, or the reason the request is shed"""
+        route_class = self.route_class
+        if self.in_flight < route_class.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return None
+        if len(self._waiters) >= route_class.max_queued:
+            return "queue_full"
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        QUEUED.inc(route_class.name)
+        try:
+            await asyncio.wait_for(waiter, route_class.max_wait)
+            return None
+        except asyncio.TimeoutError:
+            # release() may have handed over the slot just as the wait expired
+            if waiter.done() and not waiter.cancelled():
+                return None
+            return "queue_timeout"
+        except asyncio.CancelledError:
+            # The client went away; pass on a slot that was already handed over
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            QUEUED.dec(route_class.name)
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        # Hand the slot straight to the oldest waiter still waiting
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class AdmissionController:
+    """Buckets and slots for each route class"""
+
+    def __init__(self, classes: Dict[str, RouteClass] = ROUTE_CLASSES):
+        self.classes = classes
+        self.slots = {name: Slots(c) for name, c in classes.items()}
+        self.buckets = {name: TokenBuckets(c.rate, c.burst) for name, c in classes.items() if c.rate > 0}
+        self.ip_buckets = {name: TokenBuckets(c.ip_rate, c.ip_burst) for name, c in classes.items() if c.ip_rate > 0}
+
+
+def _client_ip(scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _client_name(body: bytes) -> Optional[str]:
+    try:
+        name = loads(body).get("client_name")
+    except Exception:
+        return None
+    return name if isinstance(name, str) else None
+
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            return int(value) if value.isdigit() else None
+    return None
+
+
+async def _reject(send, status: int, retry_after: Optional[float], detail: str) -> None:
+    headers = [(b"content-type", b"application/json")]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(max(1, math.ceil(retry_after))).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": dumps({"detail": detail})})
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying an ``AdmissionController`` to API requests"""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or AdmissionController()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        name = classify(scope["method"], scope["path"])
+        if name is None or name not in self.controller.classes:
+            return await self.app(scope, receive, send)
+        route_class = self.controller.classes[name]
+
+        buckets = self.controller.buckets.get(name)
+        if buckets is not None:
+            ip = _client_ip(scope)
+            client: Hashable = ip
+            if route_class.client_key == "client_name":
+                # The body is read here to find the client, then replayed to the app
+                too_large = (_content_length(scope) or 0) > MAX_KEYED_BODY
+                messages: List[dict] = []
+                size = 0
+                more = not too_large
+                while more:
+                    message = await receive()
+                    messages.append(message)
+                    size += len(message.get("body", b""))
+                    too_large = size > MAX_KEYED_BODY
+                    more = not too_large and message["type"] == "http.request" and message.get("more_body", False)
+                if too_large:
+                    REJECTED.inc(name, "too_large")
+                    return await _reject(send, 413, None, "Request body too large")
+                client_name = _client_name(b"".join(m.get("body", b"") for m in messages))
+                if client_name is not None:
+                    client = (ip, client_name)
+                replay = iter(messages)
+
+                async def receive(original=receive):
+                    return next(replay, None) or await original()
+
+            now = time.monotonic()
+            wait = buckets.take(client, now)
+            ip_buckets = self.controller.ip_buckets.get(name)
+            if not wait and ip_buckets is not None:
+                wait = ip_buckets.take(ip, now)
+            if wait:
+                REJECTED.inc(name, "rate_limited")
+                return await _reject(send, 429, wait, "Too many requests")
+
+        slots = self.controller.slots[name]
+        reason = await slots.acquire()
+        if reason is not None:
+            REJECTED.inc(name, reason)
+            return await _reject(send, 503, route_class.max_wait, "Server busy")
+        ADMITTED.inc(name)
+        IN_FLIGHT.inc(name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            IN_FLIGHT.dec(name)
+            slots.release()
@@ -0,0 +1,336 @@
+"""
+Online backups of the SQLite database, and restoring from them.
+
+A backup copies the live database with SQLite's backup API, a few hundred
+pages per step with a short sleep in between, so other connections keep
+getting the database between steps. If writers keep restarting the copy,
+the rest is copied in one step. In WAL mode that is a single read
+transaction, which does not block writers.
+
+Each copy is checked with ``PRAGMA quick_check`` and written next to a
+JSON manifest holding its SHA-256. Only the newest ``BACKUP_KEEP`` copies
+are kept.
+
+Backups run every ``BACKUP_INTERVAL_SECONDS`` with the other background
+jobs, and on demand through ``POST /api/admin/backups``. Every worker
+runs the schedule, but a backup is only taken under a lock on the backup
+directory and only when the newest one is older than the interval, so N
+workers still make one backup per interval. An on-demand backup is
+refused while the newest is younger than ``BACKUP_MIN_AGE_SECONDS``, so
+repeated calls cannot rotate every older backup out of retention.
+
+A new node can start from a backup instead of running ``seed_data.py``.
+Set ``SQLITE_RESTORE_FROM`` to a backup file, or to a backup directory
+for its newest copy, and the server restores it when the database file
+does not exist yet. To restore by hand, stop the server and run:
+
+    python backup.py restore backups/travel-20250101T000000000000Z.db
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from metrics import Counter, Gauge, registry
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+BACKUP_DIR = ROOT_DIR / "backups"
+BACKUP_KEEP = 7
+BACKUP_INTERVAL_SECONDS = 6 * 60 * 60
+# On-demand backups are refused while the newest backup is younger than this
+BACKUP_MIN_AGE_SECONDS = 5 * 60
+# A scheduled backup is skipped when another worker made one this recently (fraction of the
+# interval; the slack covers wall-clock adjustments between the two workers' timers)
+SCHEDULE_MIN_AGE = 0.9
+# Pages copied per backup step (4 KiB each by default), then the source is released for STEP_SLEEP
+PAGES_PER_STEP = 256
+STEP_SLEEP_SECONDS = 0.005
+# Restarts caused by concurrent writes before the remainder is copied in one step
+MAX_RESTARTS = 3
+
+BACKUPS = registry.register(Counter("backups_total", "Database backups by outcome", ("result",)))
+LAST_BACKUP = registry.register(Gauge(
+    "backup_last_success_timestamp_seconds", "Unix time the last successful backup finished"))
+LAST_BACKUP_SECONDS = registry.register(Gauge(
+    "backup_last_duration_seconds", "Time the last successful backup took"))
+LAST_BACKUP_BYTES = registry.register(Gauge(
+    "backup_last_bytes", "Size of the last successful backup"))
+
+
+class BackupInfo(NamedTuple):
+    name: str
+    sha256: str
+    bytes: int
+    pages: int
+    created: str
+    seconds: float
+
+
+class BackupError(Exception):
+    """A backup failed verification or could not be found"""
+
+
+class BackupTooRecent(BackupError):
+    """The newest backup is younger than the minimum age, so none was made"""
+
+    def __init__(self, newest: BackupInfo, retry_after: float):
+        super().__init__(f"Newest backup {newest.name} is too recent; try again in {retry_after:.0f}s")
+        self.newest = newest
+        self.retry_after = retry_after
+
+
+class _Restarted(Exception):
+    pass
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_path(path: Path) -> Path:
+    return path.with_suffix(".json")
+
+
+def _copy(source: sqlite3.Connection, target: sqlite3.Connection) -> None:
+    remaining = None
+    restarts = 0
+
+    def progress(status: int, left: int, total: int) -> None:
+        nonlocal remaining, restarts
+        # The copy starts over when another connection writes to the source
+        if remaining is not None and left > remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted()
+        remaining = left
+
+    try:
+        source.backup(target, pages=PAGES_PER_STEP, progress=progress, sleep=STEP_SLEEP_SECONDS)
+    except _Restarted:
+        logger.info(f"Backup restarted {restarts} times under concurrent writes; copying the rest in one step")
+        source.backup(target)
+
+
+def create_backup(source_path: Path, backup_dir: Path = BACKUP_DIR, keep: int = BACKUP_KEEP) -> BackupInfo:
+    """Copy the live database at ``source_path`` into ``backup_dir`` (blocking; run it in a thread)"""
+    started = time.perf_counter()
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now(timezone.utc)
+    path = backup_dir / f"{Path(source_path).stem}-{now.strftime('%Y%m%dT%H%M%S%fZ')}.db"
+    partial = path.with_name(path.name + ".tmp")
+
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(partial)
+    try:
+        _copy(source, target)
+        # A self-contained file: no -wal next to it to lose when it is copied around
+        target.execute("PRAGMA journal_mode=DELETE")
+        pages = target.execute("PRAGMA page_count").fetchone()[0]
+        problems = target.execute("PRAGMA quick_check").fetchone()[0]
+        if problems != "ok":
+            raise BackupError(f"Backup failed its integrity check: {problems}")
+    except Exception:
+        target.close()
+        partial.unlink(missing_ok=True)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    os.replace(partial, path)
+    info = BackupInfo(
+        name=path.name,
+        sha256=file_sha256(path),
+        bytes=path.stat().st_size,
+        pages=pages,
+        created=now.isoformat(),
+        seconds=round(time.perf_counter() - started, 3),
+    )
+    _manifest_path(path).write_bytes(dumps(info._asdict()))
+    rotate_backups(backup_dir, keep)
+    return info
+
+
+def list_backups(backup_dir: Path = BACKUP_DIR) -> List[BackupInfo]:
+    """Backups with a manifest, newest first"""
+    found = []
+    for manifest in backup_dir.glob("*.json"):
+        try:
+            info = BackupInfo(**loads(manifest.read_bytes()))
+        except (OSError, ValueError, TypeError):
+            continue
+        if (backup_dir / info.name).exists():
+            found.append(info)
+    return sorted(found, key=lambda info: info.created, reverse=True)
+
+
+def backup_age(info: BackupInfo) -> float:
+    """Seconds since ``info`` was taken"""
+    return (datetime.now(timezone.utc) - datetime.fromisoformat(info.created)).total_seconds()
+
+
+def rotate_backups(backup_dir: Path = BACKUP_DIR, keep: int = BACKUP_KEEP) -> None:
+    for info in list_backups(backup_dir)[keep:]:
+        path = backup_dir / info.name
+        path.unlink(missing_ok=True)
+        _manifest_path(path).unlink(missing_ok=True)
+
+
+def verify_backup(path: Path) -> BackupInfo:
+    """The manifest of the backup at ``path``, once its checksum matches"""
+    try:
+        info = BackupInfo(**loads(_manifest_path(path).read_bytes()))
+    except (OSError, ValueError, TypeError) as e:
+        raise BackupError(f"No usable manifest for {path}: {e}") from e
+    if file_sha256(path) != info.sha256:
+        raise BackupError(f"{path} does not match its checksum")
+    return info
+
+
+def resolve_backup(location: Path) -> Path:
+    """``location`` itself, or the newest backup when it is a directory"""
+    if location.is_dir():
+        backups = list_backups(location)
+        if not backups:
+            raise BackupError(f"No backups in {location}")
+        return location / backups[0].name
+    return location
+
+
+def restore_backup(backup: Path, target_path: Path) -> BackupInfo:
+    """
+    Replace the database at ``target_path`` with a verified backup. Nothing
+    may have the target open: stop the server first.
+    """
+    backup = resolve_backup(backup)
+    info = verify_backup(backup)
+    target_path = Path(target_path)
+    partial = target_path.with_name(target_path.name + ".restore")
+    shutil.copyfile(backup, partial)
+    # A WAL left over from the old database must not be replayed onto the restored one
+    for suffix in ("-wal", "-shm"):
+        Path(f"{target_path}{suffix}").unlink(missing_ok=True)
+    os.replace(partial, target_path)
+    return info
+
+
+def warm_start(target_path: Path, restore_from: Optional[str]) -> Optional[BackupInfo]:
+    """Restore ``restore_from`` into ``target_path`` if the database does not exist yet"""
+    if not restore_from or Path(target_path).exists():
+        return None
+    info = restore_backup(Path(restore_from), target_path)
+    logger.info(f"Restored {target_path} from backup {info.name} ({info.created})")
+    return info
+
+
+def backup_dir() -> Path:
+    return Path(os.environ.get("BACKUP_DIR", BACKUP_DIR))
+
+
+_running: Optional[asyncio.Lock] = None
+
+
+async def backup_now(source_path: Path, min_age: float = 0) -> BackupInfo:
+    """
+    Back up ``source_path`` without blocking the event loop. One backup
+    runs at a time across every worker sharing the backup directory, and
+    with ``min_age`` none is made while the newest is younger than that
+    (``BackupTooRecent``); the check runs under the same lock.
+    """
+    global _running
+    if _running is None:
+        _running = asyncio.Lock()
+    directory = backup_dir()
+    keep = int(os.environ.get("BACKUP_KEEP", BACKUP_KEEP))
+    async with _running:
+        directory.mkdir(parents=True, exist_ok=True)
+        lock = open(directory / ".lock", "a+")
+        try:
+            await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX)
+            if min_age > 0:
+                backups = await asyncio.to_thread(list_backups, directory)
+                if backups and backup_age(backups[0]) < min_age:
+                    raise BackupTooRecent(backups[0], min_age - backup_age(backups[0]))
+            info = await asyncio.to_thread(create_backup, source_path, directory, keep)
+        except BackupTooRecent:
+            BACKUPS.inc("skipped")
+            raise
+        except Exception:
+            BACKUPS.inc("failed")
+            raise
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+    BACKUPS.inc("succeeded")
+    LAST_BACKUP.set(time.time())
+    LAST_BACKUP_SECONDS.set(info.seconds)
+    LAST_BACKUP_BYTES.set(info.bytes)
+    logger.info(f"Backed up {source_path} to {info.name} ({info.bytes} bytes) in {info.seconds:.2f}s")
+    return info
+
+
+async def run_backups(source_path: Path, interval: Optional[float] = None) -> None:
+    """
+    Back up ``source_path`` every ``interval`` seconds, forever. Workers
+    that share the backup directory skip their turn when another worker
+    already made a backup within the interval.
+    """
+    interval = interval or float(os.environ.get("BACKUP_INTERVAL_SECONDS", BACKUP_INTERVAL_SECONDS))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await backup_now(source_path, min_age=interval * SCHEDULE_MIN_AGE)
+        except BackupTooRecent as e:
+            logger.debug(f"Skipping scheduled backup: {e}")
+        except Exception as e:
+            logger.error(f"Error backing up database: {e}")
+
+
+def start_backups(source_path: Path) -> Optional[asyncio.Task]:
+    """Schedule periodic backups; BACKUP_INTERVAL_SECONDS=0 turns them off"""
+    if float(os.environ.get("BACKUP_INTERVAL_SECONDS", BACKUP_INTERVAL_SECONDS)) <= 0:
+        return None
+    return asyncio.get_running_loop().create_task(run_backups(source_path))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Back up or restore the SQLite database")
+    parser.add_argument("--db", default=os.environ.get("SQLITE_PATH", str(DB_PATH)))
+    parser.add_argument("--dir", default=str(backup_dir()), help="backup directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="back up the database now (safe while the server runs)")
+    commands.add_parser("list", help="list backups, newest first")
+    verify = commands.add_parser("verify", help="check a backup against its checksum")
+    verify.add_argument("backup")
+    restore = commands.add_parser("restore", help="replace the database with a backup (stop the server first)")
+    restore.add_argument("backup", help="backup file, or a backup directory for its newest backup")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        print(dumps(create_backup(Path(args.db), Path(args.dir), int(os.environ.get("BACKUP_KEEP", BACKUP_KEEP)))._asdict()).decode())
+    elif args.command == "list":
+        for info in list_backups(Path(args.dir)):
+            print(f"{info.name}  {info.bytes:>12}  {info.created}  {info.sha256[:16]}")
+    elif args.command == "verify":
+        print(f"{verify_backup(Path(args.backup)).name}: ok")
+    else:
+        print(f"Restored {restore_backup(Path(args.backup), Path(args.db)).name} into {args.db}")
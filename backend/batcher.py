@@ -0,0 +1,142 @@
+"""Group-commit write batching on top of the SQLite connection pool"""
+
+import asyncio
+import logging
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (inclusive) of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+_STOP = object()
+
+
+class WriteBatcher:
+    """
+    Gathers concurrent writes into one transaction.
+
+    ``submit`` enqueues a row and resolves only after the transaction that
+    contains it has committed. A single background task drains the queue:
+    it takes whatever is waiting, lingers up to ``linger_ms`` for more rows
+    if the batch is not full, then writes the batch with one commit.
+    """
+
+    def __init__(
+        self,
+        pool,
+        write_batch: Callable[[sqlite3.Connection, Sequence[Any]], None],
+        max_batch_size: int = 64,
+        linger_ms: float = 5.0,
+    ):
+        self.pool = pool
+        self.write_batch = write_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.linger = max(0.0, linger_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.batches = 0
+        self.rows = 0
+        self.failed_batches = 0
+        self.largest_batch = 0
+        self.size_histogram: Dict[int, int] = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+        self.size_histogram_overflow = 0
+
+    def _ensure_started(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        return self._queue
+
+    async def submit(self, row: Any) -> None:
+        """Queue ``row`` and wait until it is committed"""
+        queue = self._ensure_started()
+        future = self._loop.create_future()
+        queue.put_nowait((row, future))
+        await future
+
+    def _drain(self, batch: List[Tuple[Any, asyncio.Future]]) -> bool:
+        """Move queued rows into ``batch``; returns False once stop was requested"""
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return True
+            if item is _STOP:
+                return False
+            batch.append(item)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            running = self._drain(batch)
+            if running and len(batch) < self.max_batch_size and self.linger:
+                await asyncio.sleep(self.linger)
+                running = self._drain(batch)
+            await self._flush(batch)
+            if not running:
+                return
+
+    async def _flush(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        rows = [row for row, _ in batch]
+        try:
+            await self.pool.run(self.write_batch, rows)
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(f"Error writing batch of {len(rows)} rows: {e}")
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            # Retry row by row so one bad row only fails its own request
+            for item in batch:
+                await self._flush([item])
+            return
+
+        self._record(len(rows))
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    def _record(self, size: int) -> None:
+        self.batches += 1
+        self.rows += size
+        self.largest_batch = max(self.largest_batch, size)
+        for bound in BATCH_SIZE_BUCKETS:
+            if size <= bound:
+                self.size_histogram[bound] += 1
+                return
+        self.size_histogram_overflow += 1
+
+    def stats(self) -> Dict[str, Any]:
+        histogram = {str(bound): count for bound, count in self.size_histogram.items()}
+        histogram["+Inf"] = self.size_histogram_overflow
+        return {
+            "max_batch_size": self.max_batch_size,
+            "linger_ms": self.linger * 1000,
+            "batches": self.batches,
+            "rows": self.rows,
+            "failed_batches": self.failed_batches,
+            "largest_batch": self.largest_batch,
+            "average_batch": round(self.rows / self.batches, 2) if self.batches else 0,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size_histogram": histogram,
+        }
+
+    async def close(self) -> None:
+        """Flush whatever is queued and stop the background task"""
+        if self._task is None or self._task.done():
+            self._task = None
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
@@ -0,0 +1 @@
+"""Micro- and load benchmarks for the backend; run modules with ``python -m benchmarks.<name>``"""
@@ -0,0 +1,91 @@
+"""
+Synthetic catalog data at benchmark scale.
+
+Documents are built from the shapes and vocabulary of the seed list in
+``seed_data.py`` and come out exactly as the storage layer returns them.
+Generation is deterministic for a given seed, so runs are comparable.
+"""
+
+import random
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Sequence
+
+from normalize import normalize_destination, normalize_itinerary
+from seed_data import destinations_data
+from storage.base import Document, new_id
+
+SCALES = {"10": 10, "10k": 10_000, "1m": 1_000_000}
+# Itineraries generated per destination
+ITINERARY_RATIO = 0.1
+
+LOCATIONS = sorted({d["location"] for d in destinations_data})
+ACTIVITIES = sorted({a for d in destinations_data for a in d["activities"]} | {
+    "Parasailing", "Jet Skiing", "Trekking", "Photography", "Shopping", "Yoga",
+})
+BEST_TIMES = sorted({d["bestTime"] for d in destinations_data} | {"All year", "June to September"})
+PRICES = ["₹", "₹₹", "₹₹₹"]
+IMAGES = [d["image"] for d in destinations_data]
+NAME_WORDS = sorted({w for d in destinations_data for w in d["name"].split()} | {
+    "Cove", "Point", "Falls", "Market", "Church", "Lighthouse", "Lagoon", "Village",
+})
+# Destinations are scattered over roughly the Indian mainland
+LAT_RANGE = (8.0, 35.0)
+LON_RANGE = (68.0, 97.0)
+DESCRIPTION_WORDS = sorted({w.strip(".,").lower() for d in destinations_data for w in d["description"].split()})
+
+
+def parse_scale(value: str) -> int:
+    """``10``, ``10k``, ``1m`` or a plain number"""
+    value = value.lower()
+    if value in SCALES:
+        return SCALES[value]
+    if value[-1:] in ("k", "m"):
+        return int(float(value[:-1]) * (1_000 if value[-1] == "k" else 1_000_000))
+    return int(value)
+
+
+def iter_destinations(n: int, seed: int = 0) -> Iterator[Document]:
+    """``n`` destination documents, generated lazily"""
+    rng = random.Random(seed)
+    # Separate stream, so adding coordinates left the other fields unchanged
+    coordinates = random.Random(f"coordinates-{seed}")
+    start = datetime(2024, 1, 1)
+    for i in range(n):
+        yield normalize_destination({
+            "_id": new_id(),
+            "name": f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {i}",
+            "location": rng.choice(LOCATIONS),
+            "description": " ".join(rng.choice(DESCRIPTION_WORDS) for _ in range(rng.randint(15, 35))).capitalize() + ".",
+            "image": rng.choice(IMAGES),
+            "rating": round(rng.uniform(3.5, 5.0), 1),
+            "activities": rng.sample(ACTIVITIES, rng.randint(2, 5)),
+            "bestTime": rng.choice(BEST_TIMES),
+            "price": rng.choice(PRICES),
+            "createdAt": start + timedelta(seconds=i, microseconds=rng.randint(0, 999999)),
+            "updatedAt": start + timedelta(seconds=i),
+            "lat": round(coordinates.uniform(*LAT_RANGE), 5),
+            "lon": round(coordinates.uniform(*LON_RANGE), 5),
+        })
+
+
+def synthetic_destinations(n: int, seed: int = 0) -> List[Document]:
+    return list(iter_destinations(n, seed))
+
+
+def iter_itineraries(n: int, destination_ids: Sequence[str], seed: int = 0) -> Iterator[Document]:
+    """``n`` itineraries over ``destination_ids``, starting within the coming year"""
+    rng = random.Random(seed)
+    today = date.today()
+    created = datetime(2024, 6, 1)
+    for i in range(n):
+        start = today + timedelta(days=rng.randint(0, 365))
+        end = start + timedelta(days=rng.randint(0, 10))
+        yield normalize_itinerary({
+            "_id": new_id(),
+            "tripName": f"Trip {i}",
+            "startDate": start.isoformat(),
+            "endDate": end.isoformat(),
+            "destinations": rng.sample(destination_ids, min(len(destination_ids), rng.randint(2, 6))),
+            "budget": rng.choice(["", "Budget", "Mid-range", "Luxury"]),
+            "createdAt": created + timedelta(seconds=i),
+        })
@@ -0,0 +1,305 @@
+"""
+In-process load test of the API.
+
+Fills a scratch SQLite database with synthetic data at the chosen scale,
+drives ``server.app`` through httpx's ASGI transport (no sockets, fully
+offline) and reports throughput and latency percentiles per endpoint as
+JSON, so results can be diffed between commits.
+
+    python -m benchmarks.load --scale 10k --concurrency 32 --requests 2000 --output results.json
+
+``--flood status.create --admission`` measures how well the other routes
+hold up while one client floods the status endpoint.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from benchmarks.data import (
+    ACTIVITIES, DESCRIPTION_WORDS, ITINERARY_RATIO, LAT_RANGE, LOCATIONS, LON_RANGE,
+    iter_destinations, iter_itineraries, parse_scale,
+)
+
+WRITE_CHUNK = 5000
+# IDs kept in memory for building requests
+ID_SAMPLE = 10_000
+PERCENTILES = (50, 95, 99)
+
+Request = Tuple[str, str, Dict[str, Any]]
+
+
+class Endpoint(NamedTuple):
+    name: str
+    request: Callable[[random.Random, "Fixture"], Request]
+
+
+class Fixture(NamedTuple):
+    destination_ids: List[str]
+    itinerary_ids: List[str]
+
+
+ENDPOINTS = [
+    Endpoint("destinations.page", lambda rng, f: (
+        "GET", "/api/destinations", {"params": {"location": rng.choice(LOCATIONS), "limit": 50}})),
+    Endpoint("destinations.search", lambda rng, f: (
+        "GET", "/api/destinations", {"params": {"search": rng.choice(DESCRIPTION_WORDS)[:4], "limit": 20}})),
+    Endpoint("destinations.facets", lambda rng, f: (
+        "GET", "/api/destinations", {"params": {
+            "activity": rng.choice(ACTIVITIES), "month": rng.randint(1, 12), "include_facets": "true", "limit": 20,
+        }})),
+    Endpoint("destinations.nearby", lambda rng, f: (
+        "GET", "/api/destinations/nearby", {"params": {
+            "lat": round(rng.uniform(*LAT_RANGE), 3), "lon": round(rng.uniform(*LON_RANGE), 3), "radius_km": 100,
+        }})),
+    Endpoint("destinations.get", lambda rng, f: (
+        "GET", f"/api/destinations/{rng.choice(f.destination_ids)}", {})),
+    Endpoint("destinations.ids", lambda rng, f: (
+        "GET", "/api/destinations", {"params": {"ids": ",".join(rng.sample(f.destination_ids, min(20, len(f.destination_ids))))}})),
+    Endpoint("itineraries.page", lambda rng, f: (
+        "GET", "/api/itineraries", {"params": {"expand": "destinations", "limit": 20}})),
+    Endpoint("itineraries.get", lambda rng, f: (
+        "GET", f"/api/itineraries/{rng.choice(f.itinerary_ids)}", {})),
+    Endpoint("itineraries.create", lambda rng, f: (
+        "POST", "/api/itineraries", {"json": {
+            "tripName": f"bench-{rng.randint(0, 99)}", "startDate": "2025-01-10", "endDate": "2025-01-14",
+            "destinations": rng.sample(f.destination_ids, min(rng.randint(2, 6), len(f.destination_ids))),
+        }})),
+    Endpoint("status.create", lambda rng, f: (
+        "POST", "/api/status", {"json": {"client_name": f"bench-{rng.randint(0, 99)}"}})),
+]
+
+
+def _chunks(docs, size):
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert_itineraries(conn, docs: Sequence[Dict[str, Any]]) -> None:
+    from storage.sqlite import INSERT_ITINERARY, INSERT_ITINERARY_DESTINATION
+
+    conn.executemany(INSERT_ITINERARY, [
+        (d["_id"], d["tripName"], d["startDate"], d["endDate"], d["budget"], d["duration"],
+         d["createdAt"].isoformat(), d["durationDays"])
+        for d in docs
+    ])
+    conn.executemany(INSERT_ITINERARY_DESTINATION, [
+        (d["_id"], position, destination_id, None)
+        for d in docs for position, destination_id in enumerate(d["destinations"])
+    ])
+    conn.commit()
+
+
+def _sample_ids(conn, table: str) -> List[str]:
+    return [row[0] for row in conn.execute(f"SELECT id FROM {table} ORDER BY random() LIMIT ?", (ID_SAMPLE,))]
+
+
+async def populate(n: int, seed: int) -> None:
+    """Write ``n`` destinations and their share of itineraries into the configured database"""
+    from database import get_pool
+    from storage import get_destination_repository
+
+    repo = get_destination_repository()
+    sample: List[str] = []
+    for chunk in _chunks(iter_destinations(n, seed), WRITE_CHUNK):
+        await repo.bulk_write(chunk)
+        sample.extend(doc["_id"] for doc in chunk[: max(1, ID_SAMPLE * WRITE_CHUNK // max(n, 1))])
+    itineraries = iter_itineraries(max(1, int(n * ITINERARY_RATIO)), sample, seed)
+    for chunk in _chunks(itineraries, WRITE_CHUNK):
+        await get_pool().run(_insert_itineraries, chunk)
+
+
+def summarize(latencies: List[float], statuses: Counter, wall: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    count = len(ordered)
+
+    def percentile(p: int) -> float:
+        # Nearest-rank percentile
+        return ordered[max(0, -(-p * count // 100) - 1)] * 1000 if ordered else 0.0
+
+    return {
+        "requests": count,
+        "errors": sum(n for status, n in statuses.items() if not 200 <= status < 400),
+        "status": {str(status): n for status, n in sorted(statuses.items())},
+        "throughput_rps": round(count / wall, 1) if wall else 0.0,
+        "latency_ms": {
+            **{f"p{p}": round(percentile(p), 3) for p in PERCENTILES},
+            "mean": round(sum(ordered) / count * 1000, 3) if count else 0.0,
+            "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        },
+    }
+
+
+async def run_endpoint(client, endpoint: Endpoint, fixture: Fixture, requests: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    """Issue ``requests`` calls from ``concurrency`` concurrent workers"""
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            method, url, kwargs = endpoint.request(rng, fixture)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+            except Exception:
+                status = 599
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+async def flood(app, endpoint: Endpoint, fixture: Fixture, concurrency: int, seed: int, stop: asyncio.Event) -> Counter:
+    """Call ``endpoint`` as fast as possible from a second client address until ``stop`` is set"""
+    import httpx
+
+    rng = random.Random(seed)
+    statuses: Counter = Counter()
+    transport = httpx.ASGITransport(app=app, client=("10.0.0.2", 123))
+    async with httpx.AsyncClient(transport=transport, base_url="http://flood") as client:
+        async def worker():
+            while not stop.is_set():
+                method, url, kwargs = endpoint.request(rng, fixture)
+                try:
+                    response = await client.request(method, url, **kwargs)
+                    status = response.status_code
+                except Exception:
+                    status = 599
+                statuses[status] += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return statuses
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    from config import AppConfig
+    from database import get_pool
+    from server import create_app
+
+    app = create_app(AppConfig(sqlite_path=args.db, background_jobs=False, admission_control=args.admission))
+    async with app.router.lifespan_context(app):
+        if not args.populated:
+            started = time.perf_counter()
+            await populate(args.count, args.seed)
+            print(f"Generated {args.count} destinations in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        with get_pool().connection() as conn:
+            fixture = Fixture(_sample_ids(conn, "destinations"), _sample_ids(conn, "itineraries"))
+        results = await run_endpoints(app, args, fixture)
+    return {
+        "meta": {
+            "scale": args.count,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "seed": args.seed,
+            "catalog_cache": not args.cold,
+            "admission_control": args.admission,
+            "flood": args.flood,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "endpoints": results,
+    }
+
+
+async def run_endpoints(app, args, fixture: Fixture) -> Dict[str, Any]:
+    import httpx
+
+    endpoints = [e for e in ENDPOINTS if not args.endpoints or e.name in args.endpoints]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for i, endpoint in enumerate(endpoints):
+            # Warm-up builds lazy indexes and fills statement caches
+            await run_endpoint(client, endpoint, fixture, args.warmup, 1, args.seed + i)
+            stop = asyncio.Event()
+            flooding = None
+            if args.flood:
+                flood_endpoint = next(e for e in ENDPOINTS if e.name == args.flood)
+                flooding = asyncio.create_task(
+                    flood(app, flood_endpoint, fixture, args.flood_concurrency, args.seed + i, stop)
+                )
+            results[endpoint.name] = await run_endpoint(
+                client, endpoint, fixture, args.requests, args.concurrency, args.seed + i
+            )
+            summary = results[endpoint.name]
+            if flooding is not None:
+                stop.set()
+                summary["flood"] = {"endpoint": args.flood, "status": {str(k): v for k, v in sorted((await flooding).items())}}
+            print(
+                f"{endpoint.name:<22} {summary['throughput_rps']:>9.1f} req/s  "
+                f"p50 {summary['latency_ms']['p50']:.2f}  p95 {summary['latency_ms']['p95']:.2f}  "
+                f"p99 {summary['latency_ms']['p99']:.2f} ms  errors {summary['errors']}",
+                file=sys.stderr,
+            )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="In-process API load test")
+    parser.add_argument("--scale", default="10k", help="destinations to generate: 10, 10k, 1m or a number")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per endpoint")
+    parser.add_argument("--endpoints", nargs="*", help=f"subset of: {' '.join(e.name for e in ENDPOINTS)}")
+    parser.add_argument("--db", help="database file (default: a temporary file)")
+    parser.add_argument("--reuse", action="store_true", help="benchmark an already populated --db as is")
+    parser.add_argument("--cold", action="store_true", help="disable the catalog response cache")
+    parser.add_argument("--admission", action="store_true",
+                        help="enable admission control (off by default: every request comes from one client)")
+    parser.add_argument("--flood", choices=[e.name for e in ENDPOINTS],
+                        help="hammer this endpoint from another client while each endpoint is measured")
+    parser.add_argument("--flood-concurrency", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    args.count = parse_scale(args.scale)
+
+    scratch = None
+    if args.db is None:
+        scratch = tempfile.TemporaryDirectory(prefix="travel-bench-")
+        args.db = str(Path(scratch.name) / "bench.db")
+    elif not args.reuse and Path(args.db).exists():
+        parser.error(f"{args.db} exists; pass --reuse to benchmark it or choose a new path")
+    args.populated = Path(args.db).exists()
+
+    if args.cold:
+        os.environ["CATALOG_CACHE_ENTRIES"] = "0"
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    try:
+        report = asyncio.run(benchmark(args))
+    finally:
+        if scratch is not None:
+            scratch.cleanup()
+
+    body = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(body + "\n")
+    else:
+        print(body)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Serialization cost per 1k destinations: FastAPI's response_model path, the
+TypeAdapter validate-then-dump path the routes used, and the trusted fast path.
+
+    python -m benchmarks.serialization [--count 1000] [--repeat 50]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Callable, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import TypeAdapter
+
+from benchmarks.data import synthetic_destinations
+from models import Destination
+from serialization import orjson, serializer_for
+
+
+def best_of(fn: Callable[[], bytes], repeat: int) -> float:
+    """Fastest of ``repeat`` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000, help="destinations per response")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    docs = synthetic_destinations(args.count)
+    field = create_response_field(name="Response_destinations", type_=List[Destination], mode="serialization")
+    adapter = TypeAdapter(List[Destination])
+    serializer = serializer_for(Destination)
+
+    def response_model() -> bytes:
+        content = asyncio.run(serialize_response(field=field, response_content=docs))
+        return JSONResponse(content).body
+
+    def validate_dump() -> bytes:
+        return adapter.dump_json(adapter.validate_python(docs), by_alias=True)
+
+    def trusted() -> bytes:
+        return serializer.encode_many(docs)
+
+    baseline = validate_dump()
+    assert trusted() == baseline, "fast path changed the wire format"
+    assert json.loads(response_model()) == json.loads(baseline)
+
+    encoder = "orjson" if orjson is not None else "json (orjson not installed)"
+    print(f"{args.count} destinations, {len(baseline) / 1024:.0f} KiB, encoder: {encoder}")
+    results = {}
+    for name, fn in [("response_model", response_model), ("validate+dump_json", validate_dump), ("trusted", trusted)]:
+        results[name] = best_of(fn, args.repeat) * 1000 / args.count * 1000
+        print(f"  {name:<20} {results[name]:8.2f} ms per 1k")
+    print(f"  speedup vs response_model: {results['response_model'] / results['trusted']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Keeps process-local views of the destination catalog coherent with writes
+
+Every code path that writes destinations calls ``destinations_written``
+once the write has committed, so caches and in-memory indexes are updated
+in one place. Views in modules that load lazily subscribe with ``on_write``.
+
+With a catalog snapshot (``use_snapshot``, for multi-worker deployments)
+the facet index and ID lookups are served from a file shared by every
+worker instead, and writes publish a new version of it.
+"""
+
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from catalog_cache import get_catalog_cache
+from destination_ids import add_destination_ids, get_destination_ids, reset_destination_ids
+from facets import FacetIndex, add_to_facet_index, get_facet_index, reset_facet_index
+from geo import add_to_geo_index, get_geo_index, reset_geo_index
+from storage import get_destination_repository, use_read_layer
+from storage.base import Document
+
+_snapshots = None
+# Called like ``destinations_written``: the inserted documents, or None when the change is unknown
+_listeners: List[Callable[[Optional[List[Document]]], None]] = []
+
+
+def on_write(listener: Callable[[Optional[List[Document]]], None]):
+    """Register ``listener`` to hear about every catalog write; usable as a decorator"""
+    _listeners.append(listener)
+    return listener
+
+
+def _notify(docs: Optional[List[Document]]) -> None:
+    for listener in _listeners:
+        listener(docs)
+
+
+def use_snapshot(path: Optional[str]) -> None:
+    """Serve catalog reads from the snapshot at ``path`` (None goes back to process-local indexes)"""
+    global _snapshots
+    from snapshot import SnapshotManager, SnapshotReads
+
+    cache = get_catalog_cache()
+    if path is None:
+        _snapshots = None
+        cache.refresh = None
+        use_read_layer(None)
+        return
+    # stream() is not served by the read layer, so publishing always reads storage
+    _snapshots = SnapshotManager(Path(path), lambda: get_destination_repository().stream())
+    _snapshots.on_swap(_snapshot_swapped)
+    cache.refresh = _snapshots.current
+    use_read_layer(lambda repo: SnapshotReads(repo, _snapshots))
+
+
+def _snapshot_swapped(snapshot) -> None:
+    # Another worker may have written; its changes are not known individually.
+    # Every worker maps the same file, so ETags name it rather than this process
+    get_catalog_cache().invalidate(shared_tag=f"s{snapshot.version}.{snapshot.identity:x}")
+    reset_geo_index()
+    _notify(None)
+
+
+async def publish_snapshot() -> None:
+    """Write a new snapshot from storage now"""
+    if _snapshots is None:
+        raise RuntimeError("No catalog snapshot configured")
+    await _snapshots.publish()
+
+
+async def facet_index() -> FacetIndex:
+    """The facet index from the current snapshot, or the process-local one"""
+    if _snapshots is not None:
+        snapshot = _snapshots.current()
+        if snapshot is None:
+            snapshot = await _snapshots.publish()
+        return snapshot.facets
+    return await get_facet_index()
+
+
+def destinations_written(docs: Optional[List[Document]] = None) -> None:
+    """
+    Record a committed catalog write. ``docs`` are newly inserted
+    destinations; pass None when rows were updated or the affected set is
+    unknown, and indexes are rebuilt from storage on next use.
+    """
+    get_catalog_cache().invalidate()
+    if docs is None:
+        reset_geo_index()
+    else:
+        add_destination_ids(docs)
+        add_to_geo_index(docs)
+    _notify(docs)
+    if _snapshots is not None:
+        _snapshots.schedule_publish()
+    elif docs is None:
+        reset_facet_index()
+    else:
+        add_to_facet_index(docs)
+
+
+async def warm_up() -> None:
+    """Build the in-memory indexes now rather than on the first request that needs them"""
+    from similar import get_similarity_index
+
+    await get_destination_ids()
+    await facet_index()
+    await get_geo_index()
+    await get_similarity_index()
+
+
+async def clear() -> None:
+    """Drop every process-local view; used when the app shuts down"""
+    if _snapshots is not None:
+        await _snapshots.close()
+    use_snapshot(None)
+    get_catalog_cache().invalidate()
+    reset_destination_ids()
+    reset_facet_index()
+    reset_geo_index()
+    _notify(None)
@@ -0,0 +1,170 @@
+"""Versioned in-process cache of serialized destination catalog responses"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+CACHE_MAX_ENTRIES = 512
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Let clients keep bodies but revalidate them with If-None-Match every time
+CACHE_CONTROL = "no-cache"
+
+
+class CacheEntry(NamedTuple):
+    etag: str
+    body: bytes
+    headers: Dict[str, str]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against ``etag`` (weak comparison)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CatalogCache:
+    """
+    LRU of pre-serialized response bodies keyed by request filters.
+
+    Every catalog write bumps ``version``; entries from older versions are
+    never served, and ETags embed the version so clients holding a current
+    ETag get a 304 without the body being looked up or serialized at all.
+
+    ``version`` counts this process's invalidations, so by default ETags
+    also carry a per-process epoch. A version invalidated with a shared tag
+    (naming the catalog snapshot every worker maps) uses that tag instead,
+    so all workers issue the same ETags for it and a 304 works whichever
+    worker answers the revalidation.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = 0
+        # Distinguishes versions issued by different processes/restarts
+        self._epoch = os.urandom(4).hex()
+        # (version, tag): the local version whose ETags use a tag every worker shares
+        self._shared: Optional[Tuple[int, str]] = None
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        # Called before every lookup; lets a shared snapshot invalidate this cache when it changes
+        self.refresh: Optional[Callable[[], Any]] = None
+
+    def etag(self, key: Hashable, version: Optional[int] = None) -> str:
+        version = self.version if version is None else version
+        shared = self._shared
+        generation = shared[1] if shared is not None and shared[0] == version else f"{self._epoch}-{version}"
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+        return f'"{generation}-{digest}"'
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        with self._lock:
+            found = self._entries.get(key)
+            if found is None or found[0] != self.version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return found[1]
+
+    def put(self, key: Hashable, version: int, body: bytes, headers: Optional[Dict[str, str]] = None) -> CacheEntry:
+        """
+        Store ``body`` as the response for ``key`` at ``version`` (the version
+        read before querying storage). If a write landed in between, the entry
+        is returned for this response but not kept.
+        """
+        entry = CacheEntry(self.etag(key, version), body, headers or {})
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if version != self.version:
+                return entry
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1].body)
+            self._entries[key] = (version, entry)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+        return entry
+
+    def invalidate(self, shared_tag: Optional[str] = None) -> int:
+        """
+        Bump the catalog version after a write; returns the new version.
+        ``shared_tag`` names the new catalog state the same way in every
+        worker, and replaces the per-process epoch in its ETags.
+        """
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._shared = (self.version, shared_tag) if shared_tag is not None else None
+            return self.version
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+_cache: Optional[CatalogCache] = None
+
+
+def get_catalog_cache() -> CatalogCache:
+    global _cache
+    if _cache is None:
+        _cache = CatalogCache(
+            int(os.environ.get("CATALOG_CACHE_ENTRIES", CACHE_MAX_ENTRIES)),
+            int(os.environ.get("CATALOG_CACHE_BYTES", CACHE_MAX_BYTES)),
+        )
+    return _cache
+
+
+async def cached_json_response(
+    request: Request,
+    key: Hashable,
+    load: Callable[[], Awaitable[Tuple[bytes, Dict[str, str]]]],
+) -> Response:
+    """
+    Serve ``key`` from the catalog cache, calling ``load`` for the serialized
+    body and extra headers on a miss. A matching If-None-Match short-circuits
+    to 304 before the cache is even consulted.
+    """
+    cache = get_catalog_cache()
+    if cache.refresh is not None:
+        cache.refresh()
+    version = cache.version
+    etag = cache.etag(key, version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        cache.not_modified += 1
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    entry = cache.get(key)
+    if entry is None:
+        body, headers = await load()
+        entry = cache.put(key, version, body, headers)
+    return Response(
+        entry.body,
+        media_type="application/json",
+        headers={"ETag": entry.etag, "Cache-Control": CACHE_CONTROL, **entry.headers},
+    )
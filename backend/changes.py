@@ -0,0 +1,138 @@
+"""
+In-process change log for destinations and itineraries, streamed to
+clients as server-sent events by ``GET /api/changes``.
+
+Every change gets the next sequence number, and its SSE frame is encoded
+once when it is appended, so fanning it out is a byte copy per
+subscriber. Subscribers do not poll: they all wait on one shared future,
+which each append resolves and replaces. A subscriber that wakes up sends
+everything after the last sequence number it sent, so a slow client
+catches up with one write instead of a queue per client.
+
+The log keeps the last ``CHANGE_LOG_SIZE`` changes. A client resumes by
+sending back the ID of the last event it saw (``Last-Event-ID``, which
+EventSource does on reconnect, or ``?since=``). If those changes were
+already dropped, or the ID is from another process or an earlier run,
+the client gets a ``reset`` event and should re-fetch its lists. Each
+worker process has its own log, so with several workers a client only
+sees the writes made through the worker it is connected to.
+"""
+
+import asyncio
+import itertools
+import secrets
+from collections import deque
+from typing import AsyncIterator, Deque, List, NamedTuple, Optional
+
+from metrics import registry
+
+CHANGE_LOG_SIZE = 4096
+# Comment line sent to idle streams so proxies keep the connection open
+HEARTBEAT_SECONDS = 15.0
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+class Change(NamedTuple):
+    seq: int
+    frame: bytes
+
+
+class ChangeLog:
+    """Bounded, sequence-numbered log of SSE frames with a shared wake-up for subscribers"""
+
+    def __init__(self, size: int = CHANGE_LOG_SIZE):
+        # Distinguishes this log's event IDs from those of another process or run
+        self.epoch = secrets.token_hex(4)
+        self.seq = 0
+        self.subscribers = 0
+        self._entries: Deque[Change] = deque(maxlen=size)
+        self._next: Optional[asyncio.Future] = None
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def parse_event_id(self, event_id: str) -> Optional[int]:
+        """The sequence number in an ID from this log; None for anything else"""
+        epoch, _, seq = event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        return int(seq)
+
+    def _frame(self, seq: int, event: str, data: bytes) -> bytes:
+        # ``data`` is compact JSON, which never spans lines
+        return b"id: %s\nevent: %s\ndata: %s\n\n" % (self.event_id(seq).encode(), event.encode(), data)
+
+    def append(self, event: str, data: bytes) -> int:
+        """Record a change and wake every subscriber; returns its sequence number"""
+        self.seq += 1
+        self._entries.append(Change(self.seq, self._frame(self.seq, event, data)))
+        if self._next is not None:
+            if not self._next.done():
+                self._next.set_result(None)
+            self._next = None
+        return self.seq
+
+    def since(self, seq: int) -> Optional[List[Change]]:
+        """Changes after ``seq``, oldest first; None if some of them were already dropped"""
+        if seq >= self.seq:
+            return []
+        if not self._entries or seq + 1 < self._entries[0].seq:
+            return None
+        first = self._entries[0].seq
+        # Sequence numbers are contiguous, so the position follows from the first one kept
+        return list(itertools.islice(self._entries, seq + 1 - first, None))
+
+    def _changed(self) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if self._next is None or self._next.get_loop() is not loop:
+            self._next = loop.create_future()
+        return self._next
+
+    async def stream(self, after: Optional[int]) -> AsyncIterator[bytes]:
+        """
+        SSE frames for every change after ``after``, then each new change
+        as it happens, until the client goes away. None starts from now.
+        """
+        self.subscribers += 1
+        try:
+            if after is None:
+                # An ID with no data is not an event, but is where EventSource resumes from
+                after = self.seq
+                yield b"id: %s\n\n" % self.event_id(after).encode()
+            seq = after
+            while True:
+                changes = self.since(seq)
+                if changes is None:
+                    seq = self.seq
+                    yield self._frame(seq, "reset", b'{"seq":%d}' % seq)
+                    continue
+                if changes:
+                    seq = changes[-1].seq
+                    yield b"".join(change.frame for change in changes)
+                    continue
+                # asyncio.wait leaves the shared future alone when the wait times out
+                done, _ = await asyncio.wait({self._changed()}, timeout=HEARTBEAT_SECONDS)
+                if not done:
+                    yield b": keep-alive\n\n"
+        finally:
+            self.subscribers -= 1
+
+
+_log = ChangeLog()
+
+
+def get_change_log() -> ChangeLog:
+    return _log
+
+
+def record_change(event: str, data: bytes) -> None:
+    """Append ``event`` with its JSON ``data`` to the change log"""
+    _log.append(event, data)
+
+
+@registry.collector
+def change_log_metrics():
+    yield "# TYPE change_log_sequence counter"
+    yield f"change_log_sequence {_log.seq}"
+    yield "# TYPE change_feed_subscribers gauge"
+    yield f"change_feed_subscribers {_log.subscribers}"
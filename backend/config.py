@@ -0,0 +1,54 @@
+"""Application settings for ``create_app``"""
+
+import os
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple
+
+DEFAULT_CORS_ORIGINS = ("http://localhost:3000", "http://127.0.0.1:3000")
+
+
+def _flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    # "sqlite" or "mongo"; the Mongo driver is imported only when selected
+    storage_backend: str = "sqlite"
+    # None uses the default travel.db next to the code
+    sqlite_path: Optional[str] = None
+    pool_size: Optional[int] = None
+    cors_origins: Tuple[str, ...] = DEFAULT_CORS_ORIGINS
+    # Periodic status-check retention
+    background_jobs: bool = True
+    # Build the facet index during startup instead of on the first facet query
+    warm_up: bool = False
+    # Shared catalog snapshot file; set for multi-worker deployments
+    snapshot_path: Optional[str] = None
+    # Per-client rate limits and per-route concurrency caps (see admission.py)
+    admission_control: bool = True
+    # Backup file (or directory, for its newest) to create the database from when it does not exist
+    restore_from: Optional[str] = None
+    # Bearer token for /api/admin; without one the admin API only answers loopback clients
+    admin_token: Optional[str] = None
+
+    @classmethod
+    def from_env(cls, **overrides) -> "AppConfig":
+        """Settings from environment variables (``.env`` is loaded by the server), then ``overrides``"""
+        origins = os.environ.get("CORS_ORIGINS")
+        config = cls(
+            storage_backend=os.environ.get("STORAGE_BACKEND", "sqlite").lower(),
+            sqlite_path=os.environ.get("SQLITE_PATH"),
+            pool_size=int(os.environ["SQLITE_POOL_SIZE"]) if os.environ.get("SQLITE_POOL_SIZE") else None,
+            cors_origins=tuple(o.strip() for o in origins.split(",") if o.strip()) if origins else DEFAULT_CORS_ORIGINS,
+            background_jobs=_flag("BACKGROUND_JOBS", True),
+            warm_up=_flag("WARM_UP", False),
+            snapshot_path=os.environ.get("CATALOG_SNAPSHOT") or None,
+            admission_control=_flag("ADMISSION_CONTROL", True),
+            restore_from=os.environ.get("SQLITE_RESTORE_FROM") or None,
+            admin_token=os.environ.get("ADMIN_TOKEN") or None,
+        )
+        return replace(config, **overrides)
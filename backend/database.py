@@ -0,0 +1,355 @@
+"""Shared SQLite data-access layer used by both API servers"""
+
+import asyncio
+import functools
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from collections import Counter
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from batcher import WriteBatcher
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+
+# SQLite connection settings
+DB_PATH = ROOT_DIR / "travel.db"
+POOL_SIZE = 8
+STATUS_BATCH_SIZE = 64
+STATUS_BATCH_LINGER_MS = 5.0
+STATUS_QUERY_LIMIT = 1000
+STATUS_PRUNE_CHUNK = 1000
+STATEMENT_CACHE_SIZE = 256
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS status_checks
+       (id TEXT PRIMARY KEY,
+        client_name TEXT,
+        timestamp TEXT)''',
+    "CREATE INDEX IF NOT EXISTS idx_status_checks_timestamp ON status_checks (timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_status_checks_client ON status_checks (client_name, timestamp)",
+    '''CREATE TABLE IF NOT EXISTS status_rollups
+       (minute TEXT NOT NULL,
+        client_name TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (minute, client_name)) WITHOUT ROWID''',
+]
+
+# Statements are kept as module constants so every call hits the
+# per-connection prepared statement cache
+INSERT_STATUS_CHECK = "INSERT INTO status_checks (id, client_name, timestamp) VALUES (?, ?, ?)"
+SELECT_STATUS_CHECKS = "SELECT id, client_name, timestamp, rowid FROM status_checks"
+UPSERT_STATUS_ROLLUP = (
+    "INSERT INTO status_rollups (minute, client_name, count) VALUES (?, ?, ?) "
+    "ON CONFLICT (minute, client_name) DO UPDATE SET count = count + excluded.count"
+)
+PRUNE_STATUS_CHECKS = (
+    "DELETE FROM status_checks WHERE rowid IN "
+    "(SELECT rowid FROM status_checks WHERE timestamp < ? LIMIT ?)"
+)
+PRUNE_STATUS_ROLLUPS = (
+    "DELETE FROM status_rollups WHERE (minute, client_name) IN "
+    "(SELECT minute, client_name FROM status_rollups WHERE minute < ? LIMIT ?)"
+)
+BACKFILL_STATUS_ROLLUPS = (
+    "INSERT INTO status_rollups (minute, client_name, count) "
+    "SELECT substr(timestamp, 1, 16), coalesce(client_name, ''), count(*) "
+    "FROM status_checks WHERE timestamp IS NOT NULL GROUP BY 1, 2"
+)
+
+# Rollup buckets are prefixes of the ISO-8601 minute key ("2024-01-31T12:34")
+ROLLUP_BUCKETS = {"minute": 16, "hour": 13, "day": 10}
+
+
+def _configure(conn: sqlite3.Connection) -> None:
+    """Apply per-connection pragmas"""
+    conn.execute("PRAGMA journal_mode=WAL")
+    # FULL keeps every commit durable across power loss; write batching
+    # amortizes the extra fsync over a whole group of rows
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections.
+
+    Blocking work is offloaded to a dedicated thread pool of the same size,
+    so async handlers never touch sqlite3 on the event loop and a worker
+    thread never waits for a free connection.
+    """
+
+    def __init__(self, path: Path = DB_PATH, size: int = POOL_SIZE):
+        self.path = Path(path)
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="sqlite")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        _configure(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening a new one while under the bound"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def _call(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        with self.connection() as conn:
+            return fn(conn, *args, **kwargs)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn(conn, *args, **kwargs)`` on the pool's worker threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._call, fn, args, kwargs)
+        )
+
+    def close(self) -> None:
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def _new_pool(path: Optional[str] = None, size: Optional[int] = None) -> ConnectionPool:
+    return ConnectionPool(
+        path or os.environ.get("SQLITE_PATH", DB_PATH),
+        size or int(os.environ.get("SQLITE_POOL_SIZE", POOL_SIZE)),
+    )
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _new_pool()
+    return _pool
+
+
+def open_pool(path: Optional[str] = None, size: Optional[int] = None) -> ConnectionPool:
+    """(Re)create the process-wide pool with explicit settings; SQLITE_* env vars fill the gaps"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = _new_pool(path, size)
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool, _status_batcher
+    _status_batcher = None
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def init_db() -> None:
+    """Create tables if they do not exist yet"""
+    with get_pool().connection() as conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        # Rows written before the rollup table existed
+        if conn.execute("SELECT 1 FROM status_rollups LIMIT 1").fetchone() is None:
+            conn.execute(BACKFILL_STATUS_ROLLUPS)
+        conn.commit()
+
+
+# Status checks
+def _insert_status_checks(conn: sqlite3.Connection, rows: Sequence[Tuple[str, str, str]]) -> None:
+    # Rows and their per-minute rollups commit in the same transaction
+    rollups = Counter((timestamp[:16], client_name) for _, client_name, timestamp in rows)
+    conn.executemany(INSERT_STATUS_CHECK, rows)
+    conn.executemany(UPSERT_STATUS_ROLLUP, [(minute, client, n) for (minute, client), n in rollups.items()])
+    conn.commit()
+
+
+def _select_status_checks(
+    conn: sqlite3.Connection,
+    since: Optional[str],
+    until: Optional[str],
+    client_name: Optional[str],
+    limit: int,
+    before: Optional[Tuple[str, int]],
+) -> List[Tuple[str, str, str, int]]:
+    clauses, params = [], []
+    if client_name is not None:
+        clauses.append("client_name = ?")
+        params.append(client_name)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(until)
+    if before is not None:
+        clauses.append("(timestamp, rowid) < (?, ?)")
+        params.extend(before)
+    sql = SELECT_STATUS_CHECKS
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    # Newest first; rowid breaks ties and is part of both timestamp indexes, so no sort step is needed
+    sql += " ORDER BY timestamp DESC, rowid DESC LIMIT ?"
+    params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def _select_status_rollups(
+    conn: sqlite3.Connection,
+    since: Optional[str],
+    until: Optional[str],
+    client_name: Optional[str],
+    bucket: str,
+) -> List[Tuple[str, str, int]]:
+    width = ROLLUP_BUCKETS[bucket]
+    clauses, params = [], []
+    if client_name is not None:
+        clauses.append("client_name = ?")
+        params.append(client_name)
+    if since is not None:
+        clauses.append("minute >= ?")
+        params.append(since[:16])
+    if until is not None:
+        clauses.append("minute < ?")
+        params.append(until[:16])
+    sql = f"SELECT substr(minute, 1, {width}) AS bucket, client_name, sum(count) FROM status_rollups"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " GROUP BY bucket, client_name ORDER BY bucket, client_name"
+    return conn.execute(sql, params).fetchall()
+
+
+def _prune_chunk(conn: sqlite3.Connection, statement: str, cutoff: str, chunk_size: int) -> int:
+    deleted = conn.execute(statement, (cutoff, chunk_size)).rowcount
+    conn.commit()
+    return deleted
+
+
+_status_batcher: Optional[WriteBatcher] = None
+
+
+def get_status_batcher() -> WriteBatcher:
+    """Return the group-commit batcher for status check inserts"""
+    global _status_batcher
+    if _status_batcher is None:
+        _status_batcher = WriteBatcher(
+            get_pool(),
+            _insert_status_checks,
+            max_batch_size=int(os.environ.get("STATUS_BATCH_SIZE", STATUS_BATCH_SIZE)),
+            linger_ms=float(os.environ.get("STATUS_BATCH_LINGER_MS", STATUS_BATCH_LINGER_MS)),
+        )
+    return _status_batcher
+
+
+async def insert_status_check(id: str, client_name: str, timestamp: str) -> None:
+    """Insert a status check; returns once the row is committed"""
+    await get_status_batcher().submit((id, client_name, timestamp))
+
+
+async def fetch_status_checks(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    client_name: Optional[str] = None,
+    limit: int = STATUS_QUERY_LIMIT,
+    before: Optional[Tuple[str, int]] = None,
+) -> List[Tuple[str, str, str, int]]:
+    """
+    Status checks in ``[since, until)`` (ISO-8601 UTC bounds), newest first,
+    as (id, client_name, timestamp, rowid). Pass the (timestamp, rowid) of
+    the last row of a page as ``before`` for the next one.
+    """
+    return await get_pool().run(_select_status_checks, since, until, client_name, limit, before)
+
+
+async def fetch_status_rollups(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    client_name: Optional[str] = None,
+    bucket: str = "minute",
+) -> List[Tuple[str, str, int]]:
+    """Precomputed status check counts per client and time bucket"""
+    return await get_pool().run(_select_status_rollups, since, until, client_name, bucket)
+
+
+async def prune_status_checks(
+    checks_before: str,
+    rollups_before: Optional[str] = None,
+    chunk_size: int = STATUS_PRUNE_CHUNK,
+) -> Tuple[int, int]:
+    """
+    Delete status checks older than ``checks_before`` (and rollups older than
+    ``rollups_before``) in chunks, one short transaction per chunk so writers
+    are never locked out for long. Returns the number of rows deleted.
+    """
+    pool = get_pool()
+    removed = [0, 0]
+    targets = [(0, PRUNE_STATUS_CHECKS, checks_before)]
+    if rollups_before is not None:
+        targets.append((1, PRUNE_STATUS_ROLLUPS, rollups_before[:16]))
+    for slot, statement, cutoff in targets:
+        while True:
+            deleted = await pool.run(_prune_chunk, statement, cutoff, chunk_size)
+            removed[slot] += deleted
+            if deleted < chunk_size:
+                break
+    return removed[0], removed[1]
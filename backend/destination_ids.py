@@ -0,0 +1,71 @@
+"""In-memory set of destination IDs for existence checks on the write path"""
+
+import asyncio
+from typing import Iterable, Optional, Set
+
+from storage import DestinationRepository, get_destination_repository
+from storage.base import Document
+
+
+class DestinationIds:
+    """
+    Every destination ID this process knows to exist.
+
+    Destinations are never deleted, so a known ID is always right and
+    needs no round trip. An unknown ID may have been written by another
+    process (or a bulk load, which does not report its new IDs), so
+    unknown IDs are checked against storage and remembered when found.
+    """
+
+    def __init__(self, ids: Iterable[str] = ()):
+        self._ids: Set[str] = set(ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, destination_id: str) -> bool:
+        return destination_id in self._ids
+
+    def add(self, destination_ids: Iterable[str]) -> None:
+        self._ids.update(destination_ids)
+
+    async def missing(self, destination_ids: Iterable[str], repo: Optional[DestinationRepository] = None) -> Set[str]:
+        """The IDs among ``destination_ids`` that do not exist"""
+        unknown = {d for d in destination_ids if d not in self._ids}
+        if not unknown:
+            return unknown
+        repo = repo or get_destination_repository()
+        if await repo.count_existing(unknown) == len(unknown):
+            self._ids.update(unknown)
+            return set()
+        found = {doc["_id"] for doc in await repo.get_many(unknown)}
+        self._ids.update(found)
+        return unknown - found
+
+
+_ids: Optional[DestinationIds] = None
+# An insert that races the first load may be missed; the storage check on a miss covers it
+_loading: Optional[asyncio.Lock] = None
+
+
+async def get_destination_ids(repo: Optional[DestinationRepository] = None) -> DestinationIds:
+    """Return the ID set, loading every destination ID on first use"""
+    global _ids, _loading
+    if _ids is not None:
+        return _ids
+    if _loading is None:
+        _loading = asyncio.Lock()
+    async with _loading:
+        if _ids is None:
+            _ids = DestinationIds(await (repo or get_destination_repository()).ids())
+    return _ids
+
+
+def add_destination_ids(docs: Iterable[Document]) -> None:
+    if _ids is not None:
+        _ids.add(doc["_id"] for doc in docs)
+
+
+def reset_destination_ids() -> None:
+    global _ids
+    _ids = None
@@ -0,0 +1,217 @@
+"""In-memory bitmap indexes for faceted destination filtering"""
+
+import asyncio
+import math
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from normalize import month_bit
+from storage import DestinationRepository, get_destination_repository
+from storage.base import Document
+
+# Rating counts are grouped by tenth of a star
+RATING_SCALE = 10
+
+
+def iter_bits(bits: int) -> Iterable[int]:
+    """Positions of the set bits in ``bits``, lowest first"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def bitmap_bytes(ordinals: Iterable[int], size: int) -> bytearray:
+    """Little-endian bitmap of ``size`` bits with ``ordinals`` set"""
+    buffer = bytearray((size + 7) // 8)
+    for ordinal in ordinals:
+        buffer[ordinal >> 3] |= 1 << (ordinal & 7)
+    return buffer
+
+
+def bitmap_from_ordinals(ordinals: Iterable[int], size: int) -> int:
+    """Build a bitmap in one allocation instead of OR-ing bits in one by one"""
+    return int.from_bytes(bitmap_bytes(ordinals, size), "little")
+
+
+def rating_label(rating: float) -> str:
+    """The tenth of a star ``rating`` falls in, so 4.27 counts under 4.2"""
+    return f"{math.floor(rating * RATING_SCALE + 1e-9) / RATING_SCALE:.1f}"
+
+
+class FacetIndex:
+    """
+    Posting lists over the catalog stored as Python-int bitmaps.
+
+    Each destination gets an ordinal (its bit position) in catalog order.
+    A filter is the AND of the matching bitmaps, and a facet count is the
+    popcount of the result ANDed with that value's bitmap, so no query ever
+    walks the destinations themselves.
+    """
+
+    FACETS = ("location", "activity", "price", "month", "rating")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.ordinals: Dict[str, int] = {}
+        self.all = 0
+        self.postings: Dict[str, Dict] = {facet: {} for facet in self.FACETS}
+        # Display label for each case-folded activity
+        self.activity_labels: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _keys(self, doc: Document) -> Iterable[Tuple[str, object]]:
+        """The (facet, value) postings ``doc`` belongs to"""
+        yield "location", doc["location"]
+        for activity in doc["activities"]:
+            key = activity.casefold()
+            self.activity_labels.setdefault(key, activity)
+            yield "activity", key
+        if doc.get("priceTier") is not None:
+            yield "price", doc["priceTier"]
+        mask = doc.get("bestTimeMask", 0)
+        for month in range(1, 13):
+            if mask & month_bit(month):
+                yield "month", month
+        # Keyed by the exact rating, so a min_rating between two tenths still splits them correctly
+        yield "rating", doc["rating"]
+
+    def _assign(self, doc: Document) -> Optional[int]:
+        if doc["_id"] in self.ordinals:
+            return None
+        ordinal = len(self.ids)
+        self.ids.append(doc["_id"])
+        self.ordinals[doc["_id"]] = ordinal
+        return ordinal
+
+    def add(self, doc: Document) -> None:
+        ordinal = self._assign(doc)
+        if ordinal is None:
+            return
+        bit = 1 << ordinal
+        self.all |= bit
+        for facet, key in self._keys(doc):
+            postings = self.postings[facet]
+            postings[key] = postings.get(key, 0) | bit
+
+    @classmethod
+    async def build(cls, docs: AsyncIterator[Document]) -> "FacetIndex":
+        """Index a whole catalog, materializing each bitmap once at the end"""
+        index = cls()
+        pending: Dict[Tuple[str, object], List[int]] = defaultdict(list)
+        async for doc in docs:
+            ordinal = index._assign(doc)
+            if ordinal is not None:
+                for key in index._keys(doc):
+                    pending[key].append(ordinal)
+        size = len(index.ids)
+        index.all = (1 << size) - 1
+        for (facet, key), ordinals in pending.items():
+            index.postings[facet][key] = bitmap_from_ordinals(ordinals, size)
+        return index
+
+    def query(
+        self,
+        location: Optional[str] = None,
+        activities: Iterable[str] = (),
+        price: Optional[int] = None,
+        min_rating: Optional[float] = None,
+        month: Optional[int] = None,
+    ) -> int:
+        """Bitmap of destinations matching every given filter"""
+        bits = self.all
+        postings = self.postings
+        if location is not None:
+            bits &= postings["location"].get(location, 0)
+        for activity in activities:
+            bits &= postings["activity"].get(activity.casefold(), 0)
+        if price is not None:
+            bits &= postings["price"].get(price, 0)
+        if month is not None:
+            bits &= postings["month"].get(month, 0)
+        if min_rating is not None:
+            rated = 0
+            for rating, posting in postings["rating"].items():
+                if rating >= min_rating:
+                    rated |= posting
+            bits &= rated
+        return bits
+
+    def counts(self, bits: int) -> Dict[str, Dict[str, int]]:
+        """Facet value counts within ``bits``, skipping values with no matches"""
+        labels = {
+            "location": str,
+            "activity": lambda key: self.activity_labels[key],
+            "price": lambda tier: "₹" * tier,
+            "month": str,
+            "rating": rating_label,
+        }
+        counts = {}
+        for facet, postings in self.postings.items():
+            found = {}
+            for value, posting in sorted(postings.items()):
+                n = (bits & posting).bit_count()
+                if n:
+                    # Each destination has one rating, so ratings sharing a tenth add up
+                    label = labels[facet](value)
+                    found[label] = found.get(label, 0) + n
+            counts[facet] = found
+        return counts
+
+    def page(self, bits: int, limit: int, after: Optional[int] = None) -> Tuple[List[str], Optional[int]]:
+        """IDs of up to ``limit`` matches after ordinal ``after``, plus the last ordinal if more remain"""
+        if after is not None:
+            bits = (bits >> (after + 1)) << (after + 1)
+        ordinals = []
+        for ordinal in iter_bits(bits):
+            if len(ordinals) == limit:
+                return [self.ids[o] for o in ordinals], ordinals[-1]
+            ordinals.append(ordinal)
+        return [self.ids[o] for o in ordinals], None
+
+    def bitmap(self, destination_ids: Iterable[str]) -> int:
+        bits = 0
+        for destination_id in destination_ids:
+            ordinal = self.ordinals.get(destination_id)
+            if ordinal is not None:
+                bits |= 1 << ordinal
+        return bits
+
+
+_index: Optional[FacetIndex] = None
+_building: Optional[asyncio.Lock] = None
+# Bumped by every write so a build that raced a write is thrown away
+_generation = 0
+
+
+async def get_facet_index(repo: Optional[DestinationRepository] = None) -> FacetIndex:
+    """Return the facet index, building it from the whole catalog on first use"""
+    global _index, _building
+    if _index is not None:
+        return _index
+    if _building is None:
+        _building = asyncio.Lock()
+    async with _building:
+        while _index is None:
+            generation = _generation
+            index = await FacetIndex.build((repo or get_destination_repository()).stream())
+            if generation == _generation:
+                _index = index
+    return _index
+
+
+def add_to_facet_index(docs: Iterable[Document]) -> None:
+    global _generation
+    _generation += 1
+    if _index is not None:
+        for doc in docs:
+            _index.add(doc)
+
+
+def reset_facet_index() -> None:
+    """Drop the index; the next facet query rebuilds it from storage"""
+    global _index, _generation
+    _generation += 1
+    _index = None
@@ -0,0 +1,151 @@
+"""In-memory spatial index for nearest-destination queries"""
+
+import asyncio
+import heapq
+import math
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from storage import DestinationRepository, get_destination_repository
+from storage.base import Document
+
+EARTH_RADIUS_KM = 6371.0088
+# About 28 km north-south; small enough that a city-sized query touches a few cells
+CELL_DEGREES = 0.25
+
+Cell = Tuple[int, int]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """
+    Destinations bucketed into a latitude/longitude grid.
+
+    A query visits cells best-first by a lower bound on the distance from
+    the query point to anything in the cell, and stops once no unvisited
+    cell can beat the current k-th nearest (or the radius). Only the
+    points in visited cells are measured, so the cost depends on local
+    density rather than catalog size. Longitude wraps at the antimeridian.
+    """
+
+    def __init__(self, cell_degrees: float = CELL_DEGREES):
+        self.cell = cell_degrees
+        self.rows = math.ceil(180 / cell_degrees)
+        self.cols = math.ceil(360 / cell_degrees)
+        self.cells: Dict[Cell, Dict[str, Tuple[float, float]]] = {}
+        self.points: Dict[str, Cell] = {}
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        row = min(int((lat + 90) / self.cell), self.rows - 1)
+        return row, int((lon + 180) / self.cell) % self.cols
+
+    def add(self, doc: Document) -> None:
+        """Index ``doc`` at its coordinates, replacing any earlier position"""
+        self.remove(doc["_id"])
+        lat, lon = doc.get("lat"), doc.get("lon")
+        if lat is None or lon is None:
+            return
+        cell = self._cell(lat, lon)
+        self.cells.setdefault(cell, {})[doc["_id"]] = (lat, lon)
+        self.points[doc["_id"]] = cell
+
+    def remove(self, destination_id: str) -> None:
+        cell = self.points.pop(destination_id, None)
+        if cell is not None:
+            bucket = self.cells[cell]
+            del bucket[destination_id]
+            if not bucket:
+                del self.cells[cell]
+
+    @classmethod
+    async def build(cls, docs: AsyncIterator[Document]) -> "GeoIndex":
+        index = cls()
+        async for doc in docs:
+            index.add(doc)
+        return index
+
+    def nearest(self, lat: float, lon: float, radius_km: float, limit: int) -> List[Tuple[float, str]]:
+        """Up to ``limit`` (distance in km, ID) pairs within ``radius_km``, nearest first"""
+        cos_lat = math.cos(math.radians(lat))
+        cell = self.cell
+
+        def lower_bound(row: int, col: int) -> float:
+            # Any point in the cell differs from the query by at least this much
+            # latitude, and (on the query's parallel) at least this much longitude
+            south = row * cell - 90
+            lat_gap = max(0.0, south - lat, lat - south - cell)
+            lon_gap = abs((lon - (col * cell - 180 + cell / 2) + 180) % 360 - 180) - cell / 2
+            lon_bound = 0.0
+            if lon_gap > 0:
+                lon_bound = math.asin(math.sin(math.radians(min(lon_gap, 90.0))) * cos_lat)
+            return EARTH_RADIUS_KM * max(math.radians(lat_gap), lon_bound)
+
+        bound = radius_km
+        found: List[Tuple[float, str]] = []  # max-heap of the best so far, as (-distance, id)
+        start = self._cell(lat, lon)
+        queue = [(0.0, start)]
+        seen = {start}
+        while queue:
+            floor, (row, col) = heapq.heappop(queue)
+            if floor > bound:
+                break
+            for destination_id, (plat, plon) in self.cells.get((row, col), {}).items():
+                distance = haversine_km(lat, lon, plat, plon)
+                if distance <= bound:
+                    heapq.heappush(found, (-distance, destination_id))
+                    if len(found) > limit:
+                        heapq.heappop(found)
+                    if len(found) == limit:
+                        bound = -found[0][0]
+            for neighbor in ((row - 1, col), (row + 1, col), (row, (col - 1) % self.cols), (row, (col + 1) % self.cols)):
+                if 0 <= neighbor[0] < self.rows and neighbor not in seen:
+                    seen.add(neighbor)
+                    floor = lower_bound(*neighbor)
+                    if floor <= bound:
+                        heapq.heappush(queue, (floor, neighbor))
+        return sorted((-distance, destination_id) for distance, destination_id in found)
+
+
+_index: Optional[GeoIndex] = None
+_building: Optional[asyncio.Lock] = None
+# Bumped by every write so a build that raced a write is thrown away
+_generation = 0
+
+
+async def get_geo_index(repo: Optional[DestinationRepository] = None) -> GeoIndex:
+    """Return the spatial index, building it from the whole catalog on first use"""
+    global _index, _building
+    if _index is not None:
+        return _index
+    if _building is None:
+        _building = asyncio.Lock()
+    async with _building:
+        while _index is None:
+            generation = _generation
+            index = await GeoIndex.build((repo or get_destination_repository()).stream())
+            if generation == _generation:
+                _index = index
+    return _index
+
+
+def add_to_geo_index(docs: Iterable[Document]) -> None:
+    global _generation
+    _generation += 1
+    if _index is not None:
+        for doc in docs:
+            _index.add(doc)
+
+
+def reset_geo_index() -> None:
+    """Drop the index; the next nearby query rebuilds it from storage"""
+    global _index, _generation
+    _generation += 1
+    _index = None
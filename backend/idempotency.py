@@ -0,0 +1,133 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+A client that may retry a write sends the same ``Idempotency-Key`` header
+with every attempt. The first request with a key runs the handler in a
+task of its own; identical requests that arrive while it runs await that
+task, and later ones get its stored response back without reaching
+storage. Reusing a key with a different request body is an error.
+
+Only successful responses are stored: a failed attempt is forgotten, so
+retrying it runs the handler again. Keys expire ``IDEMPOTENCY_TTL_SECONDS``
+after first use, and the oldest are evicted past ``IDEMPOTENCY_MAX_KEYS``.
+The store is per process; with several workers, a retry is only
+recognised by the worker that handled the first attempt.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, NamedTuple, Optional, Tuple
+
+from metrics import registry
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Set on responses served from the store rather than by running the handler
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+IDEMPOTENCY_MAX_KEYS = 10_000
+
+
+class IdempotencyKeyReused(ValueError):
+    """The key was already used for a request with a different body"""
+
+
+class _Entry(NamedTuple):
+    fingerprint: str
+    expires: float
+    task: "asyncio.Task[bytes]"
+
+
+def fingerprint(*parts: bytes) -> str:
+    """Digest identifying a request by its method, path, parameters and body"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """Bounded map of idempotency key to the task producing (or that produced) its response body"""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        # Insertion order is expiry order, since every key lives for ``ttl``
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.conflicts = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            expired = entry.expires <= now
+            # A request still in flight stays over the limit; its duplicates must keep finding it
+            if not expired and (len(self._entries) <= self.max_keys or not entry.task.done()):
+                break
+            del self._entries[key]
+
+    def _forget_failure(self, key: Hashable, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is not None:
+            entry = self._entries.get(key)
+            if entry is not None and entry.task is task:
+                del self._entries[key]
+
+    async def run(self, key: Hashable, request_fingerprint: str, produce: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, bool]:
+        """
+        The response body for ``key``, running ``produce`` only if no request
+        with this key has succeeded or is in flight. Returns the body and
+        whether it came from an earlier request.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires > now:
+            if entry.fingerprint != request_fingerprint:
+                self.conflicts += 1
+                raise IdempotencyKeyReused("Idempotency key was already used with a different request")
+            if entry.task.done():
+                self.replayed += 1
+                return entry.task.result(), True
+            self.coalesced += 1
+            # Shielded: one caller going away must not cancel the write the others wait on
+            return await asyncio.shield(entry.task), True
+
+        self.executed += 1
+        task = asyncio.ensure_future(produce())
+        task.add_done_callback(lambda done: self._forget_failure(key, done))
+        self._entries[key] = _Entry(request_fingerprint, now + self.ttl, task)
+        self._entries.move_to_end(key)
+        self._evict(now)
+        return await asyncio.shield(task), False
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        _store = IdempotencyStore(
+            float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", IDEMPOTENCY_TTL_SECONDS)),
+            int(os.environ.get("IDEMPOTENCY_MAX_KEYS", IDEMPOTENCY_MAX_KEYS)),
+        )
+    return _store
+
+
+@registry.collector
+def idempotency_metrics():
+    store = _store
+    if store is None:
+        return
+    yield "# TYPE idempotency_requests_total counter"
+    for result in ("executed", "replayed", "coalesced", "conflicts"):
+        yield f'idempotency_requests_total{{result="{result}"}} {getattr(store, result)}'
+    yield "# TYPE idempotency_keys gauge"
+    yield f"idempotency_keys {len(store)}"
@@ -0,0 +1,484 @@
+"""
+Local proxy for destination images, with resized variants.
+
+Each source image is fetched once and stored under the SHA-256 of its
+bytes, so destinations that share a photo share the file. Variants
+(narrower and/or re-encoded as WebP) are named after the original's hash,
+the width and the format, and are rendered in a process pool, since
+resizing a large JPEG holds the CPU for tens of milliseconds.
+
+Originals and variants share one size budget. When it is exceeded, the
+least recently served files are deleted. File times record use, so the
+order survives a restart.
+
+Pillow is optional. Without it, originals are still cached and served
+unchanged.
+
+Image URLs come from destinations, which anyone can create, so fetches are
+restricted. With ``IMAGE_ALLOWED_HOSTS`` set, only those hosts are fetched
+from. Otherwise any host is allowed whose addresses are all public: no
+loopback, private, link-local (cloud metadata) or reserved addresses. The
+request goes to the address that was checked, and every redirect is
+checked the same way.
+"""
+
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+from metrics import registry
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # pragma: no cover - depends on the environment
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+IMAGE_CACHE_BYTES = 512 * 1024 * 1024
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+FETCH_TIMEOUT_SECONDS = 10.0
+# Each hop is checked like the first request
+MAX_REDIRECTS = 5
+# Requested widths snap up to one of these, so the number of variants per image stays bounded
+WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+# Served files older than this get their time refreshed; it saves a syscall on most hits
+TOUCH_INTERVAL_SECONDS = 3600
+QUALITY = {"jpeg": 82, "webp": 80}
+MEDIA_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp"}
+
+WEBP_SUPPORTED = Image is not None and features.check("webp")
+
+
+class ImageUnavailable(Exception):
+    """The source image could not be fetched or is not an image"""
+
+
+def snap_width(width: Optional[int]) -> Optional[int]:
+    """The smallest standard width at least ``width`` (the largest for anything bigger)"""
+    if width is None:
+        return None
+    return next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """Image format from the first bytes of ``data``"""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def is_public_address(address: str) -> bool:
+    """Whether ``address`` is a globally routable unicast IP address"""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def media_type(path: Path) -> str:
+    return MEDIA_TYPES.get(path.suffix.lstrip("."), "application/octet-stream")
+
+
+def render_variant(source: str, target: str, width: Optional[int], format: str) -> int:
+    """
+    Write ``source`` scaled down to ``width`` (never up) in ``format`` to
+    ``target``; returns the file size. Runs in a worker process.
+    """
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if width is not None and image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+        if format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        options = {"quality": QUALITY[format]}
+        if format == "jpeg":
+            options.update(optimize=True, progressive=True)
+        else:
+            options.update(method=4)
+        partial = f"{target}.{os.getpid()}.tmp"
+        image.save(partial, format=format.upper(), **options)
+    os.replace(partial, target)
+    return os.path.getsize(target)
+
+
+def _unlink_all(paths: List[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def _write_file(path: Path, data: bytes) -> None:
+    # Written whole under a temporary name, so a crash never leaves a truncated image
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    partial.write_bytes(data)
+    os.replace(partial, path)
+
+
+class ImageCache:
+    """Content-addressed originals and their variants on disk, evicted least recently used first"""
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = IMAGE_CACHE_BYTES,
+        workers: Optional[int] = None,
+        allowed_hosts: Optional[Iterable[str]] = None,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        # None allows any host with public addresses
+        self.allowed_hosts: Optional[FrozenSet[str]] = (
+            frozenset(host.lower() for host in allowed_hosts) if allowed_hosts is not None else None
+        )
+        self._objects = root / "objects"
+        self._variants = root / "variants"
+        self._sources = root / "sources"
+        for directory in (self._objects, self._variants, self._sources):
+            directory.mkdir(parents=True, exist_ok=True)
+        # Path -> (size, last time written to disk as its mtime), least recently used first
+        self._files: "OrderedDict[Path, Tuple[int, float]]" = OrderedDict()
+        self.bytes = 0
+        # Files being served (or rendered from), with how many times; never evicted
+        self._pins: Dict[Path, int] = {}
+        # Evicted files whose deletion is still running; their paths are written again only after it
+        self._deleting: Dict[Path, asyncio.Future] = {}
+        self._loaded: Optional[asyncio.Future] = None
+        # Source URL -> original, for URLs seen by this process
+        self._originals: Dict[str, Path] = {}
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._client = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.evictions = 0
+
+    def _scan(self) -> List[Tuple[float, Path, int]]:
+        found = []
+        for directory in (self._objects, self._variants):
+            for path in directory.rglob("*"):
+                if not path.is_file():
+                    continue
+                if path.name.endswith(".tmp"):
+                    path.unlink(missing_ok=True)
+                    continue
+                stat = path.stat()
+                found.append((stat.st_mtime, path, stat.st_size))
+        return sorted(found)
+
+    async def _load(self) -> None:
+        # A large cache takes a while to walk, so it is done off the event loop
+        for mtime, path, size in await asyncio.to_thread(self._scan):
+            self._files[path] = (size, mtime)
+            self.bytes += size
+
+    async def _ready(self) -> None:
+        """Wait for the files already on disk to be known"""
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._loaded)
+
+    async def _used(self, path: Path) -> None:
+        """Mark a pinned file as just served"""
+        size, touched = self._files[path]
+        self._files.move_to_end(path)
+        now = time.time()
+        if now - touched > TOUCH_INTERVAL_SECONDS:
+            self._files[path] = (size, now)
+            await asyncio.to_thread(os.utime, path)
+
+    async def _settled(self, path: Path) -> None:
+        """Wait until an eviction of ``path`` in progress has deleted it"""
+        while path in self._deleting:
+            await asyncio.shield(self._deleting[path])
+
+    async def _added(self, path: Path, size: int) -> None:
+        if path in self._files:
+            self.bytes -= self._files[path][0]
+        self._files[path] = (size, time.time())
+        self._files.move_to_end(path)
+        self.bytes += size
+        excess = self.bytes - self.max_bytes
+        victims = []
+        for victim, (victim_size, _) in self._files.items():
+            if excess <= 0:
+                break
+            if victim != path and victim not in self._pins:
+                victims.append(victim)
+                excess -= victim_size
+        for victim in victims:
+            victim_size, _ = self._files.pop(victim)
+            self.bytes -= victim_size
+            self.evictions += 1
+        if victims:
+            deleting = asyncio.ensure_future(asyncio.to_thread(_unlink_all, victims))
+            for victim in victims:
+                self._deleting[victim] = deleting
+
+            def deleted(_) -> None:
+                for victim in victims:
+                    if self._deleting.get(victim) is deleting:
+                        del self._deleting[victim]
+
+            deleting.add_done_callback(deleted)
+            await asyncio.shield(deleting)
+
+    def _pin(self, path: Path) -> None:
+        self._pins[path] = self._pins.get(path, 0) + 1
+
+    def release(self, path: Path) -> None:
+        """Let a file returned by ``acquire`` be evicted again"""
+        count = self._pins.pop(path) - 1
+        if count:
+            self._pins[path] = count
+
+    async def _once(self, key: Hashable, make: Callable[[], Awaitable[Path]]) -> Path:
+        """Run ``make`` once for concurrent callers with the same ``key``"""
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(make())
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _cached(self, key: Hashable, make: Callable[[], Awaitable[Path]]) -> Path:
+        """
+        ``_once(key, make)``, pinned. The file can be evicted between ``make``
+        finishing and this caller resuming; it is then made again.
+        """
+        for _ in range(3):
+            path = await self._once(key, make)
+            if path in self._files:
+                self._pin(path)
+                return path
+        raise ImageUnavailable("The image cache is too small for the images being served")
+
+    async def _target(self, url: "httpx.URL") -> Tuple["httpx.URL", dict]:
+        """Where to send a request for ``url`` and its request extensions, once ``url`` may be fetched"""
+        if url.scheme not in ("http", "https") or not url.host:
+            raise ImageUnavailable(f"Unsupported image URL {url}")
+        host = url.host.lower()
+        if self.allowed_hosts is not None:
+            if host not in self.allowed_hosts:
+                raise ImageUnavailable(f"{host} is not an allowed image host")
+            return url, {}
+        port = url.port or (443 if url.scheme == "https" else 80)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise ImageUnavailable(f"Could not resolve {host}: {e}") from e
+        addresses = [info[4][0] for info in infos]
+        if not addresses or not all(is_public_address(address) for address in addresses):
+            raise ImageUnavailable(f"{host} does not resolve to public addresses only")
+        # Connect to the address that was checked, so a second lookup cannot return another one;
+        # TLS still verifies the certificate against the host name
+        return url.copy_with(host=addresses[0]), {"sni_hostname": host}
+
+    async def _fetch(self, url: str) -> bytes:
+        import httpx
+
+        if self._client is None:
+            # Redirects are followed by hand, so every hop goes through _target
+            self._client = httpx.AsyncClient(timeout=FETCH_TIMEOUT_SECONDS)
+        self.fetches += 1
+        chunks = []
+        size = 0
+        try:
+            current = httpx.URL(url)
+            for _ in range(MAX_REDIRECTS + 1):
+                target, extensions = await self._target(current)
+                headers = {"Host": current.netloc.decode("ascii")}
+                async with self._client.stream("GET", target, headers=headers, extensions=extensions) as response:
+                    if response.is_redirect:
+                        current = current.join(response.headers["location"])
+                        continue
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > MAX_SOURCE_BYTES:
+                            raise ImageUnavailable(f"{url} is larger than {MAX_SOURCE_BYTES} bytes")
+                        chunks.append(chunk)
+                    return b"".join(chunks)
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            raise ImageUnavailable(f"Could not fetch {url}: {e}") from e
+        raise ImageUnavailable(f"{url} redirected more than {MAX_REDIRECTS} times")
+
+    def _on_disk(self, url: str, original: Optional[Path]) -> Optional[Tuple[Path, int]]:
+        """The original of ``url`` and its size, if it is on disk; runs in a thread"""
+        if original is None:
+            # Recorded by an earlier run (or another worker) next to the cache
+            pointer = self._sources / hashlib.sha256(url.encode()).hexdigest()
+            try:
+                original = self.root / pointer.read_text().strip()
+            except OSError:
+                return None
+        try:
+            return original, original.stat().st_size
+        except OSError:
+            return None
+
+    async def _known_original(self, url: str) -> Optional[Path]:
+        original = self._originals.get(url)
+        if original is None or original not in self._files:
+            evictions, deleting = self.evictions, bool(self._deleting)
+            found = await asyncio.to_thread(self._on_disk, url, original)
+            if found is None:
+                self._originals.pop(url, None)
+                return None
+            original, size = found
+            if original not in self._files:
+                if deleting or self.evictions != evictions:
+                    # The file may have been deleted since it was looked at; fetching again is safe
+                    return None
+                await self._added(original, size)
+        self._originals[url] = original
+        return original
+
+    async def _original(self, url: str) -> Path:
+        """The cached copy of ``url``, fetching it on first use; pinned"""
+        if not url.startswith(("http://", "https://")):
+            raise ImageUnavailable(f"Unsupported image URL {url!r}")
+        await self._ready()
+        known = await self._known_original(url)
+        if known is not None:
+            self._pin(known)
+            return known
+
+        async def fetch() -> Path:
+            data = await self._fetch(url)
+            format = sniff_format(data)
+            if format is None:
+                raise ImageUnavailable(f"{url} is not a JPEG, PNG, GIF or WebP image")
+            digest = hashlib.sha256(data).hexdigest()
+            path = self._objects / digest[:2] / f"{digest}.{format}"
+            pointer = self._sources / hashlib.sha256(url.encode()).hexdigest()
+            await self._settled(path)
+            await asyncio.to_thread(_write_file, path, data)
+            await asyncio.to_thread(_write_file, pointer, str(path.relative_to(self.root)).encode())
+            await self._added(path, len(data))
+            self._originals[url] = path
+            return path
+
+        return await self._cached(("original", url), fetch)
+
+    async def acquire(self, url: str, width: Optional[int], format: Optional[str]) -> Path:
+        """
+        ``url`` at ``width`` (snapped to a standard width) in ``format``
+        ("jpeg" or "webp"; None keeps the original's). Without Pillow, or
+        with nothing to change, this is the original. The file is not
+        evicted until it is passed to ``release``.
+        """
+        original = await self._original(url)
+        width = snap_width(width)
+        format = format or original.suffix.lstrip(".")
+        if Image is None or (width is None and original.suffix == f".{format}"):
+            self.hits += 1
+            await self._used(original)
+            return original
+
+        try:
+            digest = original.stem
+            path = self._variants / digest[:2] / f"{digest}-w{width or 0}.{format}"
+            if path in self._files:
+                self.hits += 1
+                self._pin(path)
+                await self._used(path)
+                return path
+
+            async def render() -> Path:
+                self.misses += 1
+                # Held for the render itself, in case the caller that started it goes away
+                self._pin(original)
+                try:
+                    await self._settled(path)
+                    await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+                    if self._pool is None:
+                        # Spawned rather than forked: the server process has threads (the SQLite pool)
+                        self._pool = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+                    loop = asyncio.get_running_loop()
+                    size = await loop.run_in_executor(self._pool, render_variant, str(original), str(path), width, format)
+                except BrokenProcessPool as e:
+                    # A worker died; start a fresh pool for the next request
+                    self._pool = None
+                    raise ImageUnavailable(f"Could not render {url}: {e}") from e
+                except Exception as e:
+                    raise ImageUnavailable(f"Could not render {url}: {e}") from e
+                finally:
+                    self.release(original)
+                await self._added(path, size)
+                return path
+
+            return await self._cached(("variant", path), render)
+        finally:
+            self.release(original)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_cache: Optional[ImageCache] = None
+
+
+def _allowed_hosts() -> Optional[List[str]]:
+    hosts = os.environ.get("IMAGE_ALLOWED_HOSTS")
+    if not hosts:
+        return None
+    return [host.strip() for host in hosts.split(",") if host.strip()]
+
+
+def get_image_cache() -> ImageCache:
+    global _cache
+    if _cache is None:
+        _cache = ImageCache(
+            Path(os.environ.get("IMAGE_CACHE_DIR", ROOT_DIR / "image_cache")),
+            int(os.environ.get("IMAGE_CACHE_BYTES", IMAGE_CACHE_BYTES)),
+            int(os.environ["IMAGE_WORKERS"]) if os.environ.get("IMAGE_WORKERS") else None,
+            _allowed_hosts(),
+        )
+    return _cache
+
+
+async def close_image_cache() -> None:
+    global _cache
+    if _cache is not None:
+        await _cache.close()
+        _cache = None
+
+
+@registry.collector
+def image_cache_metrics():
+    cache = _cache
+    if cache is None:
+        return
+    yield "# TYPE image_cache_requests_total counter"
+    yield f'image_cache_requests_total{{result="hits"}} {cache.hits}'
+    yield f'image_cache_requests_total{{result="misses"}} {cache.misses}'
+    yield "# TYPE image_fetches_total counter"
+    yield f"image_fetches_total {cache.fetches}"
+    yield "# TYPE image_cache_evictions_total counter"
+    yield f"image_cache_evictions_total {cache.evictions}"
+    yield "# TYPE image_cache_bytes gauge"
+    yield f"image_cache_bytes {cache.bytes}"
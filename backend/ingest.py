@@ -0,0 +1,202 @@
+"""Streaming bulk ingest of destinations from NDJSON or JSON-array payloads"""
+
+import codecs
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+
+from models import BulkIngestError, BulkIngestResult, DestinationCreate
+from normalize import normalize_destination
+from storage import DestinationRepository
+
+logger = logging.getLogger(__name__)
+
+INGEST_CHUNK_SIZE = 1000
+# Per-row errors reported back to the client; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+# A single array element larger than this is treated as malformed input
+MAX_RECORD_CHARS = 1 << 20
+
+_json = json.JSONDecoder()
+
+
+class MalformedPayload(Exception):
+    """Raised by the parser when the payload cannot be split into records"""
+
+
+async def _text(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def parse_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Union[Any, MalformedPayload]]:
+    """
+    Yield records from a byte stream as soon as each one is complete.
+
+    A payload starting with ``[`` is read as a JSON array, anything else as
+    NDJSON. A malformed NDJSON line yields a ``MalformedPayload`` in its
+    place and parsing continues; a malformed array element ends the stream,
+    since there is no reliable way to find the next element.
+    """
+    buffer = ""
+    mode: Optional[str] = None
+    pos = 0
+    line_no = 0
+
+    async for text in _text(chunks):
+        buffer = buffer[pos:] + text
+        pos = 0
+        if mode is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                continue
+            mode = "array" if stripped[0] == "[" else "ndjson"
+            if mode == "array":
+                pos = buffer.index("[") + 1
+
+        if mode == "ndjson":
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                line_no += 1
+                if line.strip():
+                    yield _parse_line(line, line_no)
+            continue
+
+        while True:
+            pos = _skip_separators(buffer, pos)
+            if pos >= len(buffer) or buffer[pos] == "]":
+                break
+            try:
+                record, end = _json.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if len(buffer) - pos > MAX_RECORD_CHARS:
+                    raise MalformedPayload(f"Malformed JSON array element: {e.msg}")
+                break  # incomplete element, wait for more input
+            if end >= len(buffer):
+                break  # a number may continue in the next chunk
+            yield record
+            pos = end
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+
+    if mode == "ndjson":
+        if buffer.strip():
+            yield _parse_line(buffer, line_no + 1)
+        return
+    if mode == "array":
+        pos = _skip_separators(buffer, pos)
+        rest = buffer[pos:].strip()
+        if rest and rest != "]":
+            try:
+                record, end = _json.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                raise MalformedPayload(f"Malformed JSON array element: {e.msg}")
+            yield record
+            if buffer[end:].lstrip(" \t\r\n,") != "]":
+                raise MalformedPayload("Unterminated JSON array")
+        elif not rest:
+            raise MalformedPayload("Unterminated JSON array")
+
+
+def _skip_separators(buffer: str, pos: int) -> int:
+    while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+        pos += 1
+    return pos
+
+
+def _parse_line(line: str, line_no: int) -> Union[Any, MalformedPayload]:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return MalformedPayload(f"Line {line_no}: invalid JSON ({e.msg})")
+
+
+async def _aiter(records: Iterable[Any]) -> AsyncIterator[Any]:
+    for record in records:
+        yield record
+
+
+async def ingest_destinations(
+    records: Union[AsyncIterable[Any], Iterable[Any]],
+    repo: DestinationRepository,
+    upsert: bool = False,
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    result: Optional[BulkIngestResult] = None,
+) -> BulkIngestResult:
+    """
+    Validate ``records`` against ``DestinationCreate`` and write them in
+    chunks of ``chunk_size``, one transaction (or ``insert_many``) per chunk.
+    With ``upsert`` a record replaces the existing destination of the same name.
+    A chunk that fails is retried in halves, so only the records that cannot
+    be written are reported. Counts go into ``result`` as each chunk commits,
+    so a caller that passes one still knows what was written if the record
+    stream raises.
+    """
+    if not hasattr(records, "__aiter__"):
+        records = _aiter(records)
+    if result is None:
+        result = BulkIngestResult()
+    chunk: List[Tuple[int, dict]] = []
+
+    def fail(index: int, error: str) -> None:
+        result.failed += 1
+        if len(result.errors) < MAX_REPORTED_ERRORS:
+            result.errors.append(BulkIngestError(index=index, error=error))
+
+    async def write(rows: List[Tuple[int, dict]]) -> None:
+        try:
+            inserted, updated = await repo.bulk_write([doc for _, doc in rows], upsert=upsert)
+        except Exception as e:
+            if len(rows) == 1:
+                logger.error(f"Error writing ingest record {rows[0][0]}: {e}")
+                fail(rows[0][0], "Storage error")
+                return
+            # Retry in halves so only the bad rows are reported. The failed write either rolled
+            # back or, without transactions, is safe to repeat (see bulk_write)
+            middle = len(rows) // 2
+            await write(rows[:middle])
+            await write(rows[middle:])
+        else:
+            result.inserted += inserted
+            result.updated += updated
+
+    async def flush() -> None:
+        if not chunk:
+            return
+        await write(list(chunk))
+        chunk.clear()
+
+    index = -1
+    try:
+        async for record in records:
+            index += 1
+            result.received += 1
+            if isinstance(record, MalformedPayload):
+                fail(index, str(record))
+                continue
+            try:
+                doc = normalize_destination(DestinationCreate.model_validate(record).model_dump())
+            except ValidationError as e:
+                fail(index, "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc']) or 'record'}: {err['msg']}" for err in e.errors()
+                ))
+                continue
+            now = datetime.utcnow()
+            doc["createdAt"] = now
+            doc["updatedAt"] = now
+            chunk.append((index, doc))
+            if len(chunk) >= chunk_size:
+                await flush()
+    except MalformedPayload as e:
+        fail(index + 1, str(e))
+    await flush()
+    return result
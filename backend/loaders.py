@@ -0,0 +1,107 @@
+"""Request-scoped batching loaders (dataloader pattern)"""
+
+import asyncio
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from storage import DestinationRepository, get_destination_repository
+from storage.base import Document
+
+# Itineraries expanded together while streaming an export
+EXPAND_BATCH = 200
+
+
+class DestinationLoader:
+    """
+    Resolves destination IDs for the lifetime of one request.
+
+    ``load`` calls made in the same event-loop tick are coalesced into a
+    single ``get_many``; every ID is fetched at most once per request.
+    """
+
+    def __init__(self, repo: Optional[DestinationRepository] = None):
+        self.repo = repo or get_destination_repository()
+        self._cache: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        # The loop only keeps weak references to tasks, so running dispatches are held here
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, destination_id: str) -> "asyncio.Future[Optional[Document]]":
+        found = self._cache.get(destination_id)
+        if found is None:
+            loop = asyncio.get_running_loop()
+            found = self._cache[destination_id] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(self._start_dispatch)
+            self._queue.append(destination_id)
+        return found
+
+    async def load_many(self, destination_ids: Iterable[str]) -> Dict[str, Document]:
+        """Existing destinations among ``destination_ids``, keyed by ID"""
+        ids = list(dict.fromkeys(destination_ids))
+        docs = await asyncio.gather(*(self.load(d) for d in ids))
+        return {d: doc for d, doc in zip(ids, docs) if doc is not None}
+
+    def _start_dispatch(self) -> None:
+        ids, self._queue = self._queue, []
+        task = asyncio.get_running_loop().create_task(self._dispatch(ids))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, ids: List[str]) -> None:
+        try:
+            docs = await self.repo.get_many(ids)
+            by_id = {doc["_id"]: doc for doc in docs}
+        except asyncio.CancelledError:
+            for d in ids:
+                self._cache.pop(d).cancel()
+            raise
+        except Exception as e:
+            # Nobody awaits the task itself, so the error goes to every caller waiting on this batch
+            for d in ids:
+                future = self._cache.pop(d)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for d in ids:
+            future = self._cache[d]
+            if not future.done():
+                future.set_result(by_id.get(d))
+
+
+def get_destination_loader() -> DestinationLoader:
+    """FastAPI dependency: a fresh loader per request"""
+    return DestinationLoader()
+
+
+def _expanded(itinerary: Document, found: Dict[str, Document]) -> Document:
+    """``itinerary`` with its destinations inlined; deleted ones are dropped along with their stop day"""
+    kept = [i for i, d in enumerate(itinerary["destinations"]) if d in found]
+    expanded = {**itinerary, "destinations": [found[itinerary["destinations"][i]] for i in kept]}
+    stop_days = itinerary.get("stopDays")
+    if stop_days is not None:
+        expanded["stopDays"] = [stop_days[i] for i in kept if i < len(stop_days)]
+    return expanded
+
+
+async def expand_destinations(loader: DestinationLoader, itineraries: List[Document]) -> List[Document]:
+    """Replace destination IDs with documents for a whole page of itineraries at once"""
+    found = await loader.load_many(d for itinerary in itineraries for d in itinerary["destinations"])
+    return [_expanded(itinerary, found) for itinerary in itineraries]
+
+
+async def expand_stream(itineraries: AsyncIterator[Document], batch_size: int = EXPAND_BATCH) -> AsyncIterator[Document]:
+    """
+    ``expand_destinations`` over a stream, ``batch_size`` itineraries at a
+    time. Each batch gets a fresh loader, so a long export does one lookup
+    per batch without holding every destination it has seen.
+    """
+    batch: List[Document] = []
+    async for itinerary in itineraries:
+        batch.append(itinerary)
+        if len(batch) >= batch_size:
+            for expanded in await expand_destinations(DestinationLoader(), batch):
+                yield expanded
+            batch = []
+    if batch:
+        for expanded in await expand_destinations(DestinationLoader(), batch):
+            yield expanded
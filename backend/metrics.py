@@ -0,0 +1,265 @@
+"""
+Process-local metrics in the Prometheus text exposition format.
+
+Deliberately small: counters, gauges and fixed-bucket histograms keyed by
+label values, an ASGI middleware for per-route HTTP metrics, and a timer
+for storage operations that also feeds the slow-query log. Recording an
+observation is a lock, a bisect and a few integer adds, so it stays on in
+production.
+"""
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+SLOW_QUERY_MS = 100.0
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: non-cumulative bucket counts (last is +Inf), then sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            found = self._values.get(labels)
+            if found is None:
+                found = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            found[0][index] += 1
+            found[1][0] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        # Called at scrape time for values owned by other components
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[str]]) -> Callable[[], Iterable[str]]:
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                lines.extend(collect())
+            except Exception as e:
+                logger.error(f"Error collecting metrics from {collect.__name__}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last body byte", ("method", "route")))
+HTTP_RESPONSE_SIZE = registry.register(Histogram(
+    "http_response_size_bytes", "Response body size", ("method", "route"), SIZE_BUCKETS))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being served"))
+STORAGE_LATENCY = registry.register(Histogram(
+    "storage_operation_duration_seconds", "Storage call latency by operation", ("operation",)))
+STORAGE_ERRORS = registry.register(Counter(
+    "storage_operation_errors_total", "Storage calls that raised", ("operation",)))
+SLOW_QUERIES = registry.register(Counter(
+    "storage_slow_operations_total", "Storage calls slower than the slow-query threshold", ("operation",)))
+
+
+def slow_query_threshold() -> float:
+    """Seconds; from SLOW_QUERY_MS (0 logs every call, negative disables the log)"""
+    return float(os.environ.get("SLOW_QUERY_MS", SLOW_QUERY_MS)) / 1000
+
+
+_slow_threshold: Optional[float] = None
+
+
+def _record(operation: str, elapsed: float, describe: Optional[Callable[[], str]]) -> None:
+    global _slow_threshold
+    STORAGE_LATENCY.observe(elapsed, operation)
+    if _slow_threshold is None:
+        _slow_threshold = slow_query_threshold()
+    if 0 <= _slow_threshold <= elapsed:
+        SLOW_QUERIES.inc(operation)
+        detail = f": {describe()}" if describe is not None else ""
+        logger.warning(f"Slow storage call {operation} took {elapsed * 1000:.1f} ms{detail}")
+
+
+@contextmanager
+def timed(operation: str, describe: Optional[Callable[[], str]] = None):
+    """
+    Time a storage call; failures are counted, and slow calls are logged
+    with ``describe()`` (only evaluated for slow calls)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STORAGE_ERRORS.inc(operation)
+        raise
+    finally:
+        _record(operation, time.perf_counter() - started, describe)
+
+
+def _describe(args: tuple, kwargs: dict) -> str:
+    parts = [repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items() if v is not None]
+    text = ", ".join(parts)
+    return text if len(text) <= 200 else text[:197] + "..."
+
+
+class TimedRepository:
+    """Proxy that times every coroutine method of a storage repository"""
+
+    def __init__(self, repo, name: str):
+        self._repo = repo
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        method = getattr(self._repo, attr)
+        if not callable(method) or attr.startswith("_") or attr == "stream":
+            return method
+        operation = f"{self._name}.{attr}"
+
+        async def call(*args, **kwargs):
+            with timed(operation, lambda: _describe(args, kwargs)):
+                return await method(*args, **kwargs)
+
+        call.__name__ = attr
+        setattr(self, attr, call)
+        return call
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are measured to their last byte"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = "500"
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Templates, not raw paths, keep label cardinality bounded
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, path, status)
+            HTTP_LATENCY.observe(elapsed, method, path)
+            HTTP_RESPONSE_SIZE.observe(size, method, path)
@@ -0,0 +1,27 @@
+"""
+Bring existing catalog data up to the current schema.
+
+SQLite migrates itself when the app starts; run this once against MongoDB
+(STORAGE_BACKEND=mongo) to backfill derived fields and create indexes.
+"""
+
+import asyncio
+from dotenv import load_dotenv
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from storage import init_storage, storage_backend
+
+
+async def migrate():
+    init_storage()
+    if storage_backend() == "mongo":
+        from storage.mongo import migrate as migrate_mongo
+        await migrate_mongo()
+    print(f"Migrated {storage_backend()} storage")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
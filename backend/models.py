@@ -1,23 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from typing import Dict, List, Optional
 from datetime import datetime
-from bson import ObjectId
-
-
-class PyObjectId(ObjectId):
-    @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
-
-    @classmethod
-    def validate(cls, v):
-        if not ObjectId.is_valid(v):
-            raise ValueError("Invalid ObjectId")
-        return ObjectId(v)
-
-    @classmethod
-    def __modify_schema__(cls, field_schema):
-        field_schema.update(type="string")
+from normalize import parse_date
 
 
 class DestinationBase(BaseModel):
@@ -29,6 +13,8 @@ class DestinationBase(BaseModel):
     activities: List[str]
     bestTime: str
     price: str
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class DestinationCreate(DestinationBase):
@@ -36,13 +22,29 @@ class DestinationCreate(DestinationBase):
 
 
 class Destination(DestinationBase):
+    model_config = ConfigDict(populate_by_name=True)
+
     id: str = Field(alias="_id")
+    # Parsed from bestTime/price when the destination is written
+    bestTimeMask: int = 0
+    priceTier: Optional[int] = None
     createdAt: Optional[datetime] = None
     updatedAt: Optional[datetime] = None
 
-    class Config:
-        populate_by_name = True
-        json_encoders = {ObjectId: str}
+
+class NearbyDestination(Destination):
+    distanceKm: float
+
+
+class SimilarDestination(Destination):
+    # Cosine similarity of description and activities, 0 to 1
+    similarity: float
+
+
+class FacetedDestinations(BaseModel):
+    items: List[Destination]
+    total: int
+    facets: Dict[str, Dict[str, int]]
 
 
 class ItineraryBase(BaseModel):
@@ -54,20 +56,41 @@ class ItineraryBase(BaseModel):
 
 
 class ItineraryCreate(ItineraryBase):
-    pass
+    @field_validator("startDate", "endDate")
+    @classmethod
+    def iso_date(cls, value: str) -> str:
+        try:
+            return parse_date(value).isoformat()
+        except ValueError:
+            raise ValueError("must be a date in YYYY-MM-DD format")
+
+    @model_validator(mode="after")
+    def end_after_start(self):
+        if self.endDate < self.startDate:
+            raise ValueError("endDate must not be before startDate")
+        return self
 
 
 class Itinerary(ItineraryBase):
+    model_config = ConfigDict(populate_by_name=True)
+
     id: str = Field(alias="_id")
     duration: Optional[str] = None
+    durationDays: Optional[int] = None
+    # Trip day (from 1) of each stop in destinations, once the route is optimized
+    stopDays: Optional[List[int]] = None
     createdAt: Optional[datetime] = None
 
-    class Config:
-        populate_by_name = True
-        json_encoders = {ObjectId: str}
+
+class OptimizedItinerary(Itinerary):
+    # Route length through the located stops, in the new and the previous order
+    distanceKm: float
+    originalDistanceKm: float
 
 
 class ItineraryWithDestinations(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     id: str = Field(alias="_id")
     tripName: str
     startDate: str
@@ -75,8 +98,29 @@ class ItineraryWithDestinations(BaseModel):
     destinations: List[Destination]
     budget: Optional[str] = ""
     duration: Optional[str] = None
+    durationDays: Optional[int] = None
+    # Trip day (from 1) of each stop in destinations, once the route is optimized
+    stopDays: Optional[List[int]] = None
     createdAt: Optional[datetime] = None
 
-    class Config:
-        populate_by_name = True
-        json_encoders = {ObjectId: str}
+
+class BulkIngestError(BaseModel):
+    index: int
+    error: str
+
+
+class BulkIngestResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[BulkIngestError] = []
+
+
+class Backup(BaseModel):
+    name: str
+    sha256: str
+    bytes: int
+    pages: int
+    created: str
+    seconds: float
@@ -0,0 +1,120 @@
+"""Parsers that turn free-text catalog fields into typed values"""
+
+import re
+from datetime import date, datetime
+from typing import Optional
+
+from storage.base import Document
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+        ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+        ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"), ("december", "dec"),
+    ], start=1)
+    for name in names
+}
+ALL_MONTHS = (1 << 12) - 1
+
+_MONTH_WORD = re.compile(r"[a-z]+")
+_RANGE_SEPARATOR = re.compile(r"\s*(?:-|–|—|\bto\b|\buntil\b|\bthrough\b)\s*")
+# "year-round", "all year", "round the year", "throughout the year"; whole words only
+_YEAR_ROUND = re.compile(r"\byear[\s-]*round\b|\b(?:all|round|throughout)\b[\s-]*(?:the\s+)?year\b")
+
+
+def month_bit(month: int) -> int:
+    """Bit for ``month`` (1 = January) in a 12-bit month mask"""
+    return 1 << (month - 1)
+
+
+def parse_month(value: str) -> Optional[int]:
+    """Month number from a name, abbreviation or 1-12 string"""
+    value = value.strip().lower()
+    if value.isdigit():
+        number = int(value)
+        return number if 1 <= number <= 12 else None
+    return MONTHS.get(value)
+
+
+def _month_range(start: int, end: int) -> int:
+    mask, month = 0, start
+    while True:
+        mask |= month_bit(month)
+        if month == end:
+            return mask
+        month = month % 12 + 1
+
+
+def best_time_mask(best_time: str) -> int:
+    """
+    12-bit mask of the months covered by text like "November to March",
+    "Oct-Feb" or "June, July and August". Ranges wrap over the new year.
+    Returns 0 when nothing recognizable is found; "all year" covers every month.
+    """
+    text = best_time.lower()
+    if _YEAR_ROUND.search(text):
+        return ALL_MONTHS
+    mask = 0
+    for part in re.split(r",|;|/|\band\b|&", text):
+        bounds = [
+            MONTHS[word]
+            for piece in _RANGE_SEPARATOR.split(part)
+            for word in _MONTH_WORD.findall(piece)
+            if word in MONTHS
+        ]
+        if len(bounds) >= 2 and _RANGE_SEPARATOR.search(part):
+            mask |= _month_range(bounds[0], bounds[-1])
+        else:
+            for month in bounds:
+                mask |= month_bit(month)
+    return mask
+
+
+def price_tier(price: str) -> Optional[int]:
+    """Numeric tier of a price band such as "₹₹" (2) or "$$$" (3), or a bare digit"""
+    price = price.strip()
+    if price.isdigit():
+        return int(price)
+    symbols = sum(1 for char in price if char in "₹$€£")
+    return symbols or None
+
+
+def parse_date(value: str) -> date:
+    """Calendar date from "2024-12-20" or a full ISO timestamp such as "2024-12-20T00:00:00Z" """
+    value = value.strip()
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).date()
+
+
+def trip_days(start: date, end: date) -> int:
+    """Length of a trip in days, counting both the first and the last day"""
+    return (end - start).days + 1
+
+
+def format_duration(days: int) -> str:
+    return f"{days} day{'s' if days != 1 else ''}"
+
+
+def normalize_destination(doc: Document) -> Document:
+    """Add the typed fields derived from ``bestTime`` and ``price``"""
+    doc["bestTimeMask"] = best_time_mask(doc["bestTime"])
+    doc["priceTier"] = price_tier(doc["price"])
+    return doc
+
+
+def normalize_itinerary(doc: Document) -> Document:
+    """
+    Store ``startDate``/``endDate`` as ISO dates, which sort and compare
+    correctly as strings, and add the trip length in days. Raises ValueError
+    for dates that cannot be parsed.
+    """
+    start, end = parse_date(doc["startDate"]), parse_date(doc["endDate"])
+    days = trip_days(start, end)
+    doc["startDate"] = start.isoformat()
+    doc["endDate"] = end.isoformat()
+    doc["durationDays"] = days
+    doc["duration"] = format_duration(days)
+    return doc
@@ -0,0 +1,44 @@
+"""Periodic retention job for status checks and their rollups"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from database import prune_status_checks
+
+logger = logging.getLogger(__name__)
+
+STATUS_RETENTION_DAYS = 30
+ROLLUP_RETENTION_DAYS = 365
+RETENTION_INTERVAL_SECONDS = 3600
+
+
+async def prune_once(now: Optional[datetime] = None) -> Tuple[int, int]:
+    """Delete raw status checks and rollups that fell out of their retention window"""
+    now = now or datetime.now(timezone.utc)
+    checks_days = float(os.environ.get("STATUS_RETENTION_DAYS", STATUS_RETENTION_DAYS))
+    rollups_days = float(os.environ.get("STATUS_ROLLUP_RETENTION_DAYS", ROLLUP_RETENTION_DAYS))
+    removed = await prune_status_checks(
+        (now - timedelta(days=checks_days)).isoformat(),
+        (now - timedelta(days=rollups_days)).isoformat(),
+    )
+    if any(removed):
+        logger.info(f"Pruned {removed[0]} status checks and {removed[1]} rollups")
+    return removed
+
+
+async def run_retention(interval: Optional[float] = None) -> None:
+    """Run ``prune_once`` forever, every ``interval`` seconds"""
+    interval = interval or float(os.environ.get("STATUS_RETENTION_INTERVAL", RETENTION_INTERVAL_SECONDS))
+    while True:
+        try:
+            await prune_once()
+        except Exception as e:
+            logger.error(f"Error pruning status checks: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_retention() -> asyncio.Task:
+    return asyncio.get_running_loop().create_task(run_retention())
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import List
+from backup import BACKUP_MIN_AGE_SECONDS, BackupTooRecent, backup_dir, backup_now, list_backups
+from database import get_pool
+from models import Backup
+import asyncio
+import hmac
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+def require_admin(request: Request) -> None:
+    """
+    With ADMIN_TOKEN set, admin calls must send it as a bearer token;
+    without one, only clients on this machine are let in.
+    """
+    token = request.app.state.config.admin_token
+    if token is None:
+        if request.client is None or request.client.host not in LOOPBACK_HOSTS:
+            raise HTTPException(status_code=403, detail="Admin API is only available locally without ADMIN_TOKEN")
+        return
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.post("/backups", response_model=Backup, responses={429: {"description": "The newest backup is too recent"}})
+async def create_backup():
+    """
+    Back up the SQLite database now, while the server keeps running (Admin function).
+    Refused while the newest backup is younger than BACKUP_MIN_AGE_SECONDS.
+    """
+    try:
+        min_age = float(os.environ.get("BACKUP_MIN_AGE_SECONDS", BACKUP_MIN_AGE_SECONDS))
+        return (await backup_now(get_pool().path, min_age=min_age))._asdict()
+    except BackupTooRecent as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except Exception as e:
+        logger.error(f"Error backing up database: {e}")
+        raise HTTPException(status_code=500, detail="Error backing up database")
+
+
+@router.get("/backups", response_model=List[Backup])
+async def get_backups():
+    """
+    Backups in the backup directory, newest first (Admin function)
+    """
+    return [info._asdict() for info in await asyncio.to_thread(list_backups, backup_dir())]
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from changes import SSE_MEDIA_TYPE, get_change_log
+
+router = APIRouter(prefix="/api/changes", tags=["changes"])
+
+
+@router.get("", response_class=StreamingResponse)
+async def stream_changes(
+    since: Optional[str] = Query(None, description="Event ID to resume after; defaults to the Last-Event-ID header"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-sent events for destination and itinerary changes:
+    ``destination.created``, ``destinations.imported``, ``itinerary.created``,
+    ``itinerary.updated`` and ``itinerary.deleted``. Without a resume point
+    the stream starts with the next change. A ``reset`` event means changes
+    since the resume point are no longer available; re-fetch the lists.
+    """
+    log = get_change_log()
+    resume = since or last_event_id
+    # -1 is older than anything in the log, so an unknown ID gets a reset
+    after = None if resume is None else log.parse_event_id(resume)
+    if resume is not None and after is None:
+        after = -1
+    return StreamingResponse(
+        log.stream(after),
+        media_type=SSE_MEDIA_TYPE,
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,76 +1,207 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
-from bson import ObjectId
-from models import Destination, DestinationCreate
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Optional, Union
+from datetime import datetime
+from models import BulkIngestResult, Destination, DestinationCreate, FacetedDestinations, NearbyDestination, SimilarDestination
+from catalog import destinations_written, facet_index
+from catalog_cache import cached_json_response
+from changes import record_change
+from geo import get_geo_index
+from ingest import ingest_destinations, parse_records
+from normalize import normalize_destination, parse_month, price_tier
+from serialization import dumps, serializer_for
+from storage import get_destination_repository, is_valid_id
+from storage.base import STREAM_BATCH_SIZE, decode_cursor, encode_cursor
+from streaming import NEXT_CURSOR_HEADER, ndjson_response, wants_ndjson
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/destinations", tags=["destinations"])
 
-# Database will be injected via app state
-def get_db():
-    from server import db
-    return db
+# Storage documents were validated on write; read paths encode them directly
+destination_serializer = serializer_for(Destination)
 
+MAX_IDS = 500
 
-@router.get("", response_model=List[Destination])
+
+def get_repo():
+    return get_destination_repository()
+
+
+# include_facets=true wraps the page as FacetedDestinations; every other form is a plain list
+@router.get("", response_model=Union[List[Destination], FacetedDestinations])
 async def get_destinations(
+    request: Request,
     location: Optional[str] = Query(None, description="Filter by location: 'North Goa' or 'South Goa'"),
-    search: Optional[str] = Query(None, description="Search in name, location, or description")
+    search: Optional[str] = Query(None, description="Full-text search over name, location, description and activities; words match as prefixes"),
+    ids: Optional[str] = Query(None, description="Comma-separated destination IDs to fetch in one request (other filters are ignored)"),
+    activity: List[str] = Query([], description="Only destinations offering this activity; repeat to require several"),
+    price: Optional[str] = Query(None, description="Price tier, e.g. '₹₹' or 2"),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    month: Optional[str] = Query(None, description="Only destinations good to visit in this month (name or 1-12)"),
+    include_facets: bool = Query(False, description="Wrap results as {items, total, facets} with per-facet counts"),
+    limit: int = Query(100, ge=1, le=1000, description="Page size"),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header of the previous page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$", description="'ndjson' streams every match, one per line")
 ):
     """
-    Get all destinations with optional filtering
+    Get destinations with optional filtering; search results are ranked by relevance.
+    Pages are keyset-paginated; the cursor for the next page comes back in X-Next-Cursor.
     """
     try:
-        db = get_db()
-        query = {}
-        
-        # Apply location filter
-        if location:
-            query["location"] = location
+        repo = get_repo()
+        if ids is not None:
+            return await get_destinations_by_ids(request, ids)
         
-        # Apply search filter
-        if search:
-            query["$or"] = [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"location": {"$regex": search, "$options": "i"}},
-                {"description": {"$regex": search, "$options": "i"}}
-            ]
+        if activity or price or min_rating is not None or month or include_facets:
+            facet_filters = FacetFilters(location, search, activity, price, min_rating, month)
+            if wants_ndjson(request, format):
+                return await ndjson_response(stream_faceted(facet_filters), Destination)
+            return await get_faceted_destinations(request, facet_filters, limit, cursor, include_facets)
         
-        destinations = await db.destinations.find(query).to_list(100)
+        if wants_ndjson(request, format):
+            return await ndjson_response(repo.stream(location=location, search=search, cursor=cursor), Destination)
         
-        # Convert ObjectId to string for each destination
-        for dest in destinations:
-            dest["_id"] = str(dest["_id"])
+        async def load():
+            page = await repo.page(location=location, search=search, limit=limit, cursor=cursor)
+            headers = {NEXT_CURSOR_HEADER: page.next_cursor} if page.next_cursor else {}
+            return destination_serializer.encode_many(page.items), headers
         
-        return destinations
+        return await cached_json_response(request, ("list", location, search, limit, cursor), load)
     
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching destinations: {e}")
         raise HTTPException(status_code=500, detail="Error fetching destinations")
 
 
+class FacetFilters:
+    """Validated facet query parameters"""
+
+    def __init__(self, location, search, activities, price, min_rating, month):
+        self.location = location
+        self.search = search
+        self.activities = sorted(set(activities))
+        self.price = price_tier(price) if price else None
+        if price and self.price is None:
+            raise HTTPException(status_code=400, detail="Invalid price tier")
+        self.min_rating = min_rating
+        self.month = parse_month(month) if month else None
+        if month and self.month is None:
+            raise HTTPException(status_code=400, detail="Invalid month")
+
+    def key(self) -> tuple:
+        return (self.location, self.search, tuple(self.activities), self.price, self.min_rating, self.month)
+
+    async def match(self):
+        """The facet index and the bitmap of matching destinations"""
+        index = await facet_index()
+        bits = index.query(self.location, self.activities, self.price, self.min_rating, self.month)
+        if self.search and bits:
+            bits &= index.bitmap(await get_repo().search_ids(self.search))
+        return index, bits
+
+
+def facet_cursor(cursor: Optional[str]) -> Optional[int]:
+    if cursor is None:
+        return None
+    values = decode_cursor(cursor)
+    if len(values) != 2 or values[0] != "f" or not isinstance(values[1], int):
+        raise ValueError("Invalid cursor")
+    return values[1]
+
+
+async def load_ordered(destination_ids: List[str]) -> List[dict]:
+    found = {dest["_id"]: dest for dest in await get_repo().get_many(destination_ids)}
+    return [found[d] for d in destination_ids if d in found]
+
+
+async def get_faceted_destinations(request: Request, filters: FacetFilters, limit: int, cursor: Optional[str], include_facets: bool):
+    """Facet filters are bitmap intersections; counts come from the same bitmap"""
+    after = facet_cursor(cursor)
+    
+    async def load():
+        index, bits = await filters.match()
+        page_ids, last = index.page(bits, limit, after)
+        items = await load_ordered(page_ids)
+        headers = {NEXT_CURSOR_HEADER: encode_cursor("f", last)} if last is not None else {}
+        if include_facets:
+            body = {"items": items, "total": bits.bit_count(), "facets": index.counts(bits)}
+            return serializer_for(FacetedDestinations).encode(body), headers
+        return destination_serializer.encode_many(items), headers
+    
+    return await cached_json_response(request, ("facets", filters.key(), limit, cursor, include_facets), load)
+
+
+async def stream_faceted(filters: FacetFilters):
+    index, bits = await filters.match()
+    after = None
+    while True:
+        page_ids, after = index.page(bits, STREAM_BATCH_SIZE, after)
+        for doc in await load_ordered(page_ids):
+            yield doc
+        if after is None:
+            return
+
+
+async def get_destinations_by_ids(request: Request, ids: str):
+    """Multi-get: existing destinations among ``ids``, in the order requested"""
+    requested = list(dict.fromkeys(d.strip() for d in ids.split(",") if d.strip()))
+    if len(requested) > MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IDS} IDs per request")
+    if not all(is_valid_id(d) for d in requested):
+        raise HTTPException(status_code=400, detail="Invalid destination ID(s)")
+    
+    async def load():
+        return destination_serializer.encode_many(await load_ordered(requested)), {}
+    
+    return await cached_json_response(request, ("ids", tuple(requested)), load)
+
+
+@router.get("/nearby", response_model=List[NearbyDestination])
+async def get_nearby_destinations(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(50, gt=0, le=20040, description="Search radius in kilometres"),
+    limit: int = Query(10, ge=1, le=100),
+):
+    """
+    The destinations nearest to a point, nearest first, with their great-circle
+    distance. Destinations without coordinates are never returned.
+    """
+    async def load():
+        nearest = (await get_geo_index()).nearest(lat, lon, radius_km, limit)
+        docs = await load_ordered([destination_id for _, destination_id in nearest])
+        distances = {destination_id: round(distance, 3) for distance, destination_id in nearest}
+        return serializer_for(NearbyDestination).encode_many(
+            {**doc, "distanceKm": distances[doc["_id"]]} for doc in docs
+        ), {}
+    
+    return await cached_json_response(request, ("nearby", lat, lon, radius_km, limit), load)
+
+
 @router.get("/{destination_id}", response_model=Destination)
-async def get_destination(destination_id: str):
+async def get_destination(request: Request, destination_id: str):
     """
     Get a single destination by ID
     """
     try:
-        db = get_db()
-        
-        if not ObjectId.is_valid(destination_id):
+        if not is_valid_id(destination_id):
             raise HTTPException(status_code=400, detail="Invalid destination ID")
         
-        destination = await db.destinations.find_one({"_id": ObjectId(destination_id)})
-        
-        if not destination:
-            raise HTTPException(status_code=404, detail="Destination not found")
+        async def load():
+            destination = await get_repo().get(destination_id)
+            
+            if not destination:
+                raise HTTPException(status_code=404, detail="Destination not found")
+            
+            return destination_serializer.encode(destination), {}
         
-        destination["_id"] = str(destination["_id"])
-        return destination
+        return await cached_json_response(request, ("get", destination_id), load)
     
     except HTTPException:
         raise
@@ -79,26 +210,78 @@ async def get_destination(destination_id: str):
         raise HTTPException(status_code=500, detail="Error fetching destination")
 
 
+@router.get("/{destination_id}/similar", response_model=List[SimilarDestination])
+async def get_similar_destinations(
+    request: Request,
+    destination_id: str,
+    # Up to similar.MAX_NEIGHBOURS are precomputed
+    k: int = Query(6, ge=1, le=20, description="Number of recommendations"),
+):
+    """
+    Destinations most like this one by description and activities, most
+    similar first. Neighbours are precomputed, so this is a lookup.
+    """
+    # Imported on first use so NumPy stays out of server startup
+    from similar import get_similarity_index
+
+    if not is_valid_id(destination_id):
+        raise HTTPException(status_code=400, detail="Invalid destination ID")
+    
+    async def load():
+        similar = (await get_similarity_index()).similar(destination_id, k)
+        if similar is None:
+            raise HTTPException(status_code=404, detail="Destination not found")
+        docs = await load_ordered([similar_id for similar_id, _ in similar])
+        scores = dict(similar)
+        return serializer_for(SimilarDestination).encode_many(
+            {**doc, "similarity": round(scores[doc["_id"]], 4)} for doc in docs
+        ), {}
+    
+    return await cached_json_response(request, ("similar", destination_id, k), load)
+
+
 @router.post("", response_model=Destination)
 async def create_destination(destination: DestinationCreate):
     """
     Create a new destination (Admin function)
     """
     try:
-        db = get_db()
-        from datetime import datetime
-        
-        destination_dict = destination.dict()
+        destination_dict = normalize_destination(destination.model_dump())
         destination_dict["createdAt"] = datetime.utcnow()
-        destination_dict["updatedAt"] = datetime.utcnow()
-        
-        result = await db.destinations.insert_one(destination_dict)
+        destination_dict["updatedAt"] = destination_dict["createdAt"]
         
-        created_destination = await db.destinations.find_one({"_id": result.inserted_id})
-        created_destination["_id"] = str(created_destination["_id"])
+        created = await get_repo().create(destination_dict)
+        destinations_written([created])
+        record_change("destination.created", serializer_for(Destination).encode(created))
         
-        return created_destination
+        return created
     
     except Exception as e:
         logger.error(f"Error creating destination: {e}")
         raise HTTPException(status_code=500, detail="Error creating destination")
+
+
+@router.post("/bulk", response_model=BulkIngestResult)
+async def bulk_create_destinations(
+    request: Request,
+    upsert: bool = Query(False, description="Replace existing destinations with the same name instead of adding duplicates")
+):
+    """
+    Bulk-load destinations from an NDJSON or JSON-array body (Admin function).
+    The body is parsed and validated as it streams in and written in chunks;
+    rows that fail validation are reported by index and skipped.
+    """
+    result = BulkIngestResult()
+    try:
+        return await ingest_destinations(parse_records(request.stream()), get_repo(), upsert=upsert, result=result)
+    
+    except Exception as e:
+        logger.error(f"Error ingesting destinations: {e}")
+        raise HTTPException(status_code=500, detail="Error ingesting destinations")
+    
+    finally:
+        # Chunks commit as they go, so some may have been written even if the ingest failed
+        if result.inserted or result.updated:
+            destinations_written()
+            # Which rows changed is not tracked, so clients re-fetch the list
+            record_change("destinations.imported", dumps({"inserted": result.inserted, "updated": result.updated}))
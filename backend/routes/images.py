@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from pathlib import Path
+from typing import Optional
+from catalog_cache import etag_matches
+from images import WEBP_SUPPORTED, WIDTHS, ImageCache, ImageUnavailable, get_image_cache, media_type
+from storage import get_destination_repository, is_valid_id
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/images", tags=["images"])
+
+# A destination's image rarely changes; the ETag lets browsers revalidate once this runs out
+CACHE_CONTROL = "public, max-age=604800, stale-while-revalidate=86400"
+
+
+class CachedFileResponse(FileResponse):
+    """Serves a file acquired from the image cache, releasing it once sent (or the client is gone)"""
+
+    def __init__(self, cache: ImageCache, path: Path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.cache.release(self.path)
+
+
+@router.get("/{destination_id}", response_class=FileResponse)
+async def get_destination_image(
+    destination_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=WIDTHS[-1], description=f"Width in pixels, rounded up to one of {', '.join(map(str, WIDTHS))}"),
+):
+    """
+    A destination's image from the local cache, scaled to ``w`` and
+    re-encoded as WebP for browsers that accept it.
+    """
+    if not is_valid_id(destination_id):
+        raise HTTPException(status_code=400, detail="Invalid destination ID")
+    destination = await get_destination_repository().get(destination_id)
+    if not destination:
+        raise HTTPException(status_code=404, detail="Destination not found")
+    
+    webp = WEBP_SUPPORTED and "image/webp" in request.headers.get("accept", "")
+    cache = get_image_cache()
+    try:
+        path = await cache.acquire(destination["image"], w, "webp" if webp else ("jpeg" if w else None))
+    except ImageUnavailable as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=502, detail="Image unavailable")
+    
+    # Variants are named after the original's content hash, so the name identifies the bytes
+    etag = f'"{path.name}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        cache.release(path)
+        return Response(status_code=304, headers=headers)
+    # FileResponse hands the path to servers that support zero-copy sends, and streams it otherwise;
+    # the file stays pinned in the cache until then, so eviction cannot delete it mid-response
+    return CachedFileResponse(cache, path, media_type=media_type(path), headers=headers)
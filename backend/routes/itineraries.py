@@ -1,8 +1,16 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from bson import ObjectId
-from models import Itinerary, ItineraryCreate, ItineraryWithDestinations, Destination
-from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from typing import List, Optional, Union
+from models import Itinerary, ItineraryCreate, ItineraryWithDestinations, OptimizedItinerary
+from changes import record_change
+from destination_ids import get_destination_ids
+from idempotency import REPLAYED_HEADER, IdempotencyKeyReused, fingerprint, get_idempotency_store
+from loaders import DestinationLoader, expand_destinations, expand_stream, get_destination_loader
+from storage import get_destination_repository, get_itinerary_repository, is_valid_id
+from streaming import NEXT_CURSOR_HEADER, ndjson_response, wants_ndjson
+from datetime import date, datetime
+from normalize import normalize_itinerary
+from serialization import FastJSONResponse, dumps, serializer_for
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,71 +18,76 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/itineraries", tags=["itineraries"])
 
 
-def get_db():
-    from server import db
-    return db
+def get_repo():
+    return get_itinerary_repository()
 
 
-def calculate_duration(start_date: str, end_date: str) -> str:
-    """Calculate duration between two dates"""
-    try:
-        start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-        end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-        days = (end - start).days + 1
-        return f"{days} day{'s' if days != 1 else ''}"
-    except:
-        return ""
+async def plan_stops(destination_ids: List[str], days: Optional[int]):
+    """Optimized stop order and day split; the search runs off the event loop"""
+    # Imported on first use so NumPy stays out of server startup
+    from routing import plan_route
+
+    docs = await get_destination_repository().get_many(list(dict.fromkeys(destination_ids)))
+    return await asyncio.to_thread(plan_route, destination_ids, docs, days or 1)
 
 
-@router.get("", response_model=List[Itinerary])
-async def get_itineraries():
+@router.get("", response_model=List[Union[ItineraryWithDestinations, Itinerary]])
+async def get_itineraries(
+    request: Request,
+    loader: DestinationLoader = Depends(get_destination_loader),
+    expand: Optional[str] = Query(None, pattern="^destinations$", description="'destinations' inlines full destination documents"),
+    start_from: Optional[date] = Query(None, description="Only trips starting on or after this date (YYYY-MM-DD)"),
+    start_to: Optional[date] = Query(None, description="Only trips starting on or before this date (YYYY-MM-DD)"),
+    limit: int = Query(100, ge=1, le=1000, description="Page size"),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header of the previous page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$", description="'ndjson' streams every itinerary, one per line")
+):
     """
-    Get all itineraries
+    Get itineraries, newest first, one keyset-paginated page at a time.
+    With expand=destinations every destination on the page is resolved in one batched lookup;
+    an NDJSON export resolves them a batch of itineraries at a time.
     """
     try:
-        db = get_db()
-        itineraries = await db.itineraries.find().sort("createdAt", -1).to_list(100)
-        
-        for itinerary in itineraries:
-            itinerary["_id"] = str(itinerary["_id"])
-            # Convert destination ObjectIds to strings
-            itinerary["destinations"] = [str(d) for d in itinerary.get("destinations", [])]
-        
-        return itineraries
+        repo = get_repo()
+        if wants_ndjson(request, format):
+            docs = repo.stream(cursor=cursor, start_from=start_from, start_to=start_to)
+            if expand:
+                return await ndjson_response(expand_stream(docs), ItineraryWithDestinations)
+            return await ndjson_response(docs, Itinerary)
+        
+        page = await repo.page(limit=limit, cursor=cursor, start_from=start_from, start_to=start_to)
+        headers = {NEXT_CURSOR_HEADER: page.next_cursor} if page.next_cursor else None
+        if expand:
+            body = serializer_for(ItineraryWithDestinations).encode_many(await expand_destinations(loader, page.items))
+        else:
+            body = serializer_for(Itinerary).encode_many(page.items)
+        return FastJSONResponse(body, headers=headers)
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching itineraries: {e}")
         raise HTTPException(status_code=500, detail="Error fetching itineraries")
 
 
 @router.get("/{itinerary_id}", response_model=ItineraryWithDestinations)
-async def get_itinerary(itinerary_id: str):
+async def get_itinerary(itinerary_id: str, loader: DestinationLoader = Depends(get_destination_loader)):
     """
     Get a single itinerary with populated destination details
     """
     try:
-        db = get_db()
-        
-        if not ObjectId.is_valid(itinerary_id):
+        if not is_valid_id(itinerary_id):
             raise HTTPException(status_code=400, detail="Invalid itinerary ID")
         
-        itinerary = await db.itineraries.find_one({"_id": ObjectId(itinerary_id)})
+        itinerary = await get_repo().get(itinerary_id)
         
         if not itinerary:
             raise HTTPException(status_code=404, detail="Itinerary not found")
         
         # Fetch full destination details
-        destination_ids = [ObjectId(d) for d in itinerary.get("destinations", [])]
-        destinations = await db.destinations.find({"_id": {"$in": destination_ids}}).to_list(100)
+        [itinerary] = await expand_destinations(loader, [itinerary])
         
-        # Convert ObjectIds to strings
-        for dest in destinations:
-            dest["_id"] = str(dest["_id"])
-        
-        itinerary["_id"] = str(itinerary["_id"])
-        itinerary["destinations"] = destinations
-        
-        return itinerary
+        return FastJSONResponse(serializer_for(ItineraryWithDestinations).encode(itinerary))
     
     except HTTPException:
         raise
@@ -83,44 +96,89 @@ async def get_itinerary(itinerary_id: str):
         raise HTTPException(status_code=500, detail="Error fetching itinerary")
 
 
+async def insert_itinerary(itinerary: ItineraryCreate, optimize: bool) -> bytes:
+    """Validate and store ``itinerary``; returns the created document, serialized"""
+    # Validate that all destination IDs exist
+    if not all(is_valid_id(d) for d in itinerary.destinations):
+        raise HTTPException(status_code=400, detail="Invalid destination ID(s)")
+    
+    # Answered in memory unless a destination is new to this process
+    if await (await get_destination_ids()).missing(itinerary.destinations):
+        raise HTTPException(status_code=400, detail="One or more destinations not found")
+    
+    # Dates were validated by the model; store them with the trip length
+    itinerary_dict = normalize_itinerary(itinerary.model_dump())
+    itinerary_dict["createdAt"] = datetime.utcnow()
+    if optimize:
+        route = await plan_stops(itinerary_dict["destinations"], itinerary_dict["durationDays"])
+        itinerary_dict["destinations"] = route.destinations
+        itinerary_dict["stopDays"] = route.stop_days
+    
+    body = serializer_for(Itinerary).encode(await get_repo().create(itinerary_dict))
+    record_change("itinerary.created", body)
+    return body
+
+
 @router.post("", response_model=Itinerary)
-async def create_itinerary(itinerary: ItineraryCreate):
+async def create_itinerary(
+    itinerary: ItineraryCreate,
+    optimize: bool = Query(False, description="Reorder the stops into the shortest route and split them across the trip days"),
+    idempotency_key: Optional[str] = Header(None, max_length=255, description="Retries with the same key return the first response instead of creating a duplicate"),
+):
     """
-    Create a new itinerary
+    Create a new itinerary. With an Idempotency-Key, concurrent duplicates
+    wait for the first request and later retries replay its response.
     """
     try:
-        db = get_db()
-        
-        # Validate that all destination IDs exist
-        destination_ids = [ObjectId(d) for d in itinerary.destinations if ObjectId.is_valid(d)]
-        
-        if len(destination_ids) != len(itinerary.destinations):
-            raise HTTPException(status_code=400, detail="Invalid destination ID(s)")
-        
-        existing_count = await db.destinations.count_documents({"_id": {"$in": destination_ids}})
-        if existing_count != len(destination_ids):
-            raise HTTPException(status_code=400, detail="One or more destinations not found")
+        if idempotency_key is None:
+            return FastJSONResponse(await insert_itinerary(itinerary, optimize))
+        
+        request_fingerprint = fingerprint(b"POST /api/itineraries", b"%d" % optimize, dumps(itinerary.model_dump()))
+        body, replayed = await get_idempotency_store().run(
+            ("itineraries.create", idempotency_key), request_fingerprint, lambda: insert_itinerary(itinerary, optimize)
+        )
+        return FastJSONResponse(body, headers={REPLAYED_HEADER: "true"} if replayed else None)
+    
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating itinerary: {e}")
+        raise HTTPException(status_code=500, detail=f"Error creating itinerary: {str(e)}")
+
+
+@router.post("/{itinerary_id}/optimize", response_model=OptimizedItinerary)
+async def optimize_itinerary(itinerary_id: str):
+    """
+    Reorder an itinerary's stops into the shortest route found within the
+    time budget and split them across the trip days. Stops without
+    coordinates stay at the end, in their current order.
+    """
+    try:
+        if not is_valid_id(itinerary_id):
+            raise HTTPException(status_code=400, detail="Invalid itinerary ID")
         
-        # Prepare itinerary data
-        itinerary_dict = itinerary.dict()
-        itinerary_dict["createdAt"] = datetime.utcnow()
-        itinerary_dict["duration"] = calculate_duration(itinerary.startDate, itinerary.endDate)
+        itinerary = await get_repo().get(itinerary_id)
+        if not itinerary:
+            raise HTTPException(status_code=404, detail="Itinerary not found")
         
-        # Insert itinerary
-        result = await db.itineraries.insert_one(itinerary_dict)
+        route = await plan_stops(itinerary["destinations"], itinerary.get("durationDays"))
+        updated = await get_repo().set_stops(itinerary_id, route.destinations, route.stop_days)
+        if not updated:
+            raise HTTPException(status_code=404, detail="Itinerary not found")
         
-        # Fetch created itinerary
-        created_itinerary = await db.itineraries.find_one({"_id": result.inserted_id})
-        created_itinerary["_id"] = str(created_itinerary["_id"])
-        created_itinerary["destinations"] = [str(d) for d in created_itinerary["destinations"]]
+        record_change("itinerary.updated", serializer_for(Itinerary).encode(updated))
         
-        return created_itinerary
+        return FastJSONResponse(serializer_for(OptimizedItinerary).encode({
+            **updated, "distanceKm": route.distance_km, "originalDistanceKm": route.original_distance_km,
+        }))
     
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating itinerary: {e}")
-        raise HTTPException(status_code=500, detail=f"Error creating itinerary: {str(e)}")
+        logger.error(f"Error optimizing itinerary: {e}")
+        raise HTTPException(status_code=500, detail="Error optimizing itinerary")
 
 
 @router.delete("/{itinerary_id}")
@@ -129,16 +187,16 @@ async def delete_itinerary(itinerary_id: str):
     Delete an itinerary
     """
     try:
-        db = get_db()
-        
-        if not ObjectId.is_valid(itinerary_id):
+        if not is_valid_id(itinerary_id):
             raise HTTPException(status_code=400, detail="Invalid itinerary ID")
         
-        result = await db.itineraries.delete_one({"_id": ObjectId(itinerary_id)})
+        deleted = await get_repo().delete(itinerary_id)
         
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Itinerary not found")
         
+        record_change("itinerary.deleted", dumps({"_id": itinerary_id}))
+        
         return {"message": "Itinerary deleted successfully"}
     
     except HTTPException:
@@ -0,0 +1,103 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Optional
+import uuid
+from datetime import datetime, timezone
+
+from database import (
+    insert_status_check, fetch_status_checks, fetch_status_rollups,
+    get_status_batcher, STATUS_QUERY_LIMIT, ROLLUP_BUCKETS,
+)
+from metrics import timed
+from storage.base import decode_cursor, encode_cursor
+from streaming import NEXT_CURSOR_HEADER
+
+router = APIRouter(prefix="/api/status", tags=["status"])
+
+
+class StatusCheck(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    client_name: str
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class StatusCheckCreate(BaseModel):
+    client_name: str
+
+
+class StatusRollup(BaseModel):
+    bucket: str
+    client_name: str
+    count: int
+
+
+def to_utc_iso(value: Optional[datetime]) -> Optional[str]:
+    """Normalize a query bound to the UTC ISO-8601 form used in storage"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+@router.post("", response_model=StatusCheck)
+async def create_status_check(input: StatusCheckCreate):
+    status_obj = StatusCheck(**input.model_dump())
+
+    with timed("status.insert"):
+        await insert_status_check(status_obj.id, status_obj.client_name, status_obj.timestamp.isoformat())
+
+    return status_obj
+
+
+def status_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    if cursor is None:
+        return None
+    values = decode_cursor(cursor)
+    if len(values) != 3 or values[0] != "t" or not isinstance(values[1], str) or not isinstance(values[2], int):
+        raise ValueError("Invalid cursor")
+    return values[1], values[2]
+
+
+@router.get("", response_model=List[StatusCheck])
+async def get_status_checks(
+    response: Response,
+    since: Optional[datetime] = Query(None, description="Only checks at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only checks before this time"),
+    client_name: Optional[str] = Query(None),
+    limit: int = Query(STATUS_QUERY_LIMIT, ge=1, le=10000),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header of the previous page"),
+):
+    """Status checks, newest first; the cursor for the next (older) page comes back in X-Next-Cursor"""
+    try:
+        before = status_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with timed("status.fetch", lambda: f"since={since} until={until} client_name={client_name!r}"):
+        rows = await fetch_status_checks(to_utc_iso(since), to_utc_iso(until), client_name, limit + 1, before)
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor("t", rows[-1][2], rows[-1][3])
+    return [StatusCheck(id=r[0], client_name=r[1], timestamp=datetime.fromisoformat(r[2])) for r in rows]
+
+
+@router.get("/aggregate", response_model=List[StatusRollup])
+async def get_status_aggregate(
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    client_name: Optional[str] = Query(None),
+    bucket: str = Query("minute", pattern=f"^({'|'.join(ROLLUP_BUCKETS)})$"),
+):
+    """Status check counts per client, served from the per-minute rollup table"""
+    with timed("status.aggregate", lambda: f"since={since} until={until} bucket={bucket}"):
+        rows = await fetch_status_rollups(to_utc_iso(since), to_utc_iso(until), client_name, bucket)
+    return [StatusRollup(bucket=r[0], client_name=r[1], count=r[2]) for r in rows]
+
+
+@router.get("/batches")
+async def get_status_batch_stats():
+    """Group-commit counters for status check writes"""
+    return get_status_batcher().stats()
@@ -0,0 +1,266 @@
+"""
+Stop ordering for itineraries.
+
+``plan_route`` orders an itinerary's destinations into the shortest route
+it can find within a time budget, then splits that route into trip days.
+Distances are great-circle kilometres from a NumPy distance matrix, cached
+per set of destinations. Up to ``EXACT_MAX_STOPS`` stops the shortest
+route is found exactly (Held-Karp); longer ones use a nearest-neighbour
+tour improved with 2-opt, restarted from different stops while the
+budget lasts.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from geo import EARTH_RADIUS_KM
+from metrics import registry
+from storage.base import Document
+
+MATRIX_CACHE_ENTRIES = 256
+# Search time per optimization; the best route found so far is used after it
+TIME_BUDGET = float(os.environ.get("ROUTE_OPTIMIZE_MS", 50)) / 1000
+# Ignore 2-opt gains below this many km, so rounding noise cannot loop forever
+MIN_GAIN = 1e-9
+# Largest route solved exactly; the dynamic program grows as n^2 * 2^n (a few ms at 9)
+EXACT_MAX_STOPS = 9
+
+Point = Tuple[str, float, float]
+
+
+def distance_matrix(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Pairwise haversine distances in km, computed for all pairs at once"""
+    phi, lam = np.radians(lats), np.radians(lons)
+    dphi = phi[:, None] - phi[None, :]
+    dlam = lam[:, None] - lam[None, :]
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi)[:, None] * np.cos(phi)[None, :] * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class MatrixCache:
+    """
+    LRU of distance matrices keyed by the destination set and coordinates,
+    so a destination that moves gets a new entry instead of a stale one.
+    Matrices are stored in key order and permuted to the caller's order.
+    """
+
+    def __init__(self, max_entries: int = MATRIX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, points: Sequence[Point]) -> np.ndarray:
+        order = sorted(range(len(points)), key=points.__getitem__)
+        key = tuple(points[i] for i in order)
+        with self._lock:
+            matrix = self._entries.get(key)
+            if matrix is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if matrix is None:
+            matrix = distance_matrix(np.array([p[1] for p in key]), np.array([p[2] for p in key]))
+            matrix.setflags(write=False)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = matrix
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        # Row i of the result is points[i]; key position of points[i] is rank[i]
+        rank = np.empty(len(points), dtype=np.intp)
+        rank[order] = np.arange(len(points))
+        return matrix[np.ix_(rank, rank)]
+
+
+_matrices = MatrixCache()
+
+
+def get_matrix_cache() -> MatrixCache:
+    return _matrices
+
+
+@registry.collector
+def matrix_cache_metrics():
+    yield "# TYPE route_matrix_cache_requests_total counter"
+    yield f'route_matrix_cache_requests_total{{result="hits"}} {_matrices.hits}'
+    yield f'route_matrix_cache_requests_total{{result="misses"}} {_matrices.misses}'
+
+
+def route_length(matrix: np.ndarray, path: Sequence[int]) -> float:
+    path = np.asarray(path)
+    return float(matrix[path[:-1], path[1:]].sum()) if len(path) > 1 else 0.0
+
+
+def nearest_neighbour_tour(matrix: np.ndarray, start: int) -> np.ndarray:
+    n = len(matrix)
+    tour = np.empty(n, dtype=np.intp)
+    visited = np.zeros(n, dtype=bool)
+    current = start
+    for i in range(n):
+        tour[i] = current
+        visited[current] = True
+        if i < n - 1:
+            current = int(np.argmin(np.where(visited, np.inf, matrix[current])))
+    return tour
+
+
+def two_opt(matrix: np.ndarray, tour: np.ndarray, deadline: float) -> np.ndarray:
+    """
+    Improve a closed tour by reversing segments while that shortens it. For
+    each edge, every candidate second edge is scored in one vector operation.
+    """
+    tour = tour.copy()
+    n = len(tour)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(n - 2):
+            a, b = tour[i], tour[i + 1]
+            c = tour[i + 2:]
+            d = np.roll(tour, -1)[i + 2:]
+            gain = matrix[a, b] + matrix[c, d] - matrix[a, c] - matrix[b, d]
+            if i == 0:
+                # The last edge shares a node with the first
+                gain = gain[:-1]
+            if len(gain) == 0:
+                continue
+            best = int(np.argmax(gain))
+            if gain[best] > MIN_GAIN:
+                j = i + 2 + best
+                tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1].copy()
+                improved = True
+    return tour
+
+
+def exact_path(matrix: np.ndarray) -> List[int]:
+    """
+    Shortest open path through every point, by dynamic programming over
+    subsets: ``length[mask, j]`` is the shortest path visiting ``mask`` and
+    ending at ``j``, with every ending in a mask relaxed in one operation.
+    """
+    n = len(matrix)
+    full = (1 << n) - 1
+    length = np.full((full + 1, n), np.inf)
+    previous = np.full((full + 1, n), -1, dtype=np.intp)
+    nodes = np.arange(n)
+    length[1 << nodes, nodes] = 0.0
+    for mask in range(1, full + 1):
+        ends = nodes[(mask >> nodes) & 1 == 1]
+        if len(ends) < 2:
+            continue
+        # Row e: paths over mask without e, ending anywhere, then extended to e
+        candidates = length[mask ^ (1 << ends)] + matrix[:, ends].T
+        best = np.argmin(candidates, axis=1)
+        length[mask, ends] = candidates[np.arange(len(ends)), best]
+        previous[mask, ends] = best
+    path = [int(np.argmin(length[full]))]
+    mask = full
+    while previous[mask, path[-1]] >= 0:
+        mask, path = mask ^ (1 << path[-1]), path + [int(previous[mask, path[-1]])]
+    return path[::-1]
+
+
+def shortest_path(matrix: np.ndarray, budget: float = TIME_BUDGET) -> List[int]:
+    """
+    Shortest open path through every point: exact up to ``EXACT_MAX_STOPS``,
+    otherwise the best found within ``budget`` seconds. A node at distance
+    zero from every point turns the path into a closed tour, so the usual
+    tour heuristics pick the best endpoints too.
+    """
+    n = len(matrix)
+    if n <= 2:
+        return list(range(n))
+    if n <= EXACT_MAX_STOPS:
+        return exact_path(matrix)
+    closed = np.zeros((n + 1, n + 1))
+    closed[:n, :n] = matrix
+    deadline = time.perf_counter() + budget
+    best, best_length = None, np.inf
+    # Start from the free endpoint first, then from each stop while time remains
+    for start in [n, *range(n)]:
+        tour = two_opt(closed, nearest_neighbour_tour(closed, start), deadline)
+        length = route_length(closed, np.append(tour, tour[0]))
+        if length < best_length - MIN_GAIN:
+            best, best_length = tour, length
+        if time.perf_counter() >= deadline:
+            break
+    free = int(np.flatnonzero(best == n)[0])
+    return [int(i) for i in np.roll(best, -free)[1:]]
+
+
+def split_days(legs: Sequence[float], days: int) -> List[int]:
+    """
+    Day number (1-based) for each of ``len(legs) + 1`` consecutive stops, so
+    the longest day of travel is as short as possible; among equally long
+    longest days, the least total travel (overnight legs are the long ones).
+    """
+    stops = len(legs) + 1
+    days = max(1, min(days, stops))
+    prefix = np.concatenate(([0.0], np.cumsum(legs)))
+
+    def travel(first: int, last: int) -> float:
+        # Travel within one day visiting stops first..last
+        return float(prefix[last] - prefix[first])
+
+    unreachable = (np.inf, np.inf)
+    # cost[k][j]: best (longest day, total) for stops[:j] in k days; cut[k][j]: first stop of day k
+    cost = [[unreachable] * (stops + 1) for _ in range(days + 1)]
+    cut = [[0] * (stops + 1) for _ in range(days + 1)]
+    cost[0][0] = (0.0, 0.0)
+    for k in range(1, days + 1):
+        for j in range(k, stops - (days - k) + 1):
+            for i in range(k - 1, j):
+                if cost[k - 1][i] == unreachable:
+                    continue
+                day = travel(i, j - 1)
+                candidate = (max(cost[k - 1][i][0], day), cost[k - 1][i][1] + day)
+                if candidate < cost[k][j]:
+                    cost[k][j], cut[k][j] = candidate, i
+    assignment = [0] * stops
+    j = stops
+    for k in range(days, 0, -1):
+        i = cut[k][j]
+        assignment[i:j] = [k] * (j - i)
+        j = i
+    return assignment
+
+
+class Route(NamedTuple):
+    destinations: List[str]
+    stop_days: List[int]
+    distance_km: float
+    original_distance_km: float
+
+
+def plan_route(destination_ids: Sequence[str], docs: Sequence[Document], days: int, budget: float = TIME_BUDGET) -> Route:
+    """
+    Reorder ``destination_ids`` (``docs`` holds their documents) and assign
+    stops to ``days``. Stops without coordinates cannot be placed on the
+    route; they keep their relative order at the end, on the last day.
+    """
+    coordinates = {doc["_id"]: (doc.get("lat"), doc.get("lon")) for doc in docs}
+    points: List[Point] = []
+    unlocated: List[str] = []
+    for destination_id in destination_ids:
+        lat, lon = coordinates.get(destination_id, (None, None))
+        if lat is None or lon is None:
+            unlocated.append(destination_id)
+        else:
+            points.append((destination_id, lat, lon))
+    matrix = get_matrix_cache().get(points)
+
+    path = shortest_path(matrix, budget)
+    stop_days = split_days([float(matrix[a, b]) for a, b in zip(path, path[1:])], days) if path else []
+    last_day = stop_days[-1] if stop_days else 1
+    return Route(
+        destinations=[points[i][0] for i in path] + unlocated,
+        stop_days=stop_days + [last_day] * len(unlocated),
+        distance_km=round(route_length(matrix, path), 3),
+        original_distance_km=round(route_length(matrix, range(len(points))), 3),
+    )
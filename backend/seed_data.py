@@ -1,15 +1,17 @@
-"""Seed initial destination data into MongoDB"""
+"""Seed initial destination data into the configured storage backend"""
 
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
 import asyncio
-from datetime import datetime
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+from database import init_db
+from ingest import ingest_destinations, parse_records
+from storage import get_destination_repository, init_storage
+
 # Initial destinations data (from mock.js)
 destinations_data = [
     {
@@ -21,8 +23,8 @@ destinations_data = [
         "activities": ["Swimming", "Kayaking", "Sunset Views", "Beach Shacks"],
         "bestTime": "November to March",
         "price": "₹₹",
-        "createdAt": datetime.utcnow(),
-        "updatedAt": datetime.utcnow()
+        "lat": 15.01,
+        "lon": 74.0232
     },
     {
         "name": "Anjuna Beach",
@@ -33,8 +35,8 @@ destinations_data = [
         "activities": ["Flea Market", "Water Sports", "Beach Parties", "Cliff Views"],
         "bestTime": "October to March",
         "price": "₹₹₹",
-        "createdAt": datetime.utcnow(),
-        "updatedAt": datetime.utcnow()
+        "lat": 15.5733,
+        "lon": 73.74
     },
     {
         "name": "Agonda Beach",
@@ -45,8 +47,8 @@ destinations_data = [
         "activities": ["Yoga", "Dolphin Watching", "Beach Walks", "Meditation"],
         "bestTime": "November to February",
         "price": "₹₹",
-        "createdAt": datetime.utcnow(),
-        "updatedAt": datetime.utcnow()
+        "lat": 15.0447,
+        "lon": 73.9869
     },
     {
         "name": "Candolim Beach",
@@ -57,8 +59,8 @@ destinations_data = [
         "activities": ["Parasailing", "Jet Skiing", "Beach Dining", "Fort Exploration"],
         "bestTime": "December to February",
         "price": "₹₹₹",
-        "createdAt": datetime.utcnow(),
-        "updatedAt": datetime.utcnow()
+        "lat": 15.518,
+        "lon": 73.762
     },
     {
         "name": "Morjim Beach",
@@ -69,8 +71,8 @@ destinations_data = [
         "activities": ["Turtle Spotting", "Bird Watching", "Beach Dining", "Quiet Walks"],
         "bestTime": "November to March",
         "price": "₹₹",
-        "createdAt": datetime.utcnow(),
-        "updatedAt": datetime.utcnow()
+        "lat": 15.631,
+        "lon": 73.7365
     },
     {
         "name": "Cola Beach",
@@ -81,36 +83,36 @@ destinations_data = [
         "activities": ["Lagoon Swimming", "Camping", "Photography", "Nature Walks"],
         "bestTime": "October to March",
         "price": "₹",
-        "createdAt": datetime.utcnow(),
-        "updatedAt": datetime.utcnow()
+        "lat": 15.0487,
+        "lon": 73.9684
     }
 ]
 
 
-async def seed_destinations():
-    """Seed destinations into MongoDB"""
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ['DB_NAME']]
+async def read_file(path, chunk_size=1 << 16):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+async def seed_destinations(path=None):
+    """
+    Upsert destinations by name, leaving any other rows alone: the built-in
+    list, or an NDJSON / JSON-array feed file when ``path`` is given
+    """
+    init_db()
+    init_storage()
+    records = parse_records(read_file(path)) if path else destinations_data
     
     try:
-        # Clear existing destinations
-        await db.destinations.delete_many({})
-        print("Cleared existing destinations")
-        
-        # Insert new destinations
-        result = await db.destinations.insert_many(destinations_data)
-        print(f"Inserted {len(result.inserted_ids)} destinations")
-        
-        # Verify
-        count = await db.destinations.count_documents({})
-        print(f"Total destinations in database: {count}")
+        result = await ingest_destinations(records, get_destination_repository(), upsert=True)
+        print(f"Inserted {result.inserted} and updated {result.updated} destinations")
+        for error in result.errors:
+            print(f"Row {error.index}: {error.error}")
         
     except Exception as e:
         print(f"Error seeding data: {e}")
-    finally:
-        client.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(seed_destinations())
+    asyncio.run(seed_destinations(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,108 @@
+"""
+Fast JSON encoding of trusted storage documents.
+
+Documents coming back from the storage layer were validated when they were
+written, so read endpoints can opt out of FastAPI's ``response_model``
+pass (validate every dict into a model, then dump it again) and encode the
+documents directly. ``TrustedSerializer`` only projects a document onto
+the model's fields, in the model's order and under its aliases, so the
+bytes on the wire are the same as pydantic's ``model_dump_json(by_alias=True)``.
+orjson is used when installed; the standard library encoder otherwise.
+"""
+
+import json
+import typing
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, matching pydantic's output for plain data"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+_MISSING = object()
+Converter = Optional[Callable[[Any], Any]]
+
+
+def _converter(annotation: Any) -> Converter:
+    """How to turn a stored value into what the model would emit, or None to pass it through"""
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+        return _converter(args[0])
+    if annotation is float:
+        # An int stored in a float field is emitted as 5.0 by pydantic
+        return float
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return serializer_for(annotation).to_builtins
+    if typing.get_origin(annotation) in (list, List) and args:
+        item = _converter(args[0])
+        if item is not None:
+            return lambda values: [item(value) for value in values]
+    return None
+
+
+class TrustedSerializer:
+    """Encodes storage documents as ``model`` would, without validating them"""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.fields: List[Tuple[str, str, Any, Converter]] = []
+        for name, field in model.model_fields.items():
+            default = None if field.is_required() else field.get_default(call_default_factory=True)
+            self.fields.append((field.alias or name, name, default, _converter(field.annotation)))
+
+    def to_builtins(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        out = {}
+        for key, name, default, convert in self.fields:
+            value = doc.get(key, _MISSING)
+            if value is _MISSING:
+                value = doc.get(name, default)
+            out[key] = value if convert is None or value is None else convert(value)
+        return out
+
+    def encode(self, doc: Dict[str, Any]) -> bytes:
+        return dumps(self.to_builtins(doc))
+
+    def encode_many(self, docs: Iterable[Dict[str, Any]]) -> bytes:
+        to_builtins = self.to_builtins
+        return dumps([to_builtins(doc) for doc in docs])
+
+
+@lru_cache(maxsize=None)
+def serializer_for(model: Type[BaseModel]) -> TrustedSerializer:
+    return TrustedSerializer(model)
+
+
+class FastJSONResponse(Response):
+    """JSON response whose content is already-trusted data (or pre-encoded bytes)"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
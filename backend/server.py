@@ -1,130 +1,198 @@
-from fastapi import FastAPI, APIRouter
+import time
+
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List
-import uuid
-from datetime import datetime, timezone
-import sqlite3
-import json
+from typing import Dict, Optional
+
+import catalog
+from admission import AdmissionMiddleware
+from backup import start_backups, warm_start
+from catalog_cache import get_catalog_cache
+from config import AppConfig
+from database import init_db, open_pool, close_pool, get_status_batcher
+from images import close_image_cache
+from idempotency import REPLAYED_HEADER
+from metrics import CONTENT_TYPE, Gauge, MetricsMiddleware, registry
+from retention import start_retention
+from routes.admin import router as admin_router
+from routes.changes import router as changes_router
+from routes.destinations import router as destinations_router
+from routes.images import router as images_router
+from routes.itineraries import router as itineraries_router
+from routes.status import router as status_router
+from storage import close_storage, init_storage
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# SQLite connection
-DB_PATH = ROOT_DIR / "travel.db"
-
-# Initialize database
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS status_checks
-                 (id TEXT PRIMARY KEY, 
-                  client_name TEXT, 
-                  timestamp TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS destinations
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT,
-                  description TEXT,
-                  country TEXT,
-                  best_time_to_visit TEXT,
-                  image_url TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS itineraries
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  destination_id INTEGER,
-                  day_number INTEGER,
-                  activity TEXT,
-                  description TEXT)''')
-    conn.commit()
-    conn.close()
-
-# Initialize database on startup
-init_db()
-
-# Create the main app
-app = FastAPI()
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = registry.register(Gauge(
+    "app_startup_seconds", "Time spent in each startup phase of the last start", ("phase",)))
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Define Models
-class StatusCheck(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    client_name: str
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class StatusCheckCreate(BaseModel):
-    client_name: str
-
 # Routes
 @api_router.get("/")
 async def root():
     return {"message": "Hello World"}
 
-@api_router.post("/status", response_model=StatusCheck)
-async def create_status_check(input: StatusCheckCreate):
-    status_obj = StatusCheck(**input.model_dump())
-    
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT INTO status_checks (id, client_name, timestamp) VALUES (?, ?, ?)",
-              (status_obj.id, status_obj.client_name, status_obj.timestamp.isoformat()))
-    conn.commit()
-    conn.close()
-    
-    return status_obj
-
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT id, client_name, timestamp FROM status_checks")
-    rows = c.fetchall()
-    conn.close()
-    
-    status_checks = []
-    for row in rows:
-        status_checks.append(StatusCheck(
-            id=row[0],
-            client_name=row[1],
-            timestamp=datetime.fromisoformat(row[2])
-        ))
-    
-    return status_checks
-
-# Import and include route modules
-try:
-    from routes.destinations import router as destinations_router
-    from routes.itineraries import router as itineraries_router
+@api_router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+@registry.collector
+def component_metrics():
+    """Counters kept by the status batcher and the catalog cache"""
+    batcher = get_status_batcher().stats()
+    cache = get_catalog_cache().stats()
+    yield "# TYPE status_batches_total counter"
+    yield f"status_batches_total {batcher['batches']}"
+    yield "# TYPE status_batch_rows_total counter"
+    yield f"status_batch_rows_total {batcher['rows']}"
+    yield "# TYPE status_batch_pending gauge"
+    yield f"status_batch_pending {batcher['pending']}"
+    yield "# TYPE catalog_cache_requests_total counter"
+    for result in ("hits", "misses", "not_modified"):
+        yield f'catalog_cache_requests_total{{result="{result}"}} {cache[result]}'
+    yield "# TYPE catalog_cache_bytes gauge"
+    yield f"catalog_cache_bytes {cache['bytes']}"
+    yield "# TYPE catalog_cache_entries gauge"
+    yield f"catalog_cache_entries {cache['entries']}"
+
+
+class StartupTimer:
+    """Wall-clock time per startup phase, logged once and exported as a gauge"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        yield
+        self.phases[name] = time.perf_counter() - started
+        STARTUP_SECONDS.set(self.phases[name], name)
+
+    def report(self) -> None:
+        phases = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.phases.items())
+        logger.info(f"Startup completed in {sum(self.phases.values()) * 1000:.1f} ms ({phases})")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open storage, warm caches and start background jobs; undo it all on shutdown"""
+    config: AppConfig = app.state.config
+    timer = StartupTimer()
+    with timer.phase("database"):
+        pool = open_pool(config.sqlite_path, config.pool_size)
+        # Connections are opened lazily, so the file can still be replaced here
+        warm_start(pool.path, config.restore_from)
+        init_db()
+    with timer.phase("storage"):
+        init_storage(config.storage_backend)
+    if config.snapshot_path:
+        catalog.use_snapshot(config.snapshot_path)
+    if config.warm_up:
+        with timer.phase("warm_up"):
+            await catalog.warm_up()
+    retention_task: Optional[asyncio.Task] = start_retention() if config.background_jobs else None
+    backup_task: Optional[asyncio.Task] = start_backups(pool.path) if config.background_jobs else None
+    timer.report()
+    app.state.startup = timer.phases
+    try:
+        yield
+    finally:
+        for task in (retention_task, backup_task):
+            if task is not None:
+                task.cancel()
+        await get_status_batcher().close()
+        await close_image_cache()
+        await catalog.clear()
+        close_storage()
+        close_pool()
+
+
+def create_app(config: Optional[AppConfig] = None) -> FastAPI:
+    """
+    Build the API. Nothing is opened here: connections, pools and caches
+    are created by the lifespan handler, so building an app is cheap.
+    """
+    started = time.perf_counter()
+    config = config or AppConfig.from_env()
+    app = FastAPI(lifespan=lifespan)
+    app.state.config = config
+
     app.include_router(destinations_router)
     app.include_router(itineraries_router)
-except ImportError as e:
-    print(f"Note: Some routes not available: {e}")
-
-# Include the base api_router
-app.include_router(api_router)
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://127.0.0.1:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    app.include_router(status_router)
+    app.include_router(changes_router)
+    app.include_router(images_router)
+    app.include_router(admin_router)
+    app.include_router(api_router)
+
+    # Inside CORS, so rejected requests still carry CORS headers and browsers can read Retry-After
+    if config.admission_control:
+        app.add_middleware(AdmissionMiddleware)
+
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=list(config.cors_origins),
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", REPLAYED_HEADER, "Retry-After"],
+    )
+
+    # Outermost, so CORS preflights and error responses are measured too
+    app.add_middleware(MetricsMiddleware)
+
+    STARTUP_SECONDS.set(started - _import_started, "import")
+    STARTUP_SECONDS.set(time.perf_counter() - started, "create_app")
+    return app
+
+
+app = create_app()
+
+
+async def publish_snapshot(config: AppConfig) -> None:
+    """Build the catalog snapshot once, before any worker starts"""
+    bootstrap = create_app(config)
+    async with bootstrap.router.lifespan_context(bootstrap):
+        await catalog.publish_snapshot()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
 
 if __name__ == "__main__":
+    import argparse
+    import os
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Run the API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)),
+                        help="Worker processes; more than one serves the catalog from a shared snapshot")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Workers re-import this module and read the snapshot path from the environment
+        os.environ.setdefault("CATALOG_SNAPSHOT", str(ROOT_DIR / "catalog.snap"))
+        asyncio.run(publish_snapshot(AppConfig.from_env(background_jobs=False, warm_up=False)))
+        uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,223 @@
+"""
+Precomputed "similar destinations" recommendations.
+
+Every destination gets a TF-IDF vector over the words of its description
+and its activities (activities weigh more: they are what a traveller picks
+a place for). Terms are hashed into a fixed number of dimensions so the
+vectors are a dense NumPy matrix whatever the vocabulary. The index keeps
+each destination's ``MAX_NEIGHBOURS`` most similar destinations in two
+arrays, so a recommendation request is a row lookup.
+
+A new destination is compared with every existing one in a single
+matrix-vector product, and is inserted into the neighbour lists it makes
+it into. IDF weights are fixed when the index is built, so once the
+catalog has grown by ``REBUILD_GROWTH`` the index is rebuilt from storage.
+"""
+
+import asyncio
+import re
+import zlib
+from collections import Counter
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import catalog
+from storage import DestinationRepository, get_destination_repository
+from storage.base import Document
+
+# Pairwise build cost is linear in this; 512 keeps hash collisions rare for a travel vocabulary
+DIMENSIONS = 512
+MAX_NEIGHBOURS = 20
+ACTIVITY_WEIGHT = 3.0
+# Rows compared at once while building; bounds the similarity block to BUILD_BLOCK x n
+BUILD_BLOCK = 1024
+REBUILD_GROWTH = 1.25
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _bucket(term: str) -> int:
+    # crc32 rather than hash(): the same term lands in the same dimension in every process
+    return zlib.crc32(term.encode()) % DIMENSIONS
+
+
+def term_counts(doc: Document) -> Dict[int, float]:
+    """Weighted term frequencies of ``doc``, by hashed dimension"""
+    counts: Counter = Counter()
+    for word in TOKEN.findall(doc.get("description", "").casefold()):
+        if len(word) > 2:
+            counts[_bucket(word)] += 1.0
+    for activity in doc.get("activities", []):
+        counts[_bucket("activity:" + activity.casefold())] += ACTIVITY_WEIGHT
+    return counts
+
+
+class SimilarityIndex:
+    """Destination vectors plus each destination's nearest neighbours by cosine similarity"""
+
+    def __init__(self, capacity: int = 64):
+        self.ids: List[str] = []
+        self.ordinals: Dict[str, int] = {}
+        self.idf = np.ones(DIMENSIONS, dtype=np.float32)
+        # Rows past len(ids) are spare capacity
+        self.vectors = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self.neighbours = np.full((capacity, MAX_NEIGHBOURS), -1, dtype=np.int32)
+        self.scores = np.full((capacity, MAX_NEIGHBOURS), -np.inf, dtype=np.float32)
+        self.built_size = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def stale(self) -> bool:
+        """True once enough destinations were added since the build that the IDF weights are off"""
+        return len(self.ids) > max(MAX_NEIGHBOURS, self.built_size * REBUILD_GROWTH)
+
+    def _fill(self, start: int, counts: Sequence[Dict[int, float]]) -> None:
+        """Write unit-length TF-IDF vectors for ``counts`` into rows ``start`` onwards"""
+        rows = np.repeat(np.arange(start, start + len(counts)), [len(c) for c in counts])
+        buckets = np.fromiter((b for c in counts for b in c), dtype=np.intp, count=len(rows))
+        tf = np.fromiter((f for c in counts for f in c.values()), dtype=np.float32, count=len(rows))
+        vectors = self.vectors[start:start + len(counts)]
+        vectors[:] = 0
+        self.vectors[rows, buckets] = (1 + np.log(tf)) * self.idf[buckets]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+
+    def _grow(self, size: int) -> None:
+        capacity = len(self.vectors)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        for name, fill in (("vectors", 0.0), ("neighbours", -1), ("scores", -np.inf)):
+            old = getattr(self, name)
+            new = np.full((capacity, old.shape[1]), fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    @classmethod
+    def build(cls, docs: Sequence[Document]) -> "SimilarityIndex":
+        """Vectors and neighbour lists for the whole catalog (CPU-bound; run it in a thread)"""
+        # Room to grow until the next rebuild without reallocating
+        index = cls(capacity=max(64, int(len(docs) * REBUILD_GROWTH) + 1))
+        counts = []
+        for doc in docs:
+            if doc["_id"] not in index.ordinals:
+                index.ordinals[doc["_id"]] = len(index.ids)
+                index.ids.append(doc["_id"])
+                counts.append(term_counts(doc))
+        n = len(index.ids)
+        df = np.zeros(DIMENSIONS, dtype=np.float32)
+        for c in counts:
+            df[list(c)] += 1
+        index.idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        index._fill(0, counts)
+
+        vectors = index.vectors[:n]
+        k = min(MAX_NEIGHBOURS, n - 1)
+        for start in range(0, n, BUILD_BLOCK):
+            block = vectors[start:start + BUILD_BLOCK] @ vectors.T
+            rows = np.arange(len(block))
+            block[rows, rows + start] = -np.inf
+            if k <= 0:
+                continue
+            top = np.argpartition(block, n - k, axis=1)[:, n - k:]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            index.neighbours[start:start + len(block), :k] = np.take_along_axis(top, order, axis=1)
+            index.scores[start:start + len(block), :k] = np.take_along_axis(top_scores, order, axis=1)
+        index.built_size = n
+        return index
+
+    def add(self, doc: Document) -> None:
+        """Add one destination, updating every neighbour list it belongs in"""
+        if doc["_id"] in self.ordinals:
+            return
+        ordinal = len(self.ids)
+        self._grow(ordinal + 1)
+        self._fill(ordinal, [term_counts(doc)])
+        vector = self.vectors[ordinal]
+        self.ids.append(doc["_id"])
+        self.ordinals[doc["_id"]] = ordinal
+        if ordinal == 0:
+            return
+
+        similarity = self.vectors[:ordinal] @ vector
+        k = min(MAX_NEIGHBOURS, ordinal)
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top], kind="stable")]
+        self.neighbours[ordinal, :k] = top
+        self.scores[ordinal, :k] = similarity[top]
+
+        # Existing destinations whose last neighbour is less similar than the new one
+        for other in np.flatnonzero(similarity > self.scores[:ordinal, -1]):
+            scores = self.scores[other]
+            position = int(np.searchsorted(-scores, -similarity[other], side="right"))
+            self.scores[other, position + 1:] = scores[position:-1].copy()
+            self.neighbours[other, position + 1:] = self.neighbours[other, position:-1].copy()
+            self.scores[other, position] = similarity[other]
+            self.neighbours[other, position] = ordinal
+
+    def similar(self, destination_id: str, k: int) -> Optional[List[Tuple[str, float]]]:
+        """Up to ``k`` (ID, similarity) pairs, most similar first; None for an unknown ID"""
+        ordinal = self.ordinals.get(destination_id)
+        if ordinal is None:
+            return None
+        found = []
+        for neighbour, score in zip(self.neighbours[ordinal, :k], self.scores[ordinal, :k]):
+            if neighbour < 0:
+                break
+            found.append((self.ids[neighbour], float(score)))
+        return found
+
+
+async def _collect(docs: AsyncIterator[Document]) -> List[Document]:
+    return [doc async for doc in docs]
+
+
+_index: Optional[SimilarityIndex] = None
+_building: Optional[asyncio.Lock] = None
+# Bumped by every write so a build that raced a write is thrown away
+_generation = 0
+
+
+async def get_similarity_index(repo: Optional[DestinationRepository] = None) -> SimilarityIndex:
+    """Return the similarity index, building it from the whole catalog on first use"""
+    global _index, _building
+    if _index is not None:
+        return _index
+    if _building is None:
+        _building = asyncio.Lock()
+    async with _building:
+        while _index is None:
+            generation = _generation
+            docs = await _collect((repo or get_destination_repository()).stream())
+            index = await asyncio.to_thread(SimilarityIndex.build, docs)
+            if generation == _generation:
+                _index = index
+    return _index
+
+
+def add_to_similarity_index(docs: Iterable[Document]) -> None:
+    global _generation, _index
+    _generation += 1
+    if _index is not None:
+        for doc in docs:
+            _index.add(doc)
+        if _index.stale:
+            _index = None
+
+
+def reset_similarity_index() -> None:
+    """Drop the index; the next recommendation request rebuilds it from storage"""
+    global _index, _generation
+    _generation += 1
+    _index = None
+
+
+@catalog.on_write
+def _destinations_written(docs: Optional[List[Document]]) -> None:
+    if docs is None:
+        reset_similarity_index()
+    else:
+        add_to_similarity_index(docs)
@@ -0,0 +1,364 @@
+"""
+Read-only catalog snapshot shared by worker processes through mmap.
+
+One process writes the whole destination catalog and its facet bitmaps to
+a file. Every worker maps that file, so the pages sit in the OS page cache
+once however many workers there are. A new version is written next to the
+old one and renamed over it, which is atomic. Workers notice the new inode
+and swap their mapping between requests; requests still holding the old
+mapping keep reading the old file until they finish.
+
+Layout (little-endian):
+
+    header   magic, version, meta length
+    meta     JSON: count, section offsets, posting directory, activity labels
+    ids      count x 24-byte destination IDs in catalog order (position = ordinal)
+    lookup   count x (ID, uint32 ordinal), sorted by ID for binary search
+    offsets  (count + 1) x uint64 offsets of each document in ``docs``
+    docs     JSON documents, concatenated
+    bitmaps  one ceil(count / 8)-byte bitmap per posting
+
+Full-text search is not copied: the SQLite FTS index is already a single
+on-disk structure that every worker shares.
+"""
+
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from facets import FacetIndex, bitmap_bytes
+from serialization import dumps, loads
+from storage.base import Document
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout or posting keys change; older files are ignored and republished
+MAGIC = b"GOACAT02"
+HEADER = struct.Struct("<8sQQ")
+ID_WIDTH = 24
+LOOKUP = struct.Struct(f"<{ID_WIDTH}sI")
+OFFSET = struct.Struct("<Q")
+# How often a worker checks whether a newer snapshot was published
+CHECK_INTERVAL = 0.02
+
+
+def _facet_postings(docs: Sequence[Document]) -> Tuple[Dict[Tuple[str, Any], List[int]], Dict[str, str]]:
+    """Ordinal lists per (facet, value), using the same keys as ``FacetIndex``"""
+    keys = FacetIndex()
+    postings: Dict[Tuple[str, Any], List[int]] = defaultdict(list)
+    for ordinal, doc in enumerate(docs):
+        for key in keys._keys(doc):
+            postings[key].append(ordinal)
+    return postings, keys.activity_labels
+
+
+def write_snapshot(path: Path, docs: List[Document], version: int) -> None:
+    """Write ``docs`` (in catalog order) as snapshot ``version`` to a temporary file and rename it over ``path``"""
+    count = len(docs)
+    postings, labels = _facet_postings(docs)
+    keys = sorted(postings, key=repr)
+    ids = [doc["_id"].encode().ljust(ID_WIDTH) for doc in docs]
+    lookup = b"".join(LOOKUP.pack(ids[o], o) for o in sorted(range(count), key=ids.__getitem__))
+
+    bodies = [dumps(doc) for doc in docs]
+    offsets = bytearray()
+    position = 0
+    for body in bodies:
+        offsets += OFFSET.pack(position)
+        position += len(body)
+    offsets += OFFSET.pack(position)
+
+    directory: Dict[str, List[List[Any]]] = defaultdict(list)
+    for index, (facet, value) in enumerate(keys):
+        directory[facet].append([value, index])
+
+    def meta_bytes(start: int) -> bytes:
+        sections = {}
+        for name, size in (("ids", count * ID_WIDTH), ("lookup", len(lookup)), ("offsets", len(offsets)), ("docs", position)):
+            sections[name] = start
+            start += size
+        sections["bitmaps"] = start
+        return dumps({
+            "count": count,
+            "sections": sections,
+            "bitmap_size": (count + 7) // 8,
+            "postings": directory,
+            "activity_labels": labels,
+        })
+
+    # Section offsets depend on the length of the meta block that holds them
+    meta = meta_bytes(HEADER.size)
+    while len(meta_bytes(HEADER.size + len(meta))) != len(meta):
+        meta = meta_bytes(HEADER.size + len(meta))
+    meta = meta_bytes(HEADER.size + len(meta))
+
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, version, len(meta)))
+        f.write(meta)
+        f.write(b"".join(ids))
+        f.write(lookup)
+        f.write(offsets)
+        for body in bodies:
+            f.write(body)
+        for key in keys:
+            f.write(bitmap_bytes(postings[key], count))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CatalogSnapshot:
+    """One mapped snapshot version"""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self.identity = os.fstat(f.fileno()).st_ino
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, meta_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        meta = loads(self._map[HEADER.size:HEADER.size + meta_length])
+        self.count: int = meta["count"]
+        self._sections: Dict[str, int] = meta["sections"]
+        self._bitmap_size: int = meta["bitmap_size"]
+        self.postings: Dict[str, Dict[Any, int]] = {
+            facet: {value: index for value, index in entries} for facet, entries in meta["postings"].items()
+        }
+        self.activity_labels: Dict[str, str] = meta["activity_labels"]
+        self._facets: Optional["SnapshotFacetIndex"] = None
+
+    def id_at(self, ordinal: int) -> str:
+        start = self._sections["ids"] + ordinal * ID_WIDTH
+        return self._map[start:start + ID_WIDTH].decode().rstrip()
+
+    def ordinal(self, destination_id: str) -> Optional[int]:
+        """Binary search of the sorted lookup table"""
+        target = destination_id.encode().ljust(ID_WIDTH)
+        base, low, high = self._sections["lookup"], 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = base + middle * LOOKUP.size
+            if self._map[start:start + ID_WIDTH] < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            found, ordinal = LOOKUP.unpack_from(self._map, base + low * LOOKUP.size)
+            if found == target:
+                return ordinal
+        return None
+
+    def document(self, ordinal: int) -> Document:
+        start = self._sections["offsets"] + ordinal * OFFSET.size
+        begin, end = struct.unpack_from("<QQ", self._map, start)
+        docs = self._sections["docs"]
+        return loads(self._map[docs + begin:docs + end])
+
+    def get(self, destination_id: str) -> Optional[Document]:
+        ordinal = self.ordinal(destination_id)
+        return self.document(ordinal) if ordinal is not None else None
+
+    def bitmap(self, index: int) -> int:
+        start = self._sections["bitmaps"] + index * self._bitmap_size
+        return int.from_bytes(self._map[start:start + self._bitmap_size], "little")
+
+    @property
+    def facets(self) -> "SnapshotFacetIndex":
+        if self._facets is None:
+            self._facets = SnapshotFacetIndex(self)
+        return self._facets
+
+
+class _Ids(Sequence):
+    def __init__(self, snapshot: CatalogSnapshot):
+        self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+    def __getitem__(self, ordinal):
+        return self._snapshot.id_at(ordinal)
+
+
+class _Ordinals(Mapping):
+    def __init__(self, snapshot: CatalogSnapshot):
+        self._snapshot = snapshot
+
+    def __getitem__(self, destination_id: str) -> int:
+        ordinal = self._snapshot.ordinal(destination_id)
+        if ordinal is None:
+            raise KeyError(destination_id)
+        return ordinal
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_Ids(self._snapshot))
+
+    def __len__(self) -> int:
+        return self._snapshot.count
+
+
+class _Postings(Mapping):
+    """Bitmaps are read out of the mapping on access, so workers share one copy"""
+
+    def __init__(self, snapshot: CatalogSnapshot, entries: Dict[Any, int]):
+        self._snapshot = snapshot
+        self._entries = entries
+
+    def __getitem__(self, value) -> int:
+        return self._snapshot.bitmap(self._entries[value])
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SnapshotFacetIndex(FacetIndex):
+    """``FacetIndex`` whose ordinals, IDs and postings live in a snapshot"""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        super().__init__()
+        self.ids = _Ids(snapshot)
+        self.ordinals = _Ordinals(snapshot)
+        self.all = (1 << snapshot.count) - 1
+        self.postings = {facet: _Postings(snapshot, snapshot.postings.get(facet, {})) for facet in self.FACETS}
+        self.activity_labels = snapshot.activity_labels
+
+    def add(self, doc: Document) -> None:
+        raise TypeError("Snapshots are read-only; publish a new version instead")
+
+
+class SnapshotManager:
+    """Tracks the newest published snapshot at ``path`` and publishes new ones"""
+
+    def __init__(self, path: Path, load: Callable[[], AsyncIterator[Document]]):
+        self.path = Path(path)
+        self._load = load
+        self._current: Optional[CatalogSnapshot] = None
+        self._checked = 0.0
+        self._listeners: List[Callable[[CatalogSnapshot], None]] = []
+        self._dirty = False
+        self._publishing: Optional[asyncio.Task] = None
+
+    def on_swap(self, listener: Callable[[CatalogSnapshot], None]) -> None:
+        self._listeners.append(listener)
+
+    def current(self) -> Optional[CatalogSnapshot]:
+        """The newest snapshot, re-checking the file at most every ``CHECK_INTERVAL``"""
+        now = time.monotonic()
+        if now - self._checked >= CHECK_INTERVAL:
+            self._checked = now
+            try:
+                identity = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                return self._current
+            if self._current is None or identity != self._current.identity:
+                try:
+                    snapshot = CatalogSnapshot(self.path)
+                except ValueError as e:
+                    logger.warning(f"Ignoring catalog snapshot: {e}")
+                    return self._current
+                self._swap(snapshot)
+        return self._current
+
+    def _swap(self, snapshot: CatalogSnapshot) -> None:
+        previous = self._current
+        self._current = snapshot
+        if previous is not None and previous.version != snapshot.version:
+            logger.info(f"Catalog snapshot {previous.version} -> {snapshot.version}")
+        for listener in self._listeners:
+            listener(snapshot)
+
+    async def publish(self) -> CatalogSnapshot:
+        """
+        Rebuild from storage and publish. The file lock spans the read, so
+        of two concurrent publishers the later one sees both writes.
+        """
+        lock = open(self.path.with_name(self.path.name + ".lock"), "a+")
+        try:
+            await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX)
+            started = time.perf_counter()
+            docs = [doc async for doc in self._load()]
+            version = 1
+            if self.path.exists():
+                with open(self.path, "rb") as f:
+                    header = f.read(HEADER.size)
+                if len(header) == HEADER.size and header[:8] == MAGIC:
+                    version = HEADER.unpack(header)[1] + 1
+            await asyncio.to_thread(write_snapshot, self.path, docs, version)
+            self._swap(CatalogSnapshot(self.path))
+            self._checked = time.monotonic()
+            logger.info(f"Published catalog snapshot {version} ({len(docs)} destinations) in {time.perf_counter() - started:.2f}s")
+            return self._current
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+    def schedule_publish(self) -> None:
+        """Publish in the background; writes arriving meanwhile are folded into one more rebuild"""
+        self._dirty = True
+        if self._publishing is None or self._publishing.done():
+            self._publishing = asyncio.get_running_loop().create_task(self._publish_pending())
+
+    async def _publish_pending(self) -> None:
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.publish()
+            except Exception as e:
+                logger.error(f"Error publishing catalog snapshot: {e}")
+
+    async def close(self) -> None:
+        if self._publishing is not None and not self._publishing.done():
+            await self._publishing
+
+
+class SnapshotReads:
+    """
+    Destination repository wrapper that answers ID lookups from the snapshot
+    and sends everything else, and IDs the snapshot does not have yet, to
+    storage. Updates become visible here once the next version is published.
+    """
+
+    def __init__(self, repo, manager: SnapshotManager):
+        self._repo = repo
+        self._manager = manager
+
+    def __getattr__(self, attr: str):
+        return getattr(self._repo, attr)
+
+    def _split(self, destination_ids: Iterable[str]) -> Tuple[List[Document], List[str]]:
+        snapshot = self._manager.current()
+        if snapshot is None:
+            return [], list(destination_ids)
+        found, missing = [], []
+        for destination_id in destination_ids:
+            doc = snapshot.get(destination_id)
+            if doc is None:
+                missing.append(destination_id)
+            else:
+                found.append(doc)
+        return found, missing
+
+    async def get(self, destination_id: str) -> Optional[Document]:
+        found, missing = self._split([destination_id])
+        return found[0] if found else await self._repo.get(destination_id)
+
+    async def get_many(self, destination_ids: Iterable[str]) -> List[Document]:
+        found, missing = self._split(destination_ids)
+        if missing:
+            found.extend(await self._repo.get_many(missing))
+        return found
+
+    async def count_existing(self, destination_ids: Iterable[str]) -> int:
+        found, missing = self._split(set(destination_ids))
+        return len(found) + (await self._repo.count_existing(missing) if missing else 0)
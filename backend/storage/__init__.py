@@ -0,0 +1,93 @@
+"""Storage backends for the destination catalog and itineraries
+
+``STORAGE_BACKEND`` selects the implementation: ``sqlite`` (default, uses the
+shared pool from ``database``) or ``mongo`` (Motor, configured by
+``MONGO_URL``/``DB_NAME``). The Mongo driver is only imported when chosen.
+Repositories are wrapped so every call is timed into the storage metrics.
+A read layer (``use_read_layer``) can sit between the two, e.g. to answer
+destination lookups from a shared catalog snapshot.
+"""
+
+import os
+from typing import Callable, Optional
+
+from metrics import TimedRepository
+from storage.base import DestinationRepository, ItineraryRepository, is_valid_id, new_id
+
+__all__ = [
+    "DestinationRepository",
+    "ItineraryRepository",
+    "get_destination_repository",
+    "get_itinerary_repository",
+    "close_storage",
+    "init_storage",
+    "use_read_layer",
+    "is_valid_id",
+    "new_id",
+]
+
+_backend: Optional[str] = None
+_destinations: Optional[DestinationRepository] = None
+_itineraries: Optional[ItineraryRepository] = None
+_read_layer: Optional[Callable[[DestinationRepository], DestinationRepository]] = None
+
+
+def storage_backend() -> str:
+    return _backend or os.environ.get("STORAGE_BACKEND", "sqlite").lower()
+
+
+def init_storage(backend: Optional[str] = None) -> None:
+    """Select and prepare the backend (creates SQLite tables and indexes)"""
+    global _backend
+    close_storage()
+    _backend = backend.lower() if backend else None
+    if storage_backend() == "sqlite":
+        from database import get_pool
+        from storage.sqlite import init_schema
+
+        with get_pool().connection() as conn:
+            init_schema(conn)
+
+
+def close_storage() -> None:
+    """Drop the repositories (and the Mongo client, if one was opened)"""
+    global _destinations, _itineraries
+    _destinations = _itineraries = None
+    if storage_backend() == "mongo":
+        from storage.mongo import close_client
+        close_client()
+
+
+def use_read_layer(layer: Optional[Callable[[DestinationRepository], DestinationRepository]]) -> None:
+    """Wrap the destination repository in ``layer`` (None removes it)"""
+    global _read_layer, _destinations
+    _read_layer = layer
+    _destinations = None
+
+
+def get_destination_repository() -> DestinationRepository:
+    global _destinations
+    if _destinations is None:
+        if storage_backend() == "mongo":
+            from storage.mongo import MongoDestinationRepository
+            repo = MongoDestinationRepository()
+        else:
+            from storage.sqlite import SQLiteDestinationRepository
+            repo = SQLiteDestinationRepository()
+        if _read_layer is not None:
+            repo = _read_layer(repo)
+        _destinations = TimedRepository(repo, "destinations")
+    return _destinations
+
+
+def get_itinerary_repository() -> ItineraryRepository:
+    global _itineraries
+    if _itineraries is None:
+        if storage_backend() == "mongo":
+            from storage.mongo import MongoItineraryRepository
+            repo = MongoItineraryRepository()
+        else:
+            from storage.sqlite import SQLiteItineraryRepository
+            repo = SQLiteItineraryRepository()
+        _itineraries = TimedRepository(repo, "itineraries")
+    return _itineraries
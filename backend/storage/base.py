@@ -0,0 +1,192 @@
+"""Repository interfaces shared by every storage backend"""
+
+import base64
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+Document = Dict[str, Any]
+
+# Rows fetched per round trip when streaming a whole result set
+STREAM_BATCH_SIZE = 500
+
+
+class Page(NamedTuple):
+    items: List[Document]
+    next_cursor: Optional[str]
+
+_counter = int.from_bytes(os.urandom(3), "big")
+_counter_lock = threading.Lock()
+_process_bytes = os.urandom(5)
+
+
+def new_id() -> str:
+    """
+    Generate a 24-character hex ID laid out like a MongoDB ObjectId
+    (timestamp, random, counter), so IDs look the same whichever backend
+    issued them and sort roughly by creation time.
+    """
+    global _counter
+    with _counter_lock:
+        _counter = (_counter + 1) & 0xFFFFFF
+        counter = _counter
+    return (
+        int(time.time()).to_bytes(4, "big") + _process_bytes + counter.to_bytes(3, "big")
+    ).hex()
+
+
+def is_valid_id(value: str) -> bool:
+    """Check that ``value`` is a 24-character hex ID"""
+    if len(value) != 24:
+        return False
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def encode_cursor(*values: Any) -> str:
+    """Pack the sort key of the last row on a page into an opaque cursor"""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Inverse of ``encode_cursor``; raises ValueError for anything it did not produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or not values:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+class DestinationRepository(ABC):
+    """Storage for the destination catalog; documents use the ``Destination`` model shape"""
+
+    @abstractmethod
+    async def page(
+        self,
+        location: Optional[str] = None,
+        search: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Page:
+        """
+        One page of destinations matching the filters, oldest first (best
+        match first when searching). Pass ``next_cursor`` back to continue.
+        """
+
+    async def list(
+        self,
+        location: Optional[str] = None,
+        search: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[Document]:
+        """First ``limit`` destinations matching the filters"""
+        return (await self.page(location=location, search=search, limit=limit)).items
+
+    async def stream(
+        self,
+        location: Optional[str] = None,
+        search: Optional[str] = None,
+        cursor: Optional[str] = None,
+    ) -> AsyncIterator[Document]:
+        """Every matching destination, fetched ``STREAM_BATCH_SIZE`` rows at a time"""
+        while True:
+            batch = await self.page(location=location, search=search, limit=STREAM_BATCH_SIZE, cursor=cursor)
+            for doc in batch.items:
+                yield doc
+            if batch.next_cursor is None:
+                return
+            cursor = batch.next_cursor
+
+    async def ids(self) -> List[str]:
+        """Every destination ID"""
+        return [doc["_id"] async for doc in self.stream()]
+
+    @abstractmethod
+    async def search_ids(self, search: str) -> List[str]:
+        """IDs of every destination matching a full-text search, unranked"""
+
+    @abstractmethod
+    async def get(self, destination_id: str) -> Optional[Document]:
+        """A single destination, or None if it does not exist"""
+
+    @abstractmethod
+    async def get_many(self, destination_ids: Iterable[str]) -> List[Document]:
+        """All existing destinations among ``destination_ids``"""
+
+    @abstractmethod
+    async def count_existing(self, destination_ids: Iterable[str]) -> int:
+        """How many of ``destination_ids`` exist"""
+
+    @abstractmethod
+    async def create(self, data: Document) -> Document:
+        """Insert a destination and return the stored document"""
+
+    @abstractmethod
+    async def bulk_write(self, docs: List[Document], upsert: bool = False) -> Tuple[int, int]:
+        """
+        Write ``docs`` as one batch (one transaction where the backend has
+        them). With ``upsert``, a doc replaces the destination with the same
+        name instead of adding a second one. Returns ``(inserted, updated)``.
+        If it raises, calling it again with the same docs must not write
+        any of them twice.
+        """
+
+
+class ItineraryRepository(ABC):
+    """Storage for user itineraries; documents use the ``Itinerary`` model shape"""
+
+    @abstractmethod
+    async def page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        start_from: Optional[date] = None,
+        start_to: Optional[date] = None,
+    ) -> Page:
+        """One page of itineraries starting within the (inclusive) date range, newest first"""
+
+    async def list(self, limit: int = 100) -> List[Document]:
+        """Newest ``limit`` itineraries"""
+        return (await self.page(limit=limit)).items
+
+    async def stream(
+        self,
+        cursor: Optional[str] = None,
+        start_from: Optional[date] = None,
+        start_to: Optional[date] = None,
+    ) -> AsyncIterator[Document]:
+        """Every matching itinerary, fetched ``STREAM_BATCH_SIZE`` rows at a time"""
+        while True:
+            batch = await self.page(limit=STREAM_BATCH_SIZE, cursor=cursor, start_from=start_from, start_to=start_to)
+            for doc in batch.items:
+                yield doc
+            if batch.next_cursor is None:
+                return
+            cursor = batch.next_cursor
+
+    @abstractmethod
+    async def get(self, itinerary_id: str) -> Optional[Document]:
+        """A single itinerary, or None if it does not exist"""
+
+    @abstractmethod
+    async def create(self, data: Document) -> Document:
+        """Insert an itinerary and return the stored document"""
+
+    @abstractmethod
+    async def set_stops(self, itinerary_id: str, destinations: List[str], stop_days: Optional[List[int]]) -> Optional[Document]:
+        """Replace the stop order and trip day of each stop; returns the updated itinerary, or None if it does not exist"""
+
+    @abstractmethod
+    async def delete(self, itinerary_id: str) -> bool:
+        """Delete an itinerary; returns False if it did not exist"""
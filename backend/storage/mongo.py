@@ -0,0 +1,260 @@
+"""MongoDB storage backend for destinations and itineraries"""
+
+import logging
+import os
+import re
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from normalize import best_time_mask, normalize_itinerary, price_tier
+
+from storage.base import (
+    Document, DestinationRepository, ItineraryRepository, Page,
+    STREAM_BATCH_SIZE, decode_cursor, encode_cursor,
+)
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def get_database():
+    """Return the Motor database named by MONGO_URL/DB_NAME, connecting on first use"""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    return _client[os.environ["DB_NAME"]]
+
+
+def close_client() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def migrate(db=None) -> None:
+    """
+    One-off backfill of the typed fields derived from free text, plus the
+    index behind itinerary date-range queries. Safe to run repeatedly.
+    """
+    db = db if db is not None else get_database()
+    updates = []
+    async for doc in db.destinations.find({"bestTimeMask": {"$exists": False}}, {"bestTime": 1, "price": 1}):
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+            "bestTimeMask": best_time_mask(doc["bestTime"]),
+            "priceTier": price_tier(doc["price"]),
+        }}))
+    if updates:
+        await db.destinations.bulk_write(updates, ordered=False)
+
+    updates, skipped = [], 0
+    async for doc in db.itineraries.find({"durationDays": {"$exists": False}}, {"startDate": 1, "endDate": 1}):
+        try:
+            fields = normalize_itinerary({"startDate": doc["startDate"], "endDate": doc["endDate"]})
+        except ValueError:
+            skipped += 1
+            continue
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+    if updates:
+        await db.itineraries.bulk_write(updates, ordered=False)
+    if skipped:
+        logger.warning(f"{skipped} itineraries have unparseable dates and were left as they are")
+
+    await db.itineraries.create_index([("startDate", ASCENDING), ("_id", ASCENDING)])
+
+
+def _is_duplicate_id(error: dict) -> bool:
+    if error.get("code") != DUPLICATE_KEY:
+        return False
+    # keyPattern is reported by MongoDB 4.4+; older servers only name the index in the message
+    key_pattern = error.get("keyPattern")
+    return list(key_pattern) == ["_id"] if key_pattern else "index: _id_ " in error.get("errmsg", "")
+
+
+def _destination(doc: Document) -> Document:
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+
+def _itinerary(doc: Document) -> Document:
+    doc["_id"] = str(doc["_id"])
+    doc["destinations"] = [str(d) for d in doc.get("destinations", [])]
+    return doc
+
+
+def _keyset(cursor: Optional[str], op: str) -> dict:
+    """Query clause for rows after a ``(createdAt, _id)`` cursor in ``op`` direction"""
+    if cursor is None:
+        return {}
+    values = decode_cursor(cursor)
+    if len(values) != 3 or values[0] != "k" or not ObjectId.is_valid(values[2]):
+        raise ValueError("Invalid cursor")
+    try:
+        created_at = datetime.fromisoformat(values[1])
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+    object_id = ObjectId(values[2])
+    return {"$or": [
+        {"createdAt": {op: created_at}},
+        {"createdAt": created_at, "_id": {op: object_id}},
+    ]}
+
+
+def _next_cursor(docs: List[Document], limit: int) -> Optional[str]:
+    if len(docs) <= limit:
+        return None
+    last = docs[limit - 1]
+    return encode_cursor("k", last["createdAt"].isoformat(), str(last["_id"]))
+
+
+class MongoDestinationRepository(DestinationRepository):
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_database()
+
+    @staticmethod
+    def _query(location, search) -> dict:
+        query = {}
+        if location:
+            query["location"] = location
+        if search:
+            pattern = re.escape(search)
+            query["$or"] = [
+                {"name": {"$regex": pattern, "$options": "i"}},
+                {"location": {"$regex": pattern, "$options": "i"}},
+                {"description": {"$regex": pattern, "$options": "i"}},
+                {"activities": {"$regex": pattern, "$options": "i"}}
+            ]
+        return query
+
+    async def page(self, location=None, search=None, limit=100, cursor=None) -> Page:
+        query = {"$and": [self._query(location, search), _keyset(cursor, "$gt")]}
+        docs = await self.db.destinations.find(query).sort(
+            [("createdAt", 1), ("_id", 1)]
+        ).to_list(limit + 1)
+        next_cursor = _next_cursor(docs, limit)
+        return Page([_destination(d) for d in docs[:limit]], next_cursor)
+
+    async def stream(self, location=None, search=None, cursor=None) -> AsyncIterator[Document]:
+        query = {"$and": [self._query(location, search), _keyset(cursor, "$gt")]}
+        found = self.db.destinations.find(query).sort(
+            [("createdAt", 1), ("_id", 1)]
+        ).batch_size(STREAM_BATCH_SIZE)
+        async for doc in found:
+            yield _destination(doc)
+
+    async def ids(self) -> List[str]:
+        return [str(doc["_id"]) async for doc in self.db.destinations.find({}, {"_id": 1})]
+
+    async def search_ids(self, search: str) -> List[str]:
+        found = self.db.destinations.find(self._query(None, search), {"_id": 1})
+        return [str(doc["_id"]) async for doc in found]
+
+    async def get(self, destination_id: str) -> Optional[Document]:
+        destination = await self.db.destinations.find_one({"_id": ObjectId(destination_id)})
+        return _destination(destination) if destination else None
+
+    async def get_many(self, destination_ids: Iterable[str]) -> List[Document]:
+        ids = [ObjectId(d) for d in destination_ids]
+        destinations = await self.db.destinations.find({"_id": {"$in": ids}}).to_list(None)
+        return [_destination(d) for d in destinations]
+
+    async def count_existing(self, destination_ids: Iterable[str]) -> int:
+        ids = [ObjectId(d) for d in set(destination_ids)]
+        return await self.db.destinations.count_documents({"_id": {"$in": ids}})
+
+    async def create(self, data: Document) -> Document:
+        result = await self.db.destinations.insert_one(dict(data))
+        return {"_id": str(result.inserted_id), **data}
+
+    async def _insert_many(self, docs: List[Document]) -> int:
+        """
+        Insert ``docs`` unordered, so one bad doc does not stop the others.
+        Each doc is given its ``_id`` here, once: when a batch that partly
+        failed is sent again, the docs written the first time come back as
+        duplicate ``_id`` errors and are counted instead of written twice.
+        """
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+        try:
+            result = await self.db.destinations.insert_many([dict(d) for d in docs], ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if not all(_is_duplicate_id(error) for error in errors):
+                raise
+            return e.details["nInserted"] + len(errors)
+        return len(result.inserted_ids)
+
+    async def bulk_write(self, docs: List[Document], upsert: bool = False) -> Tuple[int, int]:
+        if not upsert:
+            return await self._insert_many(docs), 0
+        # Last doc wins when a batch repeats a name, as it would in SQLite
+        by_name = {doc["name"]: doc for doc in docs}
+        operations = []
+        for name, doc in by_name.items():
+            fields = {k: v for k, v in doc.items() if k != "createdAt"}
+            operations.append(UpdateOne(
+                {"name": name},
+                {"$set": fields, "$setOnInsert": {"createdAt": doc.get("createdAt")}},
+                upsert=True,
+            ))
+        result = await self.db.destinations.bulk_write(operations, ordered=False)
+        return result.upserted_count, len(docs) - result.upserted_count
+
+
+class MongoItineraryRepository(ItineraryRepository):
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_database()
+
+    @staticmethod
+    def _query(cursor, start_from, start_to) -> dict:
+        query = _keyset(cursor, "$lt")
+        starts = {}
+        if start_from is not None:
+            starts["$gte"] = start_from.isoformat()
+        if start_to is not None:
+            starts["$lte"] = start_to.isoformat()
+        if starts:
+            query = {"$and": [query, {"startDate": starts}]}
+        return query
+
+    async def page(self, limit=100, cursor=None, start_from=None, start_to=None) -> Page:
+        docs = await self.db.itineraries.find(self._query(cursor, start_from, start_to)).sort(
+            [("createdAt", -1), ("_id", -1)]
+        ).to_list(limit + 1)
+        next_cursor = _next_cursor(docs, limit)
+        return Page([_itinerary(i) for i in docs[:limit]], next_cursor)
+
+    async def stream(self, cursor=None, start_from=None, start_to=None) -> AsyncIterator[Document]:
+        found = self.db.itineraries.find(self._query(cursor, start_from, start_to)).sort(
+            [("createdAt", -1), ("_id", -1)]
+        ).batch_size(STREAM_BATCH_SIZE)
+        async for doc in found:
+            yield _itinerary(doc)
+
+    async def get(self, itinerary_id: str) -> Optional[Document]:
+        itinerary = await self.db.itineraries.find_one({"_id": ObjectId(itinerary_id)})
+        return _itinerary(itinerary) if itinerary else None
+
+    async def create(self, data: Document) -> Document:
+        result = await self.db.itineraries.insert_one(dict(data))
+        return {"_id": str(result.inserted_id), **data}
+
+    async def set_stops(self, itinerary_id: str, destinations: List[str], stop_days: Optional[List[int]]) -> Optional[Document]:
+        itinerary = await self.db.itineraries.find_one_and_update(
+            {"_id": ObjectId(itinerary_id)},
+            {"$set": {"destinations": destinations, "stopDays": stop_days}},
+            return_document=ReturnDocument.AFTER,
+        )
+        return _itinerary(itinerary) if itinerary else None
+
+    async def delete(self, itinerary_id: str) -> bool:
+        result = await self.db.itineraries.delete_one({"_id": ObjectId(itinerary_id)})
+        return result.deleted_count > 0
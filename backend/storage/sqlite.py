@@ -0,0 +1,563 @@
+"""SQLite storage backend for destinations and itineraries"""
+
+import json
+import logging
+import re
+import sqlite3
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from database import get_pool
+from normalize import best_time_mask, normalize_itinerary, price_tier
+from storage.base import (
+    Document, DestinationRepository, ItineraryRepository, Page,
+    decode_cursor, encode_cursor, new_id,
+)
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS destinations
+       (id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        location TEXT NOT NULL,
+        description TEXT NOT NULL,
+        image TEXT NOT NULL,
+        rating REAL NOT NULL,
+        best_time TEXT NOT NULL,
+        price TEXT NOT NULL,
+        created_at TEXT,
+        updated_at TEXT,
+        best_time_mask INTEGER NOT NULL DEFAULT 0,
+        price_tier INTEGER,
+        lat REAL,
+        lon REAL)''',
+    "CREATE INDEX IF NOT EXISTS idx_destinations_location ON destinations (location)",
+    "CREATE INDEX IF NOT EXISTS idx_destinations_name ON destinations (name)",
+    "CREATE INDEX IF NOT EXISTS idx_destinations_created ON destinations (created_at, id)",
+    '''CREATE TABLE IF NOT EXISTS destination_activities
+       (destination_id TEXT NOT NULL REFERENCES destinations (id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        activity TEXT NOT NULL,
+        PRIMARY KEY (destination_id, position)) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_destination_activities_activity ON destination_activities (activity)",
+    '''CREATE TABLE IF NOT EXISTS itineraries
+       (id TEXT PRIMARY KEY,
+        trip_name TEXT NOT NULL,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        budget TEXT,
+        duration TEXT,
+        created_at TEXT,
+        duration_days INTEGER)''',
+    "CREATE INDEX IF NOT EXISTS idx_itineraries_created ON itineraries (created_at, id)",
+    '''CREATE TABLE IF NOT EXISTS itinerary_destinations
+       (itinerary_id TEXT NOT NULL REFERENCES itineraries (id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        destination_id TEXT NOT NULL REFERENCES destinations (id),
+        day INTEGER,
+        PRIMARY KEY (itinerary_id, position)) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_itinerary_destinations_destination ON itinerary_destinations (destination_id)",
+    # Full-text index over the searchable fields; prefix indexes make
+    # search-as-you-type queries ("pal*") index lookups too
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS destinations_fts USING fts5
+       (destination_id UNINDEXED,
+        name,
+        location,
+        description,
+        activities,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3')''',
+]
+
+# bm25() column weights: destination_id, name, location, description, activities
+FTS_RANK = "bm25(destinations_fts, 0.0, 10.0, 5.0, 1.0, 3.0)"
+FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Tables created by earlier versions of server.py that never matched the models
+LEGACY_TABLES = {"destinations": "country", "itineraries": "day_number"}
+
+# Typed columns added after the tables first shipped; filled in by a backfill
+ADDED_COLUMNS = {
+    "destinations": [
+        ("best_time_mask", "INTEGER NOT NULL DEFAULT 0"),
+        ("price_tier", "INTEGER"),
+        ("lat", "REAL"),
+        ("lon", "REAL"),
+    ],
+    "itineraries": [("duration_days", "INTEGER")],
+    # Trip day of each stop, set when the route is optimized
+    "itinerary_destinations": [("day", "INTEGER")],
+}
+
+# Dates are stored as ISO text, so range filters compare correctly as strings.
+# Month and price lookups go through the in-memory facet index instead.
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_itineraries_start ON itineraries (start_date, id)",
+]
+
+logger = logging.getLogger(__name__)
+
+# Child rows are folded into a JSON array by a correlated subquery, so a
+# page of parents and their children comes back in one statement
+DESTINATION_COLUMNS = '''d.id, d.name, d.location, d.description, d.image, d.rating,
+           d.best_time, d.price, d.created_at, d.updated_at,
+           (SELECT json_group_array(activity) FROM
+               (SELECT activity FROM destination_activities a
+                WHERE a.destination_id = d.id ORDER BY position)),
+           d.best_time_mask, d.price_tier, d.lat, d.lon'''
+SELECT_DESTINATIONS = f'''
+    SELECT {DESTINATION_COLUMNS}
+    FROM destinations d'''
+
+# Matches are ranked and cut to one page inside the index, so only that
+# page is joined to destinations. Ties break on rowid, which the index
+# shares with destinations and reads for free; pages continue after a
+# (score, rowid) key.
+SEARCH_DESTINATIONS = f'''
+    SELECT {DESTINATION_COLUMNS}, f.score, f.rowid
+    FROM (SELECT rowid, {FTS_RANK} AS score FROM destinations_fts
+          WHERE {{where}} ORDER BY score, rowid LIMIT ?) f
+    JOIN destinations d ON d.rowid = f.rowid
+    ORDER BY f.score, f.rowid'''
+
+SELECT_ITINERARIES = '''
+    SELECT i.id, i.trip_name, i.start_date, i.end_date, i.budget, i.duration, i.created_at,
+           (SELECT json_object('ids', json_group_array(destination_id), 'days', json_group_array(day)) FROM
+               (SELECT destination_id, day FROM itinerary_destinations x
+                WHERE x.itinerary_id = i.id ORDER BY position)),
+           i.duration_days
+    FROM itineraries i'''
+
+# A single JSON-array parameter keeps ``IN`` lists down to one prepared statement
+IDS_PARAM = "(SELECT value FROM json_each(?))"
+
+INSERT_DESTINATION = (
+    "INSERT INTO destinations (id, name, location, description, image, rating, "
+    "best_time, price, created_at, updated_at, best_time_mask, price_tier, lat, lon) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_ACTIVITY = "INSERT INTO destination_activities (destination_id, position, activity) VALUES (?, ?, ?)"
+UPDATE_DESTINATION = (
+    "UPDATE destinations SET name = ?, location = ?, description = ?, image = ?, rating = ?, "
+    "best_time = ?, price = ?, updated_at = ?, best_time_mask = ?, price_tier = ?, lat = ?, lon = ? WHERE id = ?"
+)
+# Index rows share the rowid of their destination, so one can be found
+# without scanning: destination_id is UNINDEXED and only read back
+INSERT_FTS = '''
+    INSERT INTO destinations_fts (rowid, destination_id, name, location, description, activities)
+    SELECT rowid, id, name, location, description, ? FROM destinations WHERE id = ?'''
+DELETE_FTS = "DELETE FROM destinations_fts WHERE rowid = (SELECT rowid FROM destinations WHERE id = ?)"
+REBUILD_FTS = '''
+    INSERT INTO destinations_fts (rowid, destination_id, name, location, description, activities)
+    SELECT d.rowid, d.id, d.name, d.location, d.description,
+           (SELECT group_concat(activity, ' ') FROM destination_activities a
+            WHERE a.destination_id = d.id)
+    FROM destinations d'''
+INSERT_ITINERARY = (
+    "INSERT INTO itineraries (id, trip_name, start_date, end_date, budget, duration, created_at, duration_days) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_ITINERARY_DESTINATION = (
+    "INSERT INTO itinerary_destinations (itinerary_id, position, destination_id, day) VALUES (?, ?, ?, ?)"
+)
+
+
+def init_schema(conn: sqlite3.Connection) -> None:
+    """Create the catalog tables, moving aside legacy tables with the old layout"""
+    for table, legacy_column in LEGACY_TABLES.items():
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if legacy_column in columns:
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        missing = [(name, ddl) for name, ddl in columns if name not in existing]
+        for name, ddl in missing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+        if missing and table in BACKFILLS:
+            BACKFILLS[table](conn)
+    for statement in INDEXES:
+        conn.execute(statement)
+    if not _fts_aligned(conn):
+        conn.execute("DELETE FROM destinations_fts")
+        conn.execute(REBUILD_FTS)
+    conn.commit()
+
+
+def _fts_aligned(conn: sqlite3.Connection) -> bool:
+    """
+    Whether every destination has its full-text row under its own rowid.
+    Not so for destinations written before the index existed or before it
+    shared rowids, or after a VACUUM renumbered the destinations table.
+    """
+    indexed = conn.execute("SELECT count(*) FROM destinations_fts").fetchone()[0]
+    matching = conn.execute(
+        "SELECT count(*) FROM destinations_fts f JOIN destinations d ON d.rowid = f.rowid AND d.id = f.destination_id"
+    ).fetchone()[0]
+    return indexed == matching == conn.execute("SELECT count(*) FROM destinations").fetchone()[0]
+
+
+def _backfill_destinations(conn: sqlite3.Connection) -> None:
+    rows = conn.execute("SELECT id, best_time, price FROM destinations").fetchall()
+    conn.executemany(
+        "UPDATE destinations SET best_time_mask = ?, price_tier = ? WHERE id = ?",
+        [(best_time_mask(best_time), price_tier(price), destination_id) for destination_id, best_time, price in rows],
+    )
+
+
+def _backfill_itineraries(conn: sqlite3.Connection) -> None:
+    rows = conn.execute("SELECT id, start_date, end_date FROM itineraries").fetchall()
+    updates, skipped = [], 0
+    for itinerary_id, start_date, end_date in rows:
+        try:
+            doc = normalize_itinerary({"startDate": start_date, "endDate": end_date})
+        except ValueError:
+            skipped += 1
+            continue
+        updates.append((doc["startDate"], doc["endDate"], doc["duration"], doc["durationDays"], itinerary_id))
+    conn.executemany(
+        "UPDATE itineraries SET start_date = ?, end_date = ?, duration = ?, duration_days = ? WHERE id = ?",
+        updates,
+    )
+    if skipped:
+        logger.warning(f"{skipped} itineraries have unparseable dates and were left as they are")
+
+
+BACKFILLS = {"destinations": _backfill_destinations, "itineraries": _backfill_itineraries}
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _keyset(cursor: Optional[str]) -> Optional[tuple]:
+    """Decode a ``(created_at, id)`` cursor"""
+    if cursor is None:
+        return None
+    values = decode_cursor(cursor)
+    if len(values) != 3 or values[0] != "k" or not all(isinstance(v, str) for v in values[1:]):
+        raise ValueError("Invalid cursor")
+    return values[1], values[2]
+
+
+def _ranked_keyset(cursor: Optional[str]) -> Optional[tuple]:
+    """Decode a ``(score, rowid)`` cursor for relevance-ranked search results"""
+    if cursor is None:
+        return None
+    values = decode_cursor(cursor)
+    if (len(values) != 3 or values[0] != "s" or isinstance(values[1], bool)
+            or not isinstance(values[1], (int, float)) or type(values[2]) is not int):
+        raise ValueError("Invalid cursor")
+    return values[1], values[2]
+
+
+def fts_query(search: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query: every word must match, each as a
+    prefix. User input never reaches the FTS5 query syntax unquoted.
+    """
+    tokens = FTS_TOKEN.findall(search)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def destination_from_row(row: Sequence) -> Document:
+    return {
+        "_id": row[0],
+        "name": row[1],
+        "location": row[2],
+        "description": row[3],
+        "image": row[4],
+        "rating": row[5],
+        "bestTime": row[6],
+        "price": row[7],
+        "createdAt": _datetime(row[8]),
+        "updatedAt": _datetime(row[9]),
+        "activities": json.loads(row[10]),
+        "bestTimeMask": row[11],
+        "priceTier": row[12],
+        "lat": row[13],
+        "lon": row[14],
+    }
+
+
+def itinerary_from_row(row: Sequence) -> Document:
+    stops = json.loads(row[7])
+    return {
+        "_id": row[0],
+        "tripName": row[1],
+        "startDate": row[2],
+        "endDate": row[3],
+        "budget": row[4],
+        "duration": row[5],
+        "createdAt": _datetime(row[6]),
+        "destinations": stops["ids"],
+        "durationDays": row[8],
+        "stopDays": _stop_days(stops["days"]),
+    }
+
+
+def _stop_days(days: List[Optional[int]]) -> Optional[List[int]]:
+    # Stops are only assigned to days all at once, by route optimization
+    return days if days and None not in days else None
+
+
+def _destination_values(doc: Document) -> tuple:
+    return (
+        doc["_id"], doc["name"], doc["location"], doc["description"], doc["image"],
+        doc["rating"], doc["bestTime"], doc["price"],
+        _timestamp(doc.get("createdAt")), _timestamp(doc.get("updatedAt")),
+        doc["bestTimeMask"], doc["priceTier"], doc.get("lat"), doc.get("lon"),
+    )
+
+
+def insert_destination(conn: sqlite3.Connection, doc: Document) -> None:
+    """Write one destination and its activities (caller commits)"""
+    conn.execute(INSERT_DESTINATION, _destination_values(doc))
+    conn.executemany(INSERT_ACTIVITY, [
+        (doc["_id"], position, activity) for position, activity in enumerate(doc["activities"])
+    ])
+    conn.execute(INSERT_FTS, (" ".join(doc["activities"]), doc["_id"]))
+
+
+def update_destination(conn: sqlite3.Connection, doc: Document) -> None:
+    """Overwrite a destination in place, keeping its ID and createdAt (caller commits)"""
+    conn.execute(UPDATE_DESTINATION, (
+        doc["name"], doc["location"], doc["description"], doc["image"], doc["rating"],
+        doc["bestTime"], doc["price"], _timestamp(doc.get("updatedAt")),
+        doc["bestTimeMask"], doc["priceTier"], doc.get("lat"), doc.get("lon"), doc["_id"],
+    ))
+    conn.execute("DELETE FROM destination_activities WHERE destination_id = ?", (doc["_id"],))
+    conn.executemany(INSERT_ACTIVITY, [
+        (doc["_id"], position, activity) for position, activity in enumerate(doc["activities"])
+    ])
+    conn.execute(DELETE_FTS, (doc["_id"],))
+    conn.execute(INSERT_FTS, (" ".join(doc["activities"]), doc["_id"]))
+
+
+class SQLiteDestinationRepository(DestinationRepository):
+    def __init__(self, pool=None):
+        self.pool = pool or get_pool()
+
+    @staticmethod
+    def _page(conn, location, search, limit, cursor) -> Page:
+        if search:
+            return SQLiteDestinationRepository._search_page(conn, location, search, limit, cursor)
+        clauses, params = [], []
+        sql = SELECT_DESTINATIONS
+        after = _keyset(cursor)
+        if after is not None:
+            clauses.append("(d.created_at, d.id) > (?, ?)")
+            params.extend(after)
+        if location:
+            clauses.append("d.location = ?")
+            params.append(location)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        # One extra row tells us whether there is a next page
+        sql += " ORDER BY d.created_at, d.id LIMIT ?"
+        params.append(limit + 1)
+        rows = conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor("k", rows[-1][8], rows[-1][0])
+        return Page([destination_from_row(row) for row in rows], next_cursor)
+
+    @staticmethod
+    def _search_page(conn, location, search, limit, cursor) -> Page:
+        after = _ranked_keyset(cursor)
+        match = fts_query(search)
+        if match is None:
+            return Page([], None)
+        clauses, params = ["destinations_fts MATCH ?"], [match]
+        if after is not None:
+            clauses.append(f"({FTS_RANK}, rowid) > (?, ?)")
+            params.extend(after)
+        if location:
+            clauses.append("(SELECT location FROM destinations WHERE rowid = destinations_fts.rowid) = ?")
+            params.append(location)
+        params.append(limit + 1)
+        rows = conn.execute(SEARCH_DESTINATIONS.format(where=" AND ".join(clauses)), params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor("s", rows[-1][15], rows[-1][16])
+        return Page([destination_from_row(row) for row in rows], next_cursor)
+
+    @staticmethod
+    def _ids(conn) -> List[str]:
+        return [row[0] for row in conn.execute("SELECT id FROM destinations")]
+
+    @staticmethod
+    def _search_ids(conn, search) -> List[str]:
+        match = fts_query(search)
+        if match is None:
+            return []
+        rows = conn.execute("SELECT destination_id FROM destinations_fts WHERE destinations_fts MATCH ?", (match,))
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _get_many(conn, ids: List[str]) -> List[Document]:
+        rows = conn.execute(f"{SELECT_DESTINATIONS} WHERE d.id IN {IDS_PARAM}", (json.dumps(ids),))
+        return [destination_from_row(row) for row in rows]
+
+    @staticmethod
+    def _count(conn, ids: List[str]) -> int:
+        sql = f"SELECT count(*) FROM destinations WHERE id IN {IDS_PARAM}"
+        return conn.execute(sql, (json.dumps(ids),)).fetchone()[0]
+
+    @staticmethod
+    def _create(conn, doc: Document) -> None:
+        insert_destination(conn, doc)
+        conn.commit()
+
+    @staticmethod
+    def _bulk_write(conn, docs: List[Document], upsert: bool) -> Tuple[int, int]:
+        existing = {}
+        writes = docs
+        if upsert:
+            # Last doc wins when a chunk repeats a name, as in the Mongo backend
+            by_name = {doc["name"]: doc for doc in docs}
+            writes = list(by_name.values())
+            rows = conn.execute(
+                f"SELECT name, min(id) FROM destinations WHERE name IN {IDS_PARAM} GROUP BY name",
+                (json.dumps(list(by_name)),),
+            )
+            existing = dict(rows.fetchall())
+        new_docs = []
+        for doc in writes:
+            if doc["name"] in existing:
+                update_destination(conn, {**doc, "_id": existing[doc["name"]]})
+            else:
+                new_docs.append({"_id": new_id(), **doc})
+        # New rows go in with one executemany per table
+        conn.executemany(INSERT_DESTINATION, [_destination_values(doc) for doc in new_docs])
+        conn.executemany(INSERT_ACTIVITY, [
+            (doc["_id"], position, activity)
+            for doc in new_docs for position, activity in enumerate(doc["activities"])
+        ])
+        conn.executemany(INSERT_FTS, [(" ".join(doc["activities"]), doc["_id"]) for doc in new_docs])
+        conn.commit()
+        # Counted like Mongo's bulk upsert: a doc folded into a later one counts as an update
+        return len(new_docs), len(docs) - len(new_docs)
+
+    async def page(self, location=None, search=None, limit=100, cursor=None) -> Page:
+        return await self.pool.run(self._page, location, search, limit, cursor)
+
+    async def ids(self) -> List[str]:
+        return await self.pool.run(self._ids)
+
+    async def search_ids(self, search: str) -> List[str]:
+        return await self.pool.run(self._search_ids, search)
+
+    async def get(self, destination_id: str) -> Optional[Document]:
+        found = await self.pool.run(self._get_many, [destination_id])
+        return found[0] if found else None
+
+    async def get_many(self, destination_ids: Iterable[str]) -> List[Document]:
+        return await self.pool.run(self._get_many, list(destination_ids))
+
+    async def count_existing(self, destination_ids: Iterable[str]) -> int:
+        return await self.pool.run(self._count, list(set(destination_ids)))
+
+    async def create(self, data: Document) -> Document:
+        doc = {"_id": new_id(), **data}
+        await self.pool.run(self._create, doc)
+        return doc
+
+    async def bulk_write(self, docs: List[Document], upsert: bool = False) -> Tuple[int, int]:
+        return await self.pool.run(self._bulk_write, docs, upsert)
+
+
+class SQLiteItineraryRepository(ItineraryRepository):
+    def __init__(self, pool=None):
+        self.pool = pool or get_pool()
+
+    @staticmethod
+    def _page(conn, limit, cursor, start_from, start_to) -> Page:
+        clauses, params = [], []
+        before = _keyset(cursor)
+        if before is not None:
+            clauses.append("(i.created_at, i.id) < (?, ?)")
+            params.extend(before)
+        if start_from is not None:
+            clauses.append("i.start_date >= ?")
+            params.append(start_from.isoformat())
+        if start_to is not None:
+            clauses.append("i.start_date <= ?")
+            params.append(start_to.isoformat())
+        sql = SELECT_ITINERARIES
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY i.created_at DESC, i.id DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor("k", rows[-1][6], rows[-1][0])
+        return Page([itinerary_from_row(row) for row in rows], next_cursor)
+
+    @staticmethod
+    def _get(conn, itinerary_id) -> Optional[Document]:
+        row = conn.execute(f"{SELECT_ITINERARIES} WHERE i.id = ?", (itinerary_id,)).fetchone()
+        return itinerary_from_row(row) if row else None
+
+    @staticmethod
+    def _create(conn, doc: Document) -> None:
+        conn.execute(INSERT_ITINERARY, (
+            doc["_id"], doc["tripName"], doc["startDate"], doc["endDate"],
+            doc.get("budget"), doc.get("duration"), _timestamp(doc.get("createdAt")),
+            doc.get("durationDays"),
+        ))
+        SQLiteItineraryRepository._insert_stops(conn, doc["_id"], doc["destinations"], doc.get("stopDays"))
+        conn.commit()
+
+    @staticmethod
+    def _insert_stops(conn, itinerary_id, destinations, stop_days) -> None:
+        days = stop_days or [None] * len(destinations)
+        conn.executemany(INSERT_ITINERARY_DESTINATION, [
+            (itinerary_id, position, destination_id, day)
+            for position, (destination_id, day) in enumerate(zip(destinations, days))
+        ])
+
+    @staticmethod
+    def _set_stops(conn, itinerary_id, destinations, stop_days) -> Optional[Document]:
+        if conn.execute("SELECT 1 FROM itineraries WHERE id = ?", (itinerary_id,)).fetchone() is None:
+            return None
+        conn.execute("DELETE FROM itinerary_destinations WHERE itinerary_id = ?", (itinerary_id,))
+        SQLiteItineraryRepository._insert_stops(conn, itinerary_id, destinations, stop_days)
+        conn.commit()
+        return SQLiteItineraryRepository._get(conn, itinerary_id)
+
+    @staticmethod
+    def _delete(conn, itinerary_id) -> bool:
+        deleted = conn.execute("DELETE FROM itineraries WHERE id = ?", (itinerary_id,)).rowcount
+        conn.commit()
+        return deleted > 0
+
+    async def page(self, limit=100, cursor=None, start_from=None, start_to=None) -> Page:
+        return await self.pool.run(self._page, limit, cursor, start_from, start_to)
+
+    async def get(self, itinerary_id: str) -> Optional[Document]:
+        return await self.pool.run(self._get, itinerary_id)
+
+    async def create(self, data: Document) -> Document:
+        doc = {"_id": new_id(), **data}
+        await self.pool.run(self._create, doc)
+        return doc
+
+    async def set_stops(self, itinerary_id: str, destinations: List[str], stop_days: Optional[List[int]]) -> Optional[Document]:
+        return await self.pool.run(self._set_stops, itinerary_id, destinations, stop_days)
+
+    async def delete(self, itinerary_id: str) -> bool:
+        return await self.pool.run(self._delete, itinerary_id)
@@ -0,0 +1,46 @@
+"""Helpers for paginated and NDJSON-streamed list endpoints"""
+
+import logging
+from typing import AsyncIterator, Optional, Type
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from serialization import serializer_for
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def wants_ndjson(request: Request, format: Optional[str]) -> bool:
+    """True if the client asked for NDJSON via ``?format=ndjson`` or the Accept header"""
+    if format is not None:
+        return format == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def _ndjson_lines(first: Optional[dict], docs: AsyncIterator[dict], model: Type[BaseModel]) -> AsyncIterator[bytes]:
+    encode = serializer_for(model).encode
+    if first is None:
+        return
+    yield encode(first) + b"\n"
+    try:
+        async for doc in docs:
+            yield encode(doc) + b"\n"
+    except Exception as e:
+        # Headers are already sent, so the stream just ends early
+        logger.error(f"Error streaming {model.__name__} records: {e}")
+
+
+async def ndjson_response(docs: AsyncIterator[dict], model: Type[BaseModel]) -> StreamingResponse:
+    """
+    Stream ``docs`` one JSON object per line as the storage layer yields them.
+    The first document is fetched before the response starts, so an invalid
+    cursor or filter raises here, in the route, and becomes an error status
+    instead of an empty 200.
+    """
+    first = await anext(docs, None)
+    return StreamingResponse(_ndjson_lines(first, docs, model), media_type=NDJSON_MEDIA_TYPE)
@@ -19,7 +19,11 @@ export const destinationsAPI = {
       const params = new URLSearchParams();
       if (filters.location) params.append('location', filters.location);
       if (filters.search) params.append('search', filters.search);
-      
+      (filters.activities || []).forEach((activity) => params.append('activity', activity));
+      if (filters.price) params.append('price', filters.price);
+      if (filters.minRating) params.append('min_rating', filters.minRating);
+      if (filters.month) params.append('month', filters.month);
+
       const response = await apiClient.get(`/destinations?${params.toString()}`);
       return response.data;
     } catch (error) {
@@ -39,6 +43,25 @@ export const destinationsAPI = {
     }
   },
 
+  // Get several destinations in one request, in the order given
+  getByIds: async (ids) => {
+    try {
+      const params = new URLSearchParams({ ids: ids.join(',') });
+      const response = await apiClient.get(`/destinations?${params.toString()}`);
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching destinations by ID:', error);
+      throw error;
+    }
+  },
+
+  // URL of a destination's image, resized by the API's image proxy
+  imageUrl: (id, width) => `${API_BASE}/images/${id}?w=${width}`,
+
+  // srcSet for responsive <img> tags
+  imageSrcSet: (id, widths = [480, 640, 960, 1280]) =>
+    widths.map((width) => `${API_BASE}/images/${id}?w=${width} ${width}w`).join(', '),
+
   // Create new destination (admin)
   create: async (destinationData) => {
     try {
@@ -53,10 +76,13 @@ export const destinationsAPI = {
 
 // Itineraries API
 export const itinerariesAPI = {
-  // Get all itineraries
-  getAll: async () => {
+  // Get all itineraries; pass { expand: true } to inline destination details
+  getAll: async (options = {}) => {
     try {
-      const response = await apiClient.get('/itineraries');
+      const params = new URLSearchParams();
+      if (options.expand) params.append('expand', 'destinations');
+      
+      const response = await apiClient.get(`/itineraries?${params.toString()}`);
       return response.data;
     } catch (error) {
       console.error('Error fetching itineraries:', error);
@@ -98,4 +124,26 @@ export const itinerariesAPI = {
   },
 };
 
+// Change feed (server-sent events)
+export const changesAPI = {
+  // Call onChange(type, data) for every destination or itinerary change.
+  // A 'reset' type means changes were missed; re-fetch the lists.
+  // Returns a function that closes the stream.
+  subscribe: (onChange) => {
+    const source = new EventSource(`${API_BASE}/changes`);
+    const types = [
+      'destination.created',
+      'destinations.imported',
+      'itinerary.created',
+      'itinerary.updated',
+      'itinerary.deleted',
+      'reset',
+    ];
+    types.forEach((type) => {
+      source.addEventListener(type, (event) => onChange(type, JSON.parse(event.data)));
+    });
+    return () => source.close();
+  },
+};
+
 export default apiClient;
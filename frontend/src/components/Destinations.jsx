@@ -159,7 +159,10 @@ const Destinations = () => {
                 >
                   <div className="relative h-80 overflow-hidden">
                     <img 
-                      src={destination.image} 
+                      src={destinationsAPI.imageUrl(destination._id, 640)} 
+                      srcSet={destinationsAPI.imageSrcSet(destination._id)}
+                      sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
+                      loading="lazy"
                       alt={destination.name}
                       className="w-full h-full object-cover group-hover:scale-110 transition-transform duration-700"
                     />
@@ -0,0 +1,50 @@
+"""Shared fixtures: the API against a fresh SQLite database per test"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from config import AppConfig  # noqa: E402
+from server import create_app  # noqa: E402
+
+
+@pytest.fixture
+def app_config(tmp_path, monkeypatch) -> AppConfig:
+    monkeypatch.setenv("IMAGE_CACHE_DIR", str(tmp_path / "image_cache"))
+    return AppConfig(
+        sqlite_path=str(tmp_path / "travel.db"),
+        pool_size=2,
+        background_jobs=False,
+        admission_control=False,
+    )
+
+
+@pytest.fixture
+def client(app_config):
+    with TestClient(create_app(app_config)) as client:
+        yield client
+
+
+@pytest.fixture
+def make_destination():
+    """Factory for valid ``DestinationCreate`` payloads"""
+    def make(name: str = "Palolem Beach", **fields) -> dict:
+        return {
+            "name": name,
+            "location": "South Goa",
+            "description": "Crescent beach with calm water and palm trees.",
+            "image": "https://images.example.com/palolem.jpg",
+            "rating": 4.5,
+            "activities": ["Swimming", "Kayaking"],
+            "bestTime": "November to February",
+            "price": "₹₹",
+            **fields,
+        }
+    return make
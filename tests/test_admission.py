@@ -0,0 +1,88 @@
+"""Admission control on status check writes"""
+
+import asyncio
+import dataclasses
+
+import pytest
+from fastapi.testclient import TestClient
+
+from admission import MAX_KEYED_BODY, ROUTE_CLASSES, AdmissionController, AdmissionMiddleware, classify
+from server import create_app
+
+STATUS_WRITE = ROUTE_CLASSES["status_write"]
+
+
+@pytest.fixture
+def admitted_client(app_config):
+    with TestClient(create_app(dataclasses.replace(app_config, admission_control=True))) as client:
+        yield client
+
+
+def post_status(client, name):
+    return client.post("/api/status", json={"client_name": name})
+
+
+def test_one_client_name_is_limited_to_its_burst(admitted_client):
+    codes = [post_status(admitted_client, "probe").status_code for _ in range(int(STATUS_WRITE.burst) + 5)]
+
+    assert codes[:int(STATUS_WRITE.burst)] == [200] * int(STATUS_WRITE.burst)
+    assert 429 in codes
+    # Another client behind the same address has its own bucket
+    assert post_status(admitted_client, "other").status_code == 200
+
+
+def test_changing_the_client_name_does_not_escape_the_address_limit(admitted_client):
+    codes = [post_status(admitted_client, f"probe-{i}").status_code for i in range(int(STATUS_WRITE.ip_burst) * 2)]
+
+    # The address bucket refills while the requests run, so some beyond the burst get through
+    assert codes[:int(STATUS_WRITE.ip_burst)] == [200] * int(STATUS_WRITE.ip_burst)
+    assert codes.count(429) >= STATUS_WRITE.ip_burst / 2
+
+
+def test_oversized_status_bodies_are_refused(admitted_client):
+    response = post_status(admitted_client, "x" * MAX_KEYED_BODY)
+
+    assert response.status_code == 413
+    assert "retry-after" not in response.headers
+
+
+def test_slow_image_fetches_do_not_take_catalog_slots():
+    classes = {
+        **ROUTE_CLASSES,
+        "images": ROUTE_CLASSES["images"]._replace(max_in_flight=2, max_queued=0),
+        "catalog": ROUTE_CLASSES["catalog"]._replace(max_in_flight=2, max_queued=0),
+    }
+    origin = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if scope["path"].startswith("/api/images"):
+            await origin.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = AdmissionMiddleware(app, AdmissionController(classes))
+
+    async def get(path: str) -> int:
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": path, "headers": [], "client": ("10.0.0.1", 1)}
+        await middleware(scope, None, send)
+        return sent[0]["status"]
+
+    async def run():
+        fetches = [asyncio.create_task(get(f"/api/images/{i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        shed = await get("/api/images/2")
+        catalog = await asyncio.gather(get("/api/destinations"), get("/api/itineraries"))
+        origin.set()
+        return shed, catalog, await asyncio.gather(*fetches)
+
+    shed, catalog, fetched = asyncio.run(run())
+
+    assert shed == 503
+    assert catalog == [200, 200]
+    assert fetched == [200, 200]
+    assert classify("GET", "/api/images/x") == "images"
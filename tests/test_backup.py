@@ -0,0 +1,176 @@
+"""Online backups, rotation, verification and restore"""
+
+import asyncio
+import dataclasses
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backup
+from admission import classify
+from backup import (
+    BackupError, BackupTooRecent, backup_now, create_backup, list_backups, restore_backup, rotate_backups,
+    run_backups, verify_backup, warm_start,
+)
+from server import create_app
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "travel.db"
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE places (name TEXT)")
+    conn.executemany("INSERT INTO places VALUES (?)", [(f"place {i}",) for i in range(500)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def backups(tmp_path, monkeypatch):
+    directory = tmp_path / "backups"
+    monkeypatch.setenv("BACKUP_DIR", str(directory))
+    return directory
+
+
+def places(path) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT count(*) FROM places").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_a_backup_is_a_verified_self_contained_copy(source, backups):
+    info = create_backup(source, backups)
+
+    path = backups / info.name
+    assert places(path) == 500
+    assert verify_backup(path) == info
+    assert not path.with_name(path.name + "-wal").exists()
+    assert [b.name for b in list_backups(backups)] == [info.name]
+
+
+def test_rotation_keeps_the_newest(source, backups):
+    made = [create_backup(source, backups, keep=10).name for _ in range(4)]
+
+    rotate_backups(backups, keep=2)
+
+    assert [b.name for b in list_backups(backups)] == made[:1:-1]
+    assert sorted(p.name for p in backups.glob("*.db")) == sorted(made[2:])
+
+
+def test_a_changed_backup_fails_verification(source, backups):
+    path = backups / create_backup(source, backups).name
+    with open(path, "r+b") as f:
+        f.seek(200)
+        f.write(b"\x00garbage")
+
+    with pytest.raises(BackupError, match="checksum"):
+        verify_backup(path)
+    with pytest.raises(BackupError):
+        restore_backup(path, source)
+
+
+def test_restore_replaces_the_database_and_drops_its_wal(source, backups, tmp_path):
+    create_backup(source, backups)
+    target = tmp_path / "restored.db"
+    target.write_bytes(b"old")
+    stale_wal = tmp_path / "restored.db-wal"
+    stale_wal.write_bytes(b"stale")
+
+    info = restore_backup(backups, target)
+
+    assert info.name == list_backups(backups)[0].name
+    assert places(target) == 500
+    assert not stale_wal.exists()
+
+
+def test_warm_start_only_restores_a_missing_database(source, backups, tmp_path):
+    create_backup(source, backups)
+    target = tmp_path / "new.db"
+
+    assert warm_start(target, None) is None
+    assert not target.exists()
+    assert warm_start(target, str(backups)) is not None
+    assert places(target) == 500
+    assert warm_start(source, str(backups)) is None
+
+
+def test_warm_start_without_backups_fails(tmp_path):
+    (tmp_path / "empty").mkdir()
+
+    with pytest.raises(BackupError, match="No backups"):
+        warm_start(tmp_path / "new.db", str(tmp_path / "empty"))
+
+
+def test_backups_younger_than_the_minimum_age_are_refused(source, backups, monkeypatch):
+    monkeypatch.setattr(backup, "_running", None)
+
+    async def run():
+        first = await backup_now(source, min_age=60)
+        with pytest.raises(BackupTooRecent) as refused:
+            await backup_now(source, min_age=60)
+        return first, refused.value
+
+    first, refused = asyncio.run(run())
+
+    assert refused.newest == first
+    assert 0 < refused.retry_after <= 60
+    assert len(list_backups(backups)) == 1
+
+
+def test_workers_sharing_a_directory_make_one_backup_per_interval(source, backups, monkeypatch):
+    # The module's lock belongs to the event loop of an earlier test
+    monkeypatch.setattr(backup, "_running", None)
+    interval = 0.4
+
+    async def run():
+        workers = [asyncio.create_task(run_backups(source, interval)) for _ in range(3)]
+        await asyncio.sleep(interval * 2.5)
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    asyncio.run(run())
+
+    assert len(list_backups(backups)) == 2
+
+
+@pytest.fixture
+def admin_client(app_config, backups):
+    config = dataclasses.replace(app_config, admin_token=TOKEN)
+    with TestClient(create_app(config)) as client:
+        yield client
+
+
+def test_admin_calls_need_the_token(admin_client):
+    assert admin_client.post("/api/admin/backups").status_code == 401
+    assert admin_client.get("/api/admin/backups", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+
+def test_without_a_token_only_local_clients_are_admitted(client):
+    # TestClient connects as "testclient", not from a loopback address
+    assert client.post("/api/admin/backups").status_code == 403
+
+
+def test_on_demand_backups_are_rate_limited_by_age(admin_client, backups):
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+
+    made = admin_client.post("/api/admin/backups", headers=headers)
+    again = admin_client.post("/api/admin/backups", headers=headers)
+    listed = admin_client.get("/api/admin/backups", headers=headers)
+
+    assert made.status_code == 200
+    assert again.status_code == 429
+    assert int(again.headers["retry-after"]) > 0
+    assert [b["name"] for b in listed.json()] == [made.json()["name"]]
+
+
+def test_admin_paths_have_their_own_admission_class():
+    assert classify("POST", "/api/admin/backups") == "admin"
+    assert classify("GET", "/api/admin/backups") == "admin"
@@ -0,0 +1,89 @@
+"""Group-commit batching of status check inserts"""
+
+import asyncio
+
+import pytest
+
+from batcher import WriteBatcher
+from database import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(tmp_path / "batch.db", size=2)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE rows (value INTEGER PRIMARY KEY CHECK (value >= 0))")
+        conn.commit()
+    yield pool
+    pool.close()
+
+
+def insert_rows(conn, rows):
+    conn.executemany("INSERT INTO rows (value) VALUES (?)", [(row,) for row in rows])
+    conn.commit()
+
+
+def stored(pool) -> list:
+    with pool.connection() as conn:
+        return [value for value, in conn.execute("SELECT value FROM rows ORDER BY value")]
+
+
+def test_concurrent_submits_commit_together(pool):
+    batcher = WriteBatcher(pool, insert_rows, max_batch_size=8, linger_ms=20)
+
+    async def run():
+        await asyncio.gather(*(batcher.submit(i) for i in range(20)))
+        await batcher.close()
+
+    asyncio.run(run())
+
+    assert stored(pool) == list(range(20))
+    stats = batcher.stats()
+    assert stats["rows"] == 20
+    assert stats["batches"] == 3
+    assert stats["largest_batch"] == 8
+    assert stats["batch_size_histogram"]["8"] == 2
+    assert stats["pending"] == 0
+
+
+def test_a_submit_returns_only_after_its_commit(pool):
+    batcher = WriteBatcher(pool, insert_rows, linger_ms=0)
+
+    async def run():
+        await batcher.submit(1)
+        # Read on another connection: the row is already visible to everyone
+        assert stored(pool) == [1]
+        await batcher.close()
+
+    asyncio.run(run())
+
+
+def test_a_bad_row_fails_only_its_own_submit(pool):
+    batcher = WriteBatcher(pool, insert_rows, max_batch_size=8, linger_ms=20)
+
+    async def run():
+        results = await asyncio.gather(*(batcher.submit(v) for v in (1, 2, -1, 3, 2)), return_exceptions=True)
+        await batcher.close()
+        return results
+
+    results = asyncio.run(run())
+
+    assert results[:2] == [None, None] and results[3] is None
+    assert isinstance(results[2], Exception) and isinstance(results[4], Exception)
+    assert stored(pool) == [1, 2, 3]
+    # The failed batch, then the two rows that failed again on their own
+    assert batcher.stats()["failed_batches"] == 3
+
+
+def test_close_flushes_what_is_queued(pool):
+    batcher = WriteBatcher(pool, insert_rows, linger_ms=1000)
+
+    async def run():
+        pending = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        await batcher.close()
+        await asyncio.gather(*pending)
+
+    asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    assert stored(pool) == [0, 1, 2]
@@ -0,0 +1,179 @@
+"""POST /api/destinations/bulk: streaming ingest and upserts"""
+
+import json
+
+import pytest
+
+
+def ndjson(rows) -> str:
+    return "\n".join(json.dumps(row) for row in rows)
+
+
+def all_destinations(client) -> list:
+    return client.get("/api/destinations", params={"limit": 1000}).json()
+
+
+def test_ingest_ndjson_reports_invalid_rows_by_index(client, make_destination):
+    rows = [make_destination("Baga Beach"), {"name": "No fields"}, make_destination("Anjuna Beach")]
+    body = ndjson(rows[:2]) + "\nnot json\n" + ndjson(rows[2:])
+
+    result = client.post("/api/destinations/bulk", content=body).json()
+
+    assert result["received"] == 4
+    assert result["inserted"] == 2
+    assert result["failed"] == 2
+    assert [error["index"] for error in result["errors"]] == [1, 2]
+    assert sorted(d["name"] for d in all_destinations(client)) == ["Anjuna Beach", "Baga Beach"]
+
+
+def test_ingest_json_array(client, make_destination):
+    body = json.dumps([make_destination(f"Beach {i}") for i in range(5)])
+
+    result = client.post("/api/destinations/bulk", content=body).json()
+
+    assert result["inserted"] == 5
+    assert result["failed"] == 0
+
+
+def test_upsert_replaces_destination_with_the_same_name(client, make_destination):
+    client.post("/api/destinations/bulk", content=ndjson([make_destination("Baga Beach", rating=3.0)]))
+    original = all_destinations(client)[0]
+
+    result = client.post(
+        "/api/destinations/bulk", params={"upsert": "true"},
+        content=ndjson([make_destination("Baga Beach", rating=4.8), make_destination("Calangute Beach")]),
+    ).json()
+
+    assert (result["inserted"], result["updated"], result["failed"]) == (1, 1, 0)
+    found = {d["name"]: d for d in all_destinations(client)}
+    assert found["Baga Beach"]["_id"] == original["_id"]
+    assert found["Baga Beach"]["rating"] == 4.8
+    assert found["Baga Beach"]["createdAt"] == original["createdAt"]
+
+
+def test_upsert_with_repeated_names_in_one_chunk_keeps_the_last_row(client, make_destination):
+    client.post("/api/destinations/bulk", content=ndjson([make_destination("Dup 0", rating=1.0)]))
+    rows = [make_destination(f"Dup {i % 3}", rating=4.0 + i / 10, activities=[f"Activity {i}"]) for i in range(6)]
+
+    result = client.post("/api/destinations/bulk", params={"upsert": "true"}, content=ndjson(rows)).json()
+
+    assert result["failed"] == 0
+    assert (result["inserted"], result["updated"]) == (2, 4)
+    found = {d["name"]: d for d in all_destinations(client)}
+    assert len(found) == 3 == len(all_destinations(client))
+    assert found["Dup 0"]["rating"] == 4.3
+    assert found["Dup 2"]["activities"] == ["Activity 5"]
+    # The full-text index follows the row that won
+    searched = client.get("/api/destinations", params={"search": "activity 4"}).json()
+    assert [d["name"] for d in searched] == ["Dup 1"]
+
+
+def test_search_index_rows_share_rowids_with_destinations(client, app_config, make_destination):
+    import sqlite3
+
+    from storage.sqlite import init_schema
+
+    client.post("/api/destinations/bulk", content=ndjson([make_destination(f"Beach {i}") for i in range(3)]))
+    conn = sqlite3.connect(app_config.sqlite_path)
+    try:
+        # Index rows under other rowids, as written by earlier versions
+        conn.execute("UPDATE destinations_fts SET rowid = rowid + 100")
+        conn.commit()
+        init_schema(conn)
+        rows = conn.execute(
+            "SELECT count(*) FROM destinations_fts f JOIN destinations d ON d.rowid = f.rowid AND d.id = f.destination_id"
+        ).fetchone()
+    finally:
+        conn.close()
+    assert rows == (3,)
+
+
+def test_failed_ingest_still_publishes_committed_chunks(client, make_destination, monkeypatch):
+    import functools
+
+    import ingest
+    from changes import get_change_log
+    from routes import destinations
+
+    async def broken_stream(chunks):
+        for i in range(3):
+            yield make_destination(f"Beach {i}")
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(destinations, "parse_records", broken_stream)
+    monkeypatch.setattr(destinations, "ingest_destinations", functools.partial(ingest.ingest_destinations, chunk_size=2))
+    assert all_destinations(client) == []
+    seq = get_change_log().seq
+
+    response = client.post("/api/destinations/bulk", content="")
+
+    assert response.status_code == 500
+    # The first chunk committed; the cached empty list must not be served again
+    assert [d["name"] for d in all_destinations(client)] == ["Beach 0", "Beach 1"]
+    assert get_change_log().seq == seq + 1
+
+
+def test_only_the_rows_that_cannot_be_stored_fail(make_destination):
+    import asyncio
+
+    from ingest import ingest_destinations
+
+    class Repo:
+        def __init__(self):
+            self.rows = []
+
+        async def bulk_write(self, docs, upsert=False):
+            if any(doc["name"].startswith("Bad") for doc in docs):
+                raise RuntimeError("CHECK constraint failed")
+            self.rows += docs
+            return len(docs), 0
+
+    repo = Repo()
+    records = [make_destination("Bad" if i in (3, 7) else f"Beach {i}") for i in range(10)]
+
+    result = asyncio.run(ingest_destinations(records, repo, chunk_size=8))
+
+    assert (result.inserted, result.failed) == (8, 2)
+    assert [(error.index, error.error) for error in result.errors] == [(3, "Storage error"), (7, "Storage error")]
+    assert len(repo.rows) == 8
+
+
+def test_mongo_batches_that_partly_failed_are_not_written_twice(make_destination):
+    import asyncio
+    from types import SimpleNamespace
+
+    pytest.importorskip("motor")
+    from pymongo.errors import BulkWriteError
+
+    from ingest import ingest_destinations
+    from storage.mongo import MongoDestinationRepository
+
+    class Destinations:
+        """insert_many as MongoDB answers it unordered: every doc but the rejected ones is written"""
+
+        def __init__(self):
+            self.docs = {}
+
+        async def insert_many(self, docs, ordered=True):
+            errors = []
+            for index, doc in enumerate(docs):
+                if doc["name"].startswith("Bad"):
+                    errors.append({"index": index, "code": 121, "errmsg": "Document failed validation"})
+                elif doc["_id"] in self.docs:
+                    errors.append({"index": index, "code": 11000, "keyPattern": {"_id": 1},
+                                   "errmsg": "E11000 duplicate key error collection: travel.destinations index: _id_ dup key"})
+                else:
+                    self.docs[doc["_id"]] = doc
+            if errors:
+                raise BulkWriteError({"writeErrors": errors, "nInserted": len(docs) - len(errors)})
+            return SimpleNamespace(inserted_ids=[doc["_id"] for doc in docs])
+
+    collection = Destinations()
+    repo = MongoDestinationRepository(SimpleNamespace(destinations=collection))
+    records = [make_destination("Bad" if i in (3, 7) else f"Beach {i}") for i in range(10)]
+
+    result = asyncio.run(ingest_destinations(records, repo, chunk_size=8))
+
+    assert (result.inserted, result.failed) == (8, 2)
+    assert [error.index for error in result.errors] == [3, 7]
+    assert sorted(doc["name"] for doc in collection.docs.values()) == sorted(f"Beach {i}" for i in range(10) if i not in (3, 7))
@@ -0,0 +1,122 @@
+"""ETag revalidation of catalog responses and invalidation on write"""
+
+import json
+from dataclasses import replace
+
+from fastapi.testclient import TestClient
+
+from catalog_cache import CatalogCache, etag_matches
+from server import create_app
+
+
+def test_a_current_etag_gets_a_304(client, make_destination):
+    client.post("/api/destinations", json=make_destination())
+    first = client.get("/api/destinations")
+    etag = first.headers["etag"]
+
+    revalidated = client.get("/api/destinations", headers={"If-None-Match": etag})
+    weak = client.get("/api/destinations", headers={"If-None-Match": f'"other", W/{etag}'})
+
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "no-cache"
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+    assert revalidated.content == b""
+    assert weak.status_code == 304
+
+
+def test_each_filter_has_its_own_etag(client, make_destination):
+    client.post("/api/destinations", json=make_destination())
+    all_etag = client.get("/api/destinations").headers["etag"]
+
+    north = client.get("/api/destinations", params={"location": "North Goa"}, headers={"If-None-Match": all_etag})
+
+    assert north.status_code == 200
+    assert north.json() == []
+
+
+def test_a_write_invalidates_cached_bodies_and_etags(client, make_destination):
+    client.post("/api/destinations", json=make_destination("Palolem Beach"))
+    before = client.get("/api/destinations")
+
+    client.post("/api/destinations", json=make_destination("Agonda Beach"))
+    after = client.get("/api/destinations", headers={"If-None-Match": before.headers["etag"]})
+
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    assert sorted(d["name"] for d in after.json()) == ["Agonda Beach", "Palolem Beach"]
+
+
+def test_bulk_ingest_invalidates(client, make_destination):
+    before = client.get("/api/destinations", params={"include_facets": "true"})
+
+    client.post("/api/destinations/bulk", content=json.dumps(make_destination()))
+    after = client.get("/api/destinations", params={"include_facets": "true"},
+                       headers={"If-None-Match": before.headers["etag"]})
+
+    assert after.status_code == 200
+    assert after.json()["total"] == 1
+
+
+def test_a_body_loaded_across_a_write_is_not_kept():
+    cache = CatalogCache()
+    version = cache.version
+    cache.invalidate()
+
+    entry = cache.put("key", version, b"[]")
+
+    assert entry.body == b"[]"
+    assert cache.get("key") is None
+
+
+def test_entries_are_evicted_by_count_and_size():
+    cache = CatalogCache(max_entries=2, max_bytes=10)
+    for key in ("a", "b", "c"):
+        cache.put(key, cache.version, b"1234")
+    assert [cache.get(k) is not None for k in ("a", "b", "c")] == [False, True, True]
+
+    cache.put("d", cache.version, b"12345678")
+    assert cache.stats()["bytes"] <= 10
+    assert cache.get("d") is not None
+
+
+def test_etag_matching():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"b"', '"b"')
+    assert not etag_matches(None, '"b"')
+    assert not etag_matches('"bb"', '"b"')
+
+
+def test_a_shared_tag_replaces_the_process_epoch():
+    workers = [CatalogCache(), CatalogCache()]
+    assert workers[0].etag("key") != workers[1].etag("key")
+
+    # Workers that have invalidated a different number of times
+    workers[1].invalidate()
+    for worker in workers:
+        worker.invalidate(shared_tag="s7")
+    assert workers[0].etag("key") == workers[1].etag("key")
+    assert workers[0].etag("key") != workers[0].etag("other")
+
+    # A local write is not in the shared version yet
+    workers[0].invalidate()
+    assert workers[0].etag("key") != workers[1].etag("key")
+
+
+def test_workers_mapping_the_same_snapshot_issue_the_same_etags(app_config, tmp_path, make_destination, monkeypatch):
+    import catalog
+    import catalog_cache
+
+    config = replace(app_config, snapshot_path=str(tmp_path / "catalog.snapshot"))
+    with TestClient(create_app(config)) as client:
+        client.post("/api/destinations", json=make_destination())
+        client.portal.call(catalog.publish_snapshot)
+        first = client.get("/api/destinations")
+
+        # Another worker: its own cache and mapping of the same file
+        monkeypatch.setattr(catalog_cache, "_cache", None)
+        catalog.use_snapshot(config.snapshot_path)
+        revalidated = client.get("/api/destinations", headers={"If-None-Match": first.headers["etag"]})
+
+        assert first.json()[0]["name"] == "Palolem Beach"
+        assert revalidated.status_code == 304
@@ -0,0 +1,159 @@
+"""Change feed: resuming from an event ID, resets and trimming the log"""
+
+import asyncio
+
+import pytest
+
+import changes
+from changes import ChangeLog
+from routes.changes import stream_changes
+
+
+def frame(log: ChangeLog, seq: int, event: str = "destination.created") -> bytes:
+    return b"id: %s\nevent: %s\ndata: {\"n\":%d}\n\n" % (log.event_id(seq).encode(), event.encode(), seq)
+
+
+def append(log: ChangeLog, count: int) -> None:
+    for _ in range(count):
+        log.append("destination.created", b'{"n":%d}' % (log.seq + 1))
+
+
+async def take(stream) -> bytes:
+    return await asyncio.wait_for(stream.__anext__(), timeout=1)
+
+
+async def waiting(stream) -> asyncio.Future:
+    """The stream's next write, after checking that nothing is ready yet"""
+    pending = asyncio.ensure_future(stream.__anext__())
+    done, _ = await asyncio.wait({pending}, timeout=0.05)
+    assert not done
+    return pending
+
+
+def test_since_returns_the_changes_still_kept():
+    log = ChangeLog(size=3)
+    assert log.since(0) == []
+    append(log, 5)
+
+    assert [change.seq for change in log.since(2)] == [3, 4, 5]
+    assert [change.seq for change in log.since(4)] == [5]
+    assert log.since(5) == []
+    # Change 2 was trimmed, so a client that saw only change 1 has a gap
+    assert log.since(1) is None
+    assert log.since(-1) is None
+
+
+def test_event_ids_only_parse_for_this_log():
+    log, other = ChangeLog(), ChangeLog()
+    append(log, 3)
+
+    assert log.parse_event_id(log.event_id(2)) == 2
+    assert log.parse_event_id(log.event_id(0)) == 0
+    for event_id in [other.event_id(2), log.event_id(4), f"{log.epoch}-x", f"{log.epoch}", "", "garbage"]:
+        assert log.parse_event_id(event_id) is None
+
+
+def test_resuming_sends_missed_changes_then_new_ones():
+    log = ChangeLog()
+    append(log, 3)
+
+    async def run():
+        stream = log.stream(after=1)
+        # Everything missed arrives as one write
+        assert await take(stream) == frame(log, 2) + frame(log, 3)
+        pending = await waiting(stream)
+        append(log, 1)
+        assert await pending == frame(log, 4)
+        assert log.subscribers == 1
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert log.subscribers == 0
+
+
+def test_a_new_stream_starts_at_the_next_change():
+    log = ChangeLog()
+    append(log, 2)
+
+    async def run():
+        stream = log.stream(after=None)
+        assert await take(stream) == b"id: %s\n\n" % log.event_id(2).encode()
+        append(log, 1)
+        assert await take(stream) == frame(log, 3)
+        await stream.aclose()
+
+    asyncio.run(run())
+
+
+def test_a_trimmed_resume_point_gets_a_reset():
+    log = ChangeLog(size=3)
+    append(log, 5)
+
+    async def run():
+        stream = log.stream(after=1)
+        assert await take(stream) == b'id: %s\nevent: reset\ndata: {"seq":5}\n\n' % log.event_id(5).encode()
+        # After the reset the stream carries on from the newest change
+        pending = await waiting(stream)
+        append(log, 1)
+        assert await pending == frame(log, 6)
+        await stream.aclose()
+
+    asyncio.run(run())
+
+
+def test_every_subscriber_is_woken_and_slow_ones_catch_up_in_one_write():
+    log = ChangeLog()
+
+    async def run():
+        streams = [log.stream(after=0) for _ in range(3)]
+        reads = [asyncio.ensure_future(take(stream)) for stream in streams[:2]]
+        await asyncio.sleep(0)
+        append(log, 1)
+        assert await asyncio.gather(*reads) == [frame(log, 1)] * 2
+        append(log, 2)
+        # The third stream was not reading while all three changes were made
+        assert await take(streams[2]) == frame(log, 1) + frame(log, 2) + frame(log, 3)
+        for stream in streams:
+            await stream.aclose()
+
+    asyncio.run(run())
+    assert log.subscribers == 0
+
+
+def test_idle_streams_get_heartbeats(monkeypatch):
+    monkeypatch.setattr(changes, "HEARTBEAT_SECONDS", 0.01)
+    log = ChangeLog()
+
+    async def run():
+        stream = log.stream(after=0)
+        assert await take(stream) == b": keep-alive\n\n"
+        append(log, 1)
+        assert await take(stream) == frame(log, 1)
+        await stream.aclose()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("resume, first", [
+    # Last-Event-ID from this log: the changes after it
+    (lambda log: {"last_event_id": log.event_id(1)}, lambda log: frame(log, 2) + frame(log, 3)),
+    # ?since= wins over the header
+    (lambda log: {"since": log.event_id(2), "last_event_id": log.event_id(1)}, lambda log: frame(log, 3)),
+    # An ID from another process or an earlier run
+    (lambda log: {"last_event_id": "0badc0de-2"}, lambda log: b'id: %s\nevent: reset\ndata: {"seq":3}\n\n' % log.event_id(3).encode()),
+    (lambda log: {"since": "not an id"}, lambda log: b'id: %s\nevent: reset\ndata: {"seq":3}\n\n' % log.event_id(3).encode()),
+    # No resume point
+    (lambda log: {}, lambda log: b"id: %s\n\n" % log.event_id(3).encode()),
+])
+def test_the_route_resumes_from_the_event_id(monkeypatch, resume, first):
+    log = ChangeLog()
+    monkeypatch.setattr(changes, "_log", log)
+    append(log, 3)
+
+    async def run():
+        response = await stream_changes(**{"since": None, "last_event_id": None, **resume(log)})
+        assert response.media_type == changes.SSE_MEDIA_TYPE
+        assert await take(response.body_iterator) == first(log)
+        await response.body_iterator.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,116 @@
+"""Facet filters and counts, from the in-process index and from a catalog snapshot"""
+
+import dataclasses
+
+import pytest
+from fastapi.testclient import TestClient
+
+import catalog as catalog_module
+import snapshot
+from server import create_app
+
+
+@pytest.fixture(params=["memory", "snapshot"])
+def facet_client(request, app_config, tmp_path):
+    if request.param == "snapshot":
+        app_config = dataclasses.replace(app_config, snapshot_path=str(tmp_path / "catalog.snapshot"))
+    with TestClient(create_app(app_config)) as client:
+        yield client
+
+
+def settle(client) -> None:
+    """Publish writes to the snapshot now instead of waiting for the scheduled publish"""
+    if catalog_module._snapshots is not None:
+        client.portal.call(catalog_module.publish_snapshot)
+
+
+@pytest.fixture
+def catalog(facet_client, make_destination):
+    for name, location, rating, activities, best_time, price in [
+        ("Palolem Beach", "South Goa", 4.5, ["Swimming", "Kayaking"], "November to March", "₹₹"),
+        ("Agonda Beach", "South Goa", 4.2, ["Swimming"], "November to February", "₹"),
+        ("Baga Beach", "North Goa", 4.27, ["Nightlife", "Swimming"], "October to March", "₹₹₹"),
+        ("Fort Aguada", "North Goa", 3.9, ["Sightseeing"], "All year", "₹"),
+    ]:
+        facet_client.post("/api/destinations", json=make_destination(
+            name, location=location, rating=rating, activities=activities, bestTime=best_time, price=price,
+        ))
+    settle(facet_client)
+    return facet_client
+
+
+def names(response) -> list:
+    assert response.status_code == 200
+    body = response.json()
+    return sorted(d["name"] for d in (body["items"] if isinstance(body, dict) else body))
+
+
+@pytest.mark.parametrize("min_rating, expected", [
+    (4.2, ["Agonda Beach", "Baga Beach", "Palolem Beach"]),
+    (4.25, ["Baga Beach", "Palolem Beach"]),
+    (4.27, ["Baga Beach", "Palolem Beach"]),
+    (4.28, ["Palolem Beach"]),
+    (4.3, ["Palolem Beach"]),
+    (0, ["Agonda Beach", "Baga Beach", "Fort Aguada", "Palolem Beach"]),
+    (5, []),
+])
+def test_min_rating_is_compared_with_the_exact_rating(catalog, min_rating, expected):
+    assert names(catalog.get("/api/destinations", params={"min_rating": min_rating})) == expected
+
+
+def test_filters_are_combined(catalog):
+    response = catalog.get("/api/destinations", params={
+        "activity": ["swimming", "Kayaking"], "price": "₹₹", "month": "January",
+    })
+    by_month = catalog.get("/api/destinations", params={"month": "10"})
+
+    assert names(response) == ["Palolem Beach"]
+    assert names(by_month) == ["Baga Beach", "Fort Aguada"]
+
+
+def test_counts_cover_every_facet_of_the_matches(catalog):
+    body = catalog.get("/api/destinations", params={"activity": "Swimming", "include_facets": "true"}).json()
+
+    assert body["total"] == 3
+    assert body["facets"]["location"] == {"North Goa": 1, "South Goa": 2}
+    assert body["facets"]["activity"] == {"Kayaking": 1, "Nightlife": 1, "Swimming": 3}
+    assert body["facets"]["price"] == {"₹": 1, "₹₹": 1, "₹₹₹": 1}
+    # 4.2 and 4.27 share a tenth
+    assert body["facets"]["rating"] == {"4.2": 2, "4.5": 1}
+
+
+def test_new_destinations_are_counted(catalog, make_destination):
+    catalog.get("/api/destinations", params={"include_facets": "true"})
+    catalog.post("/api/destinations", json=make_destination("Cola Beach", rating=4.2))
+    settle(catalog)
+
+    body = catalog.get("/api/destinations", params={"include_facets": "true", "min_rating": 4.2}).json()
+
+    assert body["total"] == 4
+    assert body["facets"]["rating"] == {"4.2": 3, "4.5": 1}
+
+
+def test_snapshots_in_an_older_format_are_replaced(app_config, tmp_path, make_destination, monkeypatch):
+    path = tmp_path / "catalog.snapshot"
+    config = dataclasses.replace(app_config, snapshot_path=str(path))
+    with monkeypatch.context() as old:
+        old.setattr(snapshot, "MAGIC", b"GOACAT00")
+        with TestClient(create_app(config)) as client:
+            client.post("/api/destinations", json=make_destination())
+            client.get("/api/destinations", params={"include_facets": "true"})
+    assert path.read_bytes()[:8] == b"GOACAT00"
+
+    with TestClient(create_app(config)) as client:
+        body = client.get("/api/destinations", params={"include_facets": "true"}).json()
+
+    assert body["total"] == 1
+    assert path.read_bytes()[:8] == snapshot.MAGIC
+
+
+def test_the_schema_documents_both_response_shapes(client):
+    schema = client.get("/openapi.json").json()
+    listing = schema["paths"]["/api/destinations"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+
+    shapes = listing["anyOf"]
+    assert {"type": "array", "items": {"$ref": "#/components/schemas/Destination"}} in shapes
+    assert {"$ref": "#/components/schemas/FacetedDestinations"} in shapes
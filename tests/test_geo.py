@@ -0,0 +1,87 @@
+"""Grid index for nearest-destination queries, checked against brute force"""
+
+import random
+
+import pytest
+
+from geo import GeoIndex, haversine_km
+
+
+def brute_force(points, lat, lon, radius_km, limit):
+    distances = sorted((haversine_km(lat, lon, plat, plon), pid) for pid, (plat, plon) in points.items())
+    return [(d, pid) for d, pid in distances if d <= radius_km][:limit]
+
+
+def index_of(points, cell_degrees=0.25) -> GeoIndex:
+    index = GeoIndex(cell_degrees)
+    for pid, (lat, lon) in points.items():
+        index.add({"_id": pid, "lat": lat, "lon": lon})
+    return index
+
+
+def scatter(rng, count, lat_range, lon_range):
+    return {
+        f"p{i}": (rng.uniform(*lat_range), (rng.uniform(*lon_range) + 180) % 360 - 180)
+        for i in range(count)
+    }
+
+
+def assert_same(found, expected):
+    assert [pid for _, pid in found] == [pid for _, pid in expected]
+    assert [d for d, _ in found] == pytest.approx([d for d, _ in expected])
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_nearest_matches_brute_force_around_goa(seed):
+    rng = random.Random(seed)
+    points = scatter(rng, 300, (14.8, 15.9), (73.6, 74.3))
+    index = index_of(points)
+
+    for _ in range(20):
+        lat, lon = rng.uniform(14.5, 16.2), rng.uniform(73.3, 74.6)
+        radius, limit = rng.choice([5, 20, 80, 20040]), rng.choice([1, 5, 50])
+        assert_same(index.nearest(lat, lon, radius, limit), brute_force(points, lat, lon, radius, limit))
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("lat_range, lon_range, query", [
+    # Fiji straddles the antimeridian
+    ((-19, -15), (177, 183), lambda rng: (rng.uniform(-19, -15), rng.choice([179.9, -179.9, 180.0, -180.0]))),
+    # Both poles, where a degree of longitude is almost nothing
+    ((86, 90), (-180, 180), lambda rng: (rng.uniform(88, 90), rng.uniform(-180, 180))),
+    ((-90, -85), (-180, 180), lambda rng: (-90.0, rng.uniform(-180, 180))),
+    # Sparse points all over the globe
+    ((-90, 90), (-180, 180), lambda rng: (rng.uniform(-90, 90), rng.uniform(-180, 180))),
+])
+def test_nearest_matches_brute_force_at_the_edges(seed, lat_range, lon_range, query):
+    rng = random.Random(seed)
+    points = scatter(rng, 200, lat_range, lon_range)
+    index = index_of(points, cell_degrees=rng.choice([0.25, 1.0, 7.0]))
+
+    for _ in range(10):
+        lat, lon = query(rng)
+        radius, limit = rng.choice([50, 500, 3000, 20040]), rng.choice([1, 10, 300])
+        assert_same(index.nearest(lat, lon, radius, limit), brute_force(points, lat, lon, radius, limit))
+
+
+def test_the_radius_is_inclusive_and_limits_the_search():
+    index = index_of({"near": (15.0, 74.0), "far": (15.5, 74.0)})
+    distance = haversine_km(15.0, 74.0, 15.5, 74.0)
+
+    assert [pid for _, pid in index.nearest(15.0, 74.0, distance, 10)] == ["near", "far"]
+    assert [pid for _, pid in index.nearest(15.0, 74.0, distance - 0.01, 10)] == ["near"]
+    assert index.nearest(40.0, 74.0, 100, 10) == []
+
+
+def test_moved_and_unlocated_destinations():
+    index = index_of({"a": (15.0, 74.0)})
+
+    index.add({"_id": "a", "lat": -15.0, "lon": -74.0})
+    index.add({"_id": "b", "lat": None, "lon": 74.0})
+    index.add({"_id": "c", "lat": 15.0, "lon": 74.0})
+    index.remove("c")
+    index.remove("never added")
+
+    assert len(index) == 1
+    assert index.nearest(15.0, 74.0, 100, 10) == []
+    assert [pid for _, pid in index.nearest(-15.0, -74.0, 1, 10)] == ["a"]
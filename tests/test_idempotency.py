@@ -0,0 +1,112 @@
+"""Idempotency-Key handling on POST /api/itineraries"""
+
+import asyncio
+import uuid
+
+import httpx
+import pytest
+
+from idempotency import REPLAYED_HEADER, IdempotencyKeyReused, IdempotencyStore
+
+
+@pytest.fixture
+def trip(client, make_destination):
+    destination_id = client.post("/api/destinations", json=make_destination()).json()["_id"]
+    return {"tripName": "Long weekend", "startDate": "2025-01-10", "endDate": "2025-01-12", "destinations": [destination_id]}
+
+
+@pytest.fixture
+def key() -> str:
+    return str(uuid.uuid4())
+
+
+def itinerary_count(client) -> int:
+    return len(client.get("/api/itineraries").json())
+
+
+def test_a_retry_replays_the_first_response(client, trip, key):
+    first = client.post("/api/itineraries", json=trip, headers={"Idempotency-Key": key})
+    retry = client.post("/api/itineraries", json=trip, headers={"Idempotency-Key": key})
+
+    assert first.status_code == retry.status_code == 200
+    assert REPLAYED_HEADER not in first.headers
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert retry.json() == first.json()
+    assert itinerary_count(client) == 1
+
+
+def test_reusing_a_key_for_another_body_is_rejected(client, trip, key):
+    client.post("/api/itineraries", json=trip, headers={"Idempotency-Key": key})
+
+    changed = client.post("/api/itineraries", json={**trip, "tripName": "Other"}, headers={"Idempotency-Key": key})
+    optimized = client.post("/api/itineraries", json=trip, params={"optimize": "true"}, headers={"Idempotency-Key": key})
+
+    assert changed.status_code == optimized.status_code == 422
+    assert itinerary_count(client) == 1
+
+
+def test_requests_without_a_key_are_not_deduplicated(client, trip):
+    client.post("/api/itineraries", json=trip)
+    client.post("/api/itineraries", json=trip)
+
+    assert itinerary_count(client) == 2
+
+
+def test_concurrent_duplicates_share_one_write(client, trip, key):
+    async def post_all():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.post("/api/itineraries", json=trip, headers={"Idempotency-Key": key}) for _ in range(8)
+            ))
+
+    responses = client.portal.call(post_all)
+
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.json()["_id"] for r in responses}) == 1
+    assert sum(REPLAYED_HEADER not in r.headers for r in responses) == 1
+    assert itinerary_count(client) == 1
+
+
+def test_in_flight_requests_are_coalesced_and_failures_forgotten():
+    store = IdempotencyStore()
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise RuntimeError("storage down")
+        return b"{}"
+
+    async def run():
+        failed = await asyncio.gather(*(store.run("k", "f", produce) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in failed)
+        assert len(store) == 0
+        body, replayed = await store.run("k", "f", produce)
+        assert (body, replayed) == (b"{}", False)
+        assert await store.run("k", "f", produce) == (b"{}", True)
+        with pytest.raises(IdempotencyKeyReused):
+            await store.run("k", "other", produce)
+
+    asyncio.run(run())
+
+    assert len(calls) == 2
+    assert (store.executed, store.coalesced, store.replayed, store.conflicts) == (2, 2, 1, 1)
+
+
+def test_expired_and_excess_keys_are_evicted():
+    store = IdempotencyStore(ttl=0.01, max_keys=2)
+
+    async def body():
+        return b"{}"
+
+    async def run():
+        for key in ("a", "b", "c"):
+            await store.run(key, "f", body)
+        assert len(store) == 2
+        await asyncio.sleep(0.02)
+        assert await store.run("a", "f", body) == (b"{}", False)
+        assert len(store) == 1
+
+    asyncio.run(run())
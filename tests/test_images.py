@@ -0,0 +1,202 @@
+"""GET /api/images/{id} against a local stand-in for the image origin"""
+
+import asyncio
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import images
+from images import ImageCache, is_public_address
+
+PIL = pytest.importorskip("PIL.Image")
+
+
+def jpeg(width: int, height: int) -> bytes:
+    out = io.BytesIO()
+    PIL.new("RGB", (width, height), (200, 120, 40)).save(out, format="JPEG")
+    return out.getvalue()
+
+
+class Origin(ThreadingHTTPServer):
+    """Serves /photo.jpg, and /moved redirecting to ``redirect_to``"""
+
+    def __init__(self):
+        self.photo = jpeg(800, 400)
+        self.hits = []
+        self.redirect_to = None
+        super().__init__(("127.0.0.1", 0), OriginHandler)
+
+    def url(self, path: str, host: str = "127.0.0.1") -> str:
+        return f"http://{host}:{self.server_address[1]}{path}"
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        if self.path == "/moved":
+            self.send_response(302)
+            self.send_header("Location", self.server.redirect_to)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(self.server.photo)))
+        self.end_headers()
+        self.wfile.write(self.server.photo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def origin():
+    server = Origin()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def allow_origin(monkeypatch):
+    monkeypatch.setenv("IMAGE_ALLOWED_HOSTS", "127.0.0.1")
+    monkeypatch.setenv("IMAGE_WORKERS", "1")
+
+
+def destination_with_image(client, make_destination, url: str) -> str:
+    return client.post("/api/destinations", json=make_destination(image=url)).json()["_id"]
+
+
+def test_original_is_fetched_once_and_revalidated_by_etag(client, make_destination, origin, allow_origin):
+    destination_id = destination_with_image(client, make_destination, origin.url("/photo.jpg"))
+
+    first = client.get(f"/api/images/{destination_id}")
+    second = client.get(f"/api/images/{destination_id}")
+    revalidated = client.get(f"/api/images/{destination_id}", headers={"If-None-Match": first.headers["etag"]})
+
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "image/jpeg"
+    assert first.content == second.content == origin.photo
+    assert revalidated.status_code == 304
+    assert origin.hits == ["/photo.jpg"]
+
+
+def test_variants_are_resized_to_a_standard_width(client, make_destination, origin, allow_origin):
+    destination_id = destination_with_image(client, make_destination, origin.url("/photo.jpg"))
+
+    jpeg_variant = client.get(f"/api/images/{destination_id}", params={"w": 300})
+    webp_variant = client.get(f"/api/images/{destination_id}", params={"w": 300}, headers={"Accept": "image/webp"})
+
+    assert PIL.open(io.BytesIO(jpeg_variant.content)).size == (320, 160)
+    if images.WEBP_SUPPORTED:
+        assert webp_variant.headers["content-type"] == "image/webp"
+        assert webp_variant.headers["etag"] != jpeg_variant.headers["etag"]
+    assert origin.hits == ["/photo.jpg"]
+
+
+def test_private_addresses_are_not_fetched(client, make_destination, origin):
+    destination_id = destination_with_image(client, make_destination, origin.url("/photo.jpg"))
+
+    response = client.get(f"/api/images/{destination_id}")
+
+    assert response.status_code == 502
+    assert origin.hits == []
+
+
+def test_redirects_are_checked_at_every_hop(client, make_destination, origin, allow_origin):
+    origin.redirect_to = origin.url("/photo.jpg", host="localhost")
+    destination_id = destination_with_image(client, make_destination, origin.url("/moved"))
+
+    response = client.get(f"/api/images/{destination_id}")
+
+    assert response.status_code == 502
+    assert origin.hits == ["/moved"]
+
+
+@pytest.mark.parametrize("address, public", [
+    ("93.184.216.34", True),
+    ("2606:4700::1111", True),
+    ("127.0.0.1", False),
+    ("10.1.2.3", False),
+    ("169.254.169.254", False),
+    ("100.64.0.1", False),
+    ("::1", False),
+    ("fe80::1%eth0", False),
+    ("::ffff:127.0.0.1", False),
+    ("224.0.0.1", False),
+])
+def test_public_addresses(address, public):
+    assert is_public_address(address) is public
+
+
+def test_files_being_served_are_not_evicted(tmp_path, monkeypatch):
+    blobs = {f"https://images.example.com/{i}.jpg": jpeg(40 + i, 40) for i in range(3)}
+
+    async def fetch(self, url):
+        return blobs[url]
+
+    monkeypatch.setattr(ImageCache, "_fetch", fetch)
+    monkeypatch.setattr(images, "Image", None)
+    urls = list(blobs)
+
+    async def run():
+        cache = ImageCache(tmp_path, max_bytes=max(len(b) for b in blobs.values()) + 1)
+        served = await cache.acquire(urls[0], None, None)
+        for url in urls[1:]:
+            cache.release(await cache.acquire(url, None, None))
+        assert served.exists()
+        cache.release(served)
+        cache.release(await cache.acquire(urls[1], None, None))
+        assert not served.exists()
+        await cache.close()
+
+    asyncio.run(run())
+
+
+def test_files_already_on_disk_are_found_after_a_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(ImageCache, "_fetch", lambda self, url: asyncio.sleep(0, jpeg(40, 40)))
+    monkeypatch.setattr(images, "Image", None)
+
+    async def run():
+        first = ImageCache(tmp_path)
+        first.release(await first.acquire("https://images.example.com/a.jpg", None, None))
+        restarted = ImageCache(tmp_path)
+        assert restarted.bytes == 0
+        await restarted._ready()
+        assert restarted.bytes == first.bytes > 0
+
+    asyncio.run(run())
+
+
+def test_evictions_delete_files_off_the_event_loop(tmp_path, monkeypatch):
+    blobs = {f"https://images.example.com/{i}.jpg": jpeg(40 + i, 40) for i in range(2)}
+    first, second = blobs
+    monkeypatch.setattr(ImageCache, "_fetch", lambda self, url: asyncio.sleep(0, blobs[url]))
+    monkeypatch.setattr(images, "Image", None)
+    unblock = threading.Event()
+    unlink_all = images._unlink_all
+    monkeypatch.setattr(images, "_unlink_all", lambda paths: (unblock.wait(5), unlink_all(paths)))
+
+    async def run():
+        cache = ImageCache(tmp_path, max_bytes=max(len(b) for b in blobs.values()) + 1)
+        cache.release(await cache.acquire(first, None, None))
+        evicting = asyncio.ensure_future(cache.acquire(second, None, None))
+        await asyncio.sleep(0.1)
+        # The loop keeps running while the evicted file is deleted in a thread
+        assert not evicting.done() and cache._deleting
+        refetching = asyncio.ensure_future(cache.acquire(first, None, None))
+        await asyncio.sleep(0.1)
+        # Fetching the evicted image again waits for its deletion instead of racing it
+        assert not refetching.done()
+        unblock.set()
+        cache.release(await evicting)
+        served = await refetching
+        assert served.exists()
+        assert cache._files.keys() == {served}
+        cache.release(served)
+        await cache.close()
+
+    asyncio.run(run())
@@ -0,0 +1,95 @@
+"""Request-scoped destination loader"""
+
+import asyncio
+
+import pytest
+
+from loaders import DestinationLoader, expand_destinations
+
+
+class FakeRepository:
+    def __init__(self, docs=(), error=None):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.error = error
+        self.calls = []
+
+    async def get_many(self, ids):
+        self.calls.append(list(ids))
+        await asyncio.sleep(0)
+        if self.error:
+            raise self.error
+        return [self.docs[d] for d in ids if d in self.docs]
+
+
+def test_loads_in_one_tick_share_one_fetch():
+    repo = FakeRepository([{"_id": "a"}, {"_id": "b"}])
+
+    async def run():
+        loader = DestinationLoader(repo)
+        found = await loader.load_many(["a", "b", "a", "missing"])
+        again = await loader.load("a")
+        return found, again
+
+    found, again = asyncio.run(run())
+
+    assert found == {"a": {"_id": "a"}, "b": {"_id": "b"}}
+    assert again == {"_id": "a"}
+    assert repo.calls == [["a", "b", "missing"]]
+
+
+class MalformedRepository(FakeRepository):
+    """Returns a document without an ID, so the batch fails after get_many"""
+
+    async def get_many(self, ids):
+        return [{"name": "no id"}]
+
+
+@pytest.mark.parametrize("repo", [
+    FakeRepository(error=RuntimeError("storage down")),
+    MalformedRepository(),
+], ids=["get_many", "after_get_many"])
+def test_a_failed_batch_fails_every_waiting_load(repo):
+    async def run():
+        loader = DestinationLoader(repo)
+        results = await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+        # Failed IDs are forgotten, so a later load tries again
+        assert "a" not in loader._cache
+        await asyncio.sleep(0)
+        assert not loader._tasks
+        return results
+
+    results = asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    assert all(isinstance(r, Exception) for r in results)
+
+
+def test_dispatch_is_held_until_it_finishes():
+    repo = FakeRepository([{"_id": "a"}])
+
+    async def run():
+        loader = DestinationLoader(repo)
+        pending = loader.load("a")
+        await asyncio.sleep(0)
+        assert len(loader._tasks) == 1
+        assert await pending == {"_id": "a"}
+        await asyncio.sleep(0)
+        assert not loader._tasks
+
+    asyncio.run(run())
+
+
+def test_deleted_destinations_are_dropped_with_their_stop_day():
+    repo = FakeRepository([{"_id": "a"}, {"_id": "c"}])
+    itineraries = [
+        {"_id": "trip", "destinations": ["a", "gone", "c"], "stopDays": [1, 2, 3]},
+        {"_id": "unplanned", "destinations": ["gone", "c"], "stopDays": None},
+    ]
+
+    expanded = asyncio.run(expand_destinations(DestinationLoader(repo), itineraries))
+
+    assert expanded[0]["destinations"] == [{"_id": "a"}, {"_id": "c"}]
+    assert expanded[0]["stopDays"] == [1, 3]
+    assert expanded[1]["destinations"] == [{"_id": "c"}]
+    assert expanded[1]["stopDays"] is None
+    # The stored documents are left alone
+    assert itineraries[0]["stopDays"] == [1, 2, 3]
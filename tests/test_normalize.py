@@ -0,0 +1,57 @@
+"""Parsing "best time to visit" text into month masks"""
+
+import pytest
+
+from normalize import ALL_MONTHS, best_time_mask, month_bit
+
+
+def months(*numbers: int) -> int:
+    mask = 0
+    for number in numbers:
+        mask |= month_bit(number)
+    return mask
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Ranges, with every separator
+    ("November to February", months(11, 12, 1, 2)),
+    ("Nov–Feb", months(11, 12, 1, 2)),
+    ("Nov - Feb", months(11, 12, 1, 2)),
+    ("Dec—Feb", months(12, 1, 2)),
+    ("October until March", months(10, 11, 12, 1, 2, 3)),
+    ("September through November", months(9, 10, 11)),
+    ("March-May", months(3, 4, 5)),
+    ("from Sept to Oct", months(9, 10)),
+    ("NOV-FEB", months(11, 12, 1, 2)),
+    ("mid-October to March", months(10, 11, 12, 1, 2, 3)),
+    ("Winter (Nov-Feb)", months(11, 12, 1, 2)),
+    # Wrapping over the new year, down to a one-month range
+    ("December to January", months(12, 1)),
+    ("Feb to Jan", ALL_MONTHS),
+    ("Jan to Jan", months(1)),
+    # Lists and single months
+    ("June, July and August", months(6, 7, 8)),
+    ("March & April", months(3, 4)),
+    ("Jan/Feb; Dec", months(1, 2, 12)),
+    ("Mid-March", months(3)),
+    ("October to March and May", months(10, 11, 12, 1, 2, 3, 5)),
+    # All year
+    ("Year-round", ALL_MONTHS),
+    ("year round", ALL_MONTHS),
+    ("All year", ALL_MONTHS),
+    ("all-year round", ALL_MONTHS),
+    ("Throughout the year", ALL_MONTHS),
+    ("Round the year", ALL_MONTHS),
+    # Words that only contain "all", "round" or "year"
+    ("Small year-end crowds in December", months(12)),
+    ("Around March", months(3)),
+    # Nothing recognizable
+    ("", 0),
+    ("Monsoon", 0),
+    ("N/A", 0),
+    ("Anytime except summer", 0),
+    ("Marching season", 0),
+    ("13", 0),
+])
+def test_best_time_mask(text, expected):
+    assert best_time_mask(text) == expected
@@ -0,0 +1,124 @@
+"""Keyset pagination and NDJSON streaming of destination and itinerary lists"""
+
+import json
+
+import pytest
+
+from streaming import NEXT_CURSOR_HEADER
+from storage.base import encode_cursor
+
+
+@pytest.fixture
+def destination_ids(client, make_destination):
+    body = "\n".join(json.dumps(make_destination(f"Beach {i}")) for i in range(7))
+    client.post("/api/destinations/bulk", content=body)
+    return [d["_id"] for d in client.get("/api/destinations").json()]
+
+
+@pytest.fixture
+def itinerary_ids(client, destination_ids):
+    created = []
+    for i in range(5):
+        created.append(client.post("/api/itineraries", json={
+            "tripName": f"Trip {i}",
+            "startDate": f"2025-01-{i + 1:02d}",
+            "endDate": f"2025-01-{i + 3:02d}",
+            "destinations": destination_ids[i:i + 2],
+        }).json()["_id"])
+    return created
+
+
+def walk(client, path, limit, **params):
+    """Every page of ``path`` in order, following X-Next-Cursor"""
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append([doc["_id"] for doc in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+def ndjson_ids(response) -> list:
+    return [json.loads(line)["_id"] for line in response.text.splitlines()]
+
+
+def test_destination_pages_cover_the_list_once_in_order(client, destination_ids):
+    pages = walk(client, "/api/destinations", limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == destination_ids
+
+
+def test_itinerary_pages_are_newest_first(client, itinerary_ids):
+    pages = walk(client, "/api/itineraries", limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == itinerary_ids[::-1]
+
+
+def test_a_full_last_page_has_no_cursor(client, destination_ids):
+    response = client.get("/api/destinations", params={"limit": len(destination_ids)})
+
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_ndjson_streams_everything_after_the_cursor(client, destination_ids, itinerary_ids):
+    cursor = client.get("/api/destinations", params={"limit": 2}).headers[NEXT_CURSOR_HEADER]
+
+    destinations = client.get("/api/destinations", params={"format": "ndjson", "cursor": cursor})
+    itineraries = client.get("/api/itineraries", headers={"Accept": "application/x-ndjson"})
+
+    assert destinations.headers["content-type"] == "application/x-ndjson"
+    assert ndjson_ids(destinations) == destination_ids[2:]
+    assert ndjson_ids(itineraries) == itinerary_ids[::-1]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    encode_cursor("k", 1, 2),
+    encode_cursor("s", 1.5, 3),
+    encode_cursor("f", 4),
+])
+@pytest.mark.parametrize("path", ["/api/destinations", "/api/itineraries"])
+@pytest.mark.parametrize("format", ["json", "ndjson"])
+def test_invalid_cursors_are_rejected(client, destination_ids, path, format, cursor):
+    response = client.get(path, params={"cursor": cursor, "format": format})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+
+def test_ndjson_exports_expand_destinations(client, destination_ids, itinerary_ids):
+    response = client.get("/api/itineraries", params={"format": "ndjson", "expand": "destinations"})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["_id"] for line in lines] == itinerary_ids[::-1]
+    assert lines == client.get("/api/itineraries", params={"expand": "destinations"}).json()
+    assert [d["name"] for d in lines[0]["destinations"]] == ["Beach 4", "Beach 5"]
+
+
+def test_streamed_expansion_looks_up_destinations_once_per_batch(client, destination_ids, itinerary_ids, monkeypatch):
+    import loaders
+    from storage import get_destination_repository, get_itinerary_repository
+
+    repo = get_destination_repository()
+    lookups = []
+
+    class CountingRepository:
+        async def get_many(self, ids):
+            lookups.append(sorted(ids))
+            return await repo.get_many(ids)
+
+    monkeypatch.setattr(loaders, "get_destination_repository", CountingRepository)
+
+    async def export():
+        return [doc async for doc in loaders.expand_stream(get_itinerary_repository().stream(), batch_size=2)]
+
+    expanded = client.portal.call(export)
+
+    assert [doc["_id"] for doc in expanded] == itinerary_ids[::-1]
+    # Trips 4+3, 2+1 and 0, each visiting destinations i and i + 1
+    assert lookups == [sorted(destination_ids[3:6]), sorted(destination_ids[1:4]), sorted(destination_ids[0:2])]
@@ -0,0 +1,132 @@
+"""Stop ordering, day splitting and the distance matrix cache"""
+
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from routing import (
+    EXACT_MAX_STOPS, MatrixCache, distance_matrix, plan_route, route_length, shortest_path, split_days,
+)
+
+
+def random_points(seed: int, n: int) -> list:
+    rng = random.Random(seed)
+    return [(f"d{i}", 15 + rng.random() * 0.8, 73.7 + rng.random() * 0.4) for i in range(n)]
+
+
+def matrix_of(points) -> np.ndarray:
+    return distance_matrix(np.array([p[1] for p in points]), np.array([p[2] for p in points]))
+
+
+def brute_force(matrix: np.ndarray) -> float:
+    return min(route_length(matrix, path) for path in itertools.permutations(range(len(matrix))))
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_small_routes_are_optimal(seed):
+    matrix = matrix_of(random_points(seed, 3 + seed % 5))
+
+    path = shortest_path(matrix)
+
+    assert sorted(path) == list(range(len(matrix)))
+    assert route_length(matrix, path) == pytest.approx(brute_force(matrix))
+
+
+def test_longer_routes_visit_every_stop_once_within_the_budget():
+    points = random_points(1, EXACT_MAX_STOPS + 6)
+    matrix = matrix_of(points)
+
+    path = shortest_path(matrix, budget=0.05)
+
+    assert sorted(path) == list(range(len(points)))
+    assert route_length(matrix, path) <= route_length(matrix, range(len(points)))
+
+
+def brute_force_days(legs, days):
+    """Best (longest day, total travel) over every way to cut the stops into days"""
+    stops = len(legs) + 1
+    days = max(1, min(days, stops))
+    best = None
+    for cuts in itertools.combinations(range(1, stops), days - 1):
+        bounds = (0, *cuts, stops)
+        travel = [sum(legs[a:b - 1]) for a, b in zip(bounds, bounds[1:])]
+        score = (max(travel), sum(travel))
+        best = score if best is None or score < best else best
+    return best
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_day_split_minimizes_the_longest_day(seed):
+    rng = random.Random(seed)
+    legs = [round(rng.uniform(1, 40), 1) for _ in range(rng.randint(1, 7))]
+    days = rng.randint(1, 5)
+
+    assignment = split_days(legs, days)
+
+    used = max(1, min(days, len(legs) + 1))
+    assert assignment[0] == 1 and assignment[-1] == used
+    assert all(b - a in (0, 1) for a, b in zip(assignment, assignment[1:]))
+    travel = [sum(leg for leg, a, b in zip(legs, assignment, assignment[1:]) if a == b == day) for day in range(1, used + 1)]
+    assert (max(travel), sum(travel)) == pytest.approx(brute_force_days(legs, days))
+
+
+def docs_for(points, **extra):
+    return [{"_id": p[0], "lat": p[1], "lon": p[2]} for p in points] + [{"_id": k, **v} for k, v in extra.items()]
+
+
+@pytest.mark.parametrize("n", [0, 1, 2])
+def test_tiny_itineraries(n):
+    points = random_points(3, n)
+
+    route = plan_route([p[0] for p in points], docs_for(points), days=3)
+
+    assert sorted(route.destinations) == [p[0] for p in points]
+    assert len(route.stop_days) == n
+    assert route.distance_km == route.original_distance_km
+
+
+def test_stops_without_coordinates_go_last_in_their_order():
+    points = random_points(4, 4)
+    ids = ["x", points[0][0], "missing", points[1][0], points[2][0], "y", points[3][0]]
+    docs = docs_for(points, x={}, y={"lat": 15.2, "lon": None})
+
+    route = plan_route(ids, docs, days=2)
+
+    assert route.destinations[4:] == ["x", "missing", "y"]
+    assert sorted(route.destinations[:4]) == sorted(p[0] for p in points)
+    assert route.stop_days[4:] == [route.stop_days[3]] * 3
+    assert max(route.stop_days) == 2
+
+
+def test_duplicate_stops_are_kept():
+    points = random_points(5, 3)
+    ids = [points[0][0], points[1][0], points[0][0], points[2][0]]
+
+    route = plan_route(ids, docs_for(points), days=1)
+
+    assert sorted(route.destinations) == sorted(ids)
+    # Visiting the same place twice in a row costs nothing
+    assert route.distance_km <= route.original_distance_km
+
+
+def test_the_matrix_cache_reuses_and_permutes_entries():
+    cache = MatrixCache(max_entries=2)
+    points = random_points(6, 4)
+
+    first = cache.get(points)
+    shuffled = [points[i] for i in (2, 0, 3, 1)]
+    second = cache.get(shuffled)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert np.allclose(first, matrix_of(points))
+    assert np.allclose(second, matrix_of(shuffled))
+
+    moved = [(points[0][0], points[0][1] + 0.5, points[0][2])] + points[1:]
+    assert np.allclose(cache.get(moved), matrix_of(moved))
+    assert cache.misses == 2
+    cache.get(random_points(7, 3))
+    # The least recently used set was evicted
+    cache.get(points)
+    assert cache.misses == 4
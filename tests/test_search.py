@@ -0,0 +1,72 @@
+"""Full-text search over destinations: prefixes, ranking and ranked pages"""
+
+import json
+
+import pytest
+
+from streaming import NEXT_CURSOR_HEADER
+
+
+@pytest.fixture
+def catalog(client, make_destination):
+    rows = [
+        make_destination("Palolem Beach", description="Calm bay in the south."),
+        make_destination("Fort Aguada", location="North Goa", description="Portuguese fort above the beach at Sinquerim."),
+        make_destination("Café Tato", location="North Goa", description="Old Panjim breakfast spot.", activities=["Food"]),
+        make_destination("Dudhsagar Falls", description="Four-tiered waterfall.", activities=["Trekking", "Swimming"]),
+    ]
+    client.post("/api/destinations/bulk", content="\n".join(json.dumps(row) for row in rows))
+    return client
+
+
+def search(client, text, **params):
+    return [d["name"] for d in client.get("/api/destinations", params={"search": text, **params}).json()]
+
+
+def test_words_match_as_prefixes(catalog):
+    assert search(catalog, "pal") == ["Palolem Beach"]
+    assert search(catalog, "trek waterf") == ["Dudhsagar Falls"]
+
+
+def test_every_word_must_match(catalog):
+    assert search(catalog, "fort waterfall") == []
+
+
+def test_diacritics_and_punctuation_are_ignored(catalog):
+    assert search(catalog, "cafe") == ["Café Tato"]
+    assert search(catalog, '"*) OR (') == []
+
+
+def test_name_matches_rank_above_description_matches(catalog):
+    assert search(catalog, "beach") == ["Palolem Beach", "Fort Aguada"]
+
+
+def test_search_with_location(catalog):
+    assert search(catalog, "beach", location="North Goa") == ["Fort Aguada"]
+
+
+def test_ranked_pages_follow_the_cursor(client, make_destination):
+    rows = [make_destination(f"Beach {i}", description="beach " * (i % 7 + 1)) for i in range(25)]
+    client.post("/api/destinations/bulk", content="\n".join(json.dumps(row) for row in rows))
+    everything = search(client, "beach", limit=100)
+
+    paged, cursor = [], None
+    while True:
+        params = {"search": "beach", "limit": 4, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/destinations", params=params)
+        paged += [d["name"] for d in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+
+    assert len(everything) == 25
+    assert paged == everything
+
+
+def test_listing_cursor_is_rejected_for_search(client, make_destination):
+    client.post("/api/destinations/bulk", content="\n".join(json.dumps(make_destination(f"Beach {i}")) for i in range(3)))
+    cursor = client.get("/api/destinations", params={"limit": 1}).headers[NEXT_CURSOR_HEADER]
+
+    response = client.get("/api/destinations", params={"search": "beach", "cursor": cursor})
+
+    assert response.status_code == 400
@@ -0,0 +1,118 @@
+"""Similar-destination index: built and incremental neighbour lists against brute force"""
+
+import random
+
+import numpy as np
+import pytest
+
+import similar
+from similar import MAX_NEIGHBOURS, SimilarityIndex, term_counts
+
+WORDS = [
+    "beach", "fort", "temple", "church", "market", "waterfall", "spice", "river", "island", "lighthouse",
+    "sunset", "cliff", "lagoon", "village", "heritage", "cashew", "feni", "nightlife", "quiet", "crowded",
+    "portuguese", "baroque", "forest", "wildlife", "dolphins", "shacks", "seafood", "trek", "hills", "caves",
+]
+ACTIVITIES = ["Swimming", "Kayaking", "Trekking", "Sightseeing", "Shopping", "Birdwatching", "Parasailing"]
+
+
+def destinations(seed: int, count: int) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "_id": f"{seed:04x}{i:020x}",
+            "description": " ".join(rng.choices(WORDS, k=rng.randint(3, 15))),
+            "activities": rng.sample(ACTIVITIES, rng.randint(0, 3)),
+        }
+        for i in range(count)
+    ]
+
+
+def assert_matches_brute_force(index: SimilarityIndex, docs) -> None:
+    """Same vectors and neighbour lists as computing everything from scratch with the index's IDF"""
+    n = len(docs)
+    assert index.ids == [doc["_id"] for doc in docs]
+    expected = np.zeros((n, len(index.idf)), dtype=np.float32)
+    for row, doc in enumerate(docs):
+        for bucket, tf in term_counts(doc).items():
+            expected[row, bucket] = (1 + np.log(tf)) * index.idf[bucket]
+    norms = np.linalg.norm(expected, axis=1, keepdims=True)
+    expected = np.divide(expected, norms, out=np.zeros_like(expected), where=norms > 0)
+    assert index.vectors[:n] == pytest.approx(expected, abs=1e-6)
+
+    similarity = expected @ expected.T
+    np.fill_diagonal(similarity, -np.inf)
+    k = min(MAX_NEIGHBOURS, n - 1)
+    for row, doc in enumerate(docs):
+        best = -np.sort(-similarity[row])[:k]
+        found = index.similar(doc["_id"], MAX_NEIGHBOURS)
+        rows = [index.ordinals[found_id] for found_id, _ in found]
+        # Equally similar destinations may come in any order, so compare scores rather than IDs
+        assert [score for _, score in found] == pytest.approx(best.tolist(), abs=1e-5)
+        assert [score for _, score in found] == pytest.approx(similarity[row, rows].tolist(), abs=1e-5)
+        assert len(set(rows)) == len(rows)
+
+
+@pytest.mark.parametrize("count", [1, 2, 15, 80])
+def test_build_matches_brute_force(count, monkeypatch):
+    # Several blocks even for a small catalog
+    monkeypatch.setattr(similar, "BUILD_BLOCK", 7)
+    docs = destinations(count, count)
+
+    assert_matches_brute_force(SimilarityIndex.build(docs), docs)
+
+
+@pytest.mark.parametrize("built", [0, 1, 10, 40])
+def test_incremental_adds_match_a_rebuild(built):
+    docs = destinations(built + 1, 70)
+    index = SimilarityIndex.build(docs[:built])
+
+    for doc in docs[built:]:
+        index.add(doc)
+    # Adding a destination again changes nothing
+    index.add(docs[0])
+
+    assert_matches_brute_force(index, docs)
+
+
+def test_a_destination_is_never_similar_to_itself():
+    docs = destinations(9, 30)
+    copies = [{**doc, "_id": "c" + doc["_id"][1:]} for doc in docs[:5]]
+    empty = [{"_id": "e" * 24, "description": "", "activities": []}]
+    index = SimilarityIndex.build(docs[:3])
+    for doc in docs[3:] + copies + empty:
+        index.add(doc)
+
+    for doc in docs + copies + empty:
+        found = index.similar(doc["_id"], MAX_NEIGHBOURS)
+        assert doc["_id"] not in [found_id for found_id, _ in found]
+        assert len(found) == MAX_NEIGHBOURS
+    # An identical description is the closest match
+    assert index.similar(docs[0]["_id"], 1)[0] == (copies[0]["_id"], pytest.approx(1.0))
+    assert index.similar("missing", 5) is None
+
+
+def test_the_index_is_rebuilt_once_the_catalog_has_grown(monkeypatch):
+    docs = destinations(11, 100)
+    monkeypatch.setattr(similar, "_index", SimilarityIndex.build(docs[:80]))
+
+    similar.add_to_similarity_index(docs[80:100])
+    assert similar._index is not None and len(similar._index) == 100
+
+    similar.add_to_similarity_index(destinations(12, 1))
+    assert similar._index is None
+
+
+def test_the_route_returns_the_neighbours(client, make_destination):
+    beaches = [client.post("/api/destinations", json=make_destination(f"Beach {i}")).json() for i in range(3)]
+    fort = client.post("/api/destinations", json=make_destination(
+        "Aguada Fort", description="Portuguese fort and lighthouse above the river mouth.", activities=["Sightseeing"],
+    )).json()
+
+    response = client.get(f"/api/destinations/{beaches[0]['_id']}/similar", params={"k": 3})
+
+    assert response.status_code == 200
+    found = [(doc["_id"], doc["similarity"]) for doc in response.json()]
+    assert sorted(found[:2]) == sorted((beach["_id"], pytest.approx(1.0)) for beach in beaches[1:])
+    assert found[2][0] == fort["_id"]
+    assert client.get(f"/api/destinations/{'0' * 24}/similar").status_code == 404
@@ -0,0 +1,155 @@
+"""Catalog snapshots: file format, lookups and swapping between versions"""
+
+import asyncio
+
+import pytest
+
+import snapshot
+from facets import FacetIndex
+from snapshot import CatalogSnapshot, SnapshotManager, write_snapshot
+
+
+def destination(i: int, **fields) -> dict:
+    return {
+        "_id": f"{i:024x}",
+        "name": f"Place {i}",
+        "location": "North Goa" if i % 2 else "South Goa",
+        "activities": ["Swimming", "Kayaking"][: 1 + i % 2],
+        "rating": 3.5 + (i % 4) / 4,
+        "priceTier": 1 + i % 3,
+        "bestTimeMask": 0b111 << (i % 10),
+        **fields,
+    }
+
+
+DOCS = [destination(i) for i in range(40)]
+
+
+async def aiter(docs):
+    for doc in docs:
+        yield doc
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "catalog.snapshot"
+
+
+@pytest.fixture(autouse=True)
+def no_check_delay(monkeypatch):
+    monkeypatch.setattr(snapshot, "CHECK_INTERVAL", 0)
+
+
+def test_lookups_round_trip(path):
+    write_snapshot(path, DOCS, version=3)
+
+    mapped = CatalogSnapshot(path)
+
+    assert (mapped.version, mapped.count) == (3, len(DOCS))
+    assert [mapped.id_at(o) for o in range(mapped.count)] == [d["_id"] for d in DOCS]
+    for ordinal, doc in enumerate(DOCS):
+        assert mapped.ordinal(doc["_id"]) == ordinal
+        assert mapped.get(doc["_id"]) == doc
+    assert mapped.ordinal("f" * 24) is None
+    # Sorts between two IDs that exist
+    assert mapped.ordinal("0" * 23 + "g") is None
+    assert mapped.get("missing") is None
+
+
+def test_facets_match_the_in_memory_index(path):
+    write_snapshot(path, DOCS, version=1)
+    mapped = CatalogSnapshot(path).facets
+    built = asyncio.run(FacetIndex.build(aiter(DOCS)))
+
+    for filters in [{}, {"location": "North Goa"}, {"activities": ["kayaking"]}, {"price": 2, "month": 4},
+                    {"min_rating": 4.0}, {"min_rating": 4.3, "location": "South Goa"}]:
+        assert mapped.query(**filters) == built.query(**filters)
+        assert mapped.counts(mapped.query(**filters)) == built.counts(built.query(**filters))
+    assert mapped.page(mapped.all, 5, after=10) == built.page(built.all, 5, after=10)
+    with pytest.raises(TypeError):
+        mapped.add(destination(99))
+
+
+def test_an_empty_catalog_is_a_valid_snapshot(path):
+    write_snapshot(path, [], version=1)
+
+    mapped = CatalogSnapshot(path)
+
+    assert mapped.count == 0
+    assert mapped.ordinal(DOCS[0]["_id"]) is None
+    assert mapped.facets.query(location="North Goa") == 0
+
+
+def test_files_that_are_not_current_snapshots_are_refused(path):
+    path.write_bytes(b"GOACAT01" + bytes(64))
+    with pytest.raises(ValueError):
+        CatalogSnapshot(path)
+
+    manager = SnapshotManager(path, lambda: aiter(DOCS))
+    assert manager.current() is None
+    published = asyncio.run(manager.publish())
+    # A file in an old format does not continue its version numbers
+    assert published.version == 1
+
+
+def test_publishing_numbers_versions_and_notifies(path):
+    docs = list(DOCS[:3])
+    manager = SnapshotManager(path, lambda: aiter(docs))
+    swapped = []
+    manager.on_swap(lambda s: swapped.append(s.version))
+
+    async def run():
+        await manager.publish()
+        docs.append(DOCS[3])
+        await manager.publish()
+
+    asyncio.run(run())
+
+    assert swapped == [1, 2]
+    assert manager.current().count == 4
+
+
+def test_readers_keep_the_old_version_across_a_swap(path):
+    write_snapshot(path, DOCS[:2], version=1)
+    worker = SnapshotManager(path, lambda: aiter([]))
+    held = worker.current()
+    held_doc = DOCS[0]["_id"]
+
+    replaced = {**DOCS[0], "name": "Renamed"}
+    write_snapshot(path, [replaced] + DOCS[1:5], version=2)
+
+    # The request that held the old mapping still reads the old file
+    assert held.version == 1
+    assert held.get(held_doc)["name"] == "Place 0"
+    assert held.count == 2
+    # Later requests see the new version
+    current = worker.current()
+    assert current is not held
+    assert (current.version, current.count) == (2, 5)
+    assert current.get(held_doc)["name"] == "Renamed"
+
+
+def test_workers_pick_up_a_version_another_worker_published(path):
+    publisher = SnapshotManager(path, lambda: aiter(DOCS[:1]))
+    reader = SnapshotManager(path, lambda: aiter([]))
+    asyncio.run(publisher.publish())
+    first = reader.current()
+
+    publisher._load = lambda: aiter(DOCS[:2])
+    asyncio.run(publisher.publish())
+
+    assert first.version == 1
+    assert reader.current().version == 2
+    # No temporary files are left behind
+    assert sorted(p.name for p in path.parent.iterdir()) == ["catalog.snapshot", "catalog.snapshot.lock"]
+
+
+def test_the_file_is_checked_at_most_every_interval(path, monkeypatch):
+    write_snapshot(path, DOCS[:1], version=1)
+    worker = SnapshotManager(path, lambda: aiter([]))
+    first = worker.current()
+    monkeypatch.setattr(snapshot, "CHECK_INTERVAL", 60)
+    write_snapshot(path, DOCS[:2], version=2)
+
+    # Within the check interval the file is not even looked at
+    assert worker.current() is first
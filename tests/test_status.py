@@ -0,0 +1,117 @@
+"""Status checks: paging, per-minute rollups and retention"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import database
+from database import STATUS_QUERY_LIMIT, get_pool
+from retention import prune_once
+from streaming import NEXT_CURSOR_HEADER
+
+NOW = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def insert(rows) -> None:
+    """Write (id, client_name, datetime) rows the way the batcher does"""
+    with get_pool().connection() as conn:
+        database._insert_status_checks(conn, [(id, name, at.isoformat()) for id, name, at in rows])
+
+
+def ids(response) -> list:
+    assert response.status_code == 200
+    return [check["id"] for check in response.json()]
+
+
+def test_the_newest_checks_come_first_past_the_default_limit(client):
+    insert((f"old-{i}", "probe", NOW - timedelta(seconds=i + 1)) for i in range(STATUS_QUERY_LIMIT + 5))
+    latest = client.post("/api/status", json={"client_name": "probe"}).json()
+
+    response = client.get("/api/status")
+
+    assert len(response.json()) == STATUS_QUERY_LIMIT
+    assert ids(response)[:2] == [latest["id"], "old-0"]
+    assert NEXT_CURSOR_HEADER in response.headers
+
+
+def test_pages_follow_the_cursor_through_equal_timestamps(client):
+    insert((f"check-{i:02d}", "a" if i % 2 else "b", NOW - timedelta(minutes=i // 4)) for i in range(10))
+
+    pages, cursor = [], None
+    while True:
+        response = client.get("/api/status", params={"limit": 3, **({"cursor": cursor} if cursor else {})})
+        pages.append(ids(response))
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    only_a = ids(client.get("/api/status", params={"client_name": "a", "limit": 100}))
+
+    flat = sum(pages, [])
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert sorted(flat) == [f"check-{i:02d}" for i in range(10)]
+    # Newest first; within a timestamp, latest written first
+    assert flat[:4] == ["check-03", "check-02", "check-01", "check-00"]
+    assert only_a == ["check-03", "check-01", "check-07", "check-05", "check-09"]
+
+
+def test_time_bounds_are_half_open(client):
+    insert((f"m{i}", "probe", NOW + timedelta(minutes=i)) for i in range(5))
+
+    response = client.get("/api/status", params={
+        "since": (NOW + timedelta(minutes=1)).isoformat(), "until": (NOW + timedelta(minutes=3)).isoformat(),
+    })
+
+    assert ids(response) == ["m2", "m1"]
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "WyJrIiwxLDJd"])
+def test_invalid_cursors_are_rejected(client, cursor):
+    assert client.get("/api/status", params={"cursor": cursor}).status_code == 400
+
+
+def test_rollups_count_checks_per_bucket(client):
+    insert([
+        ("1", "a", NOW), ("2", "a", NOW + timedelta(seconds=30)), ("3", "b", NOW + timedelta(seconds=59)),
+        ("4", "a", NOW + timedelta(minutes=5)), ("5", "a", NOW + timedelta(hours=1)),
+    ])
+
+    by_minute = client.get("/api/status/aggregate", params={"client_name": "a"}).json()
+    by_hour = client.get("/api/status/aggregate", params={"bucket": "hour"}).json()
+    bounded = client.get("/api/status/aggregate", params={
+        "bucket": "day", "since": NOW.isoformat(), "until": (NOW + timedelta(minutes=5)).isoformat(),
+    }).json()
+
+    assert [(r["bucket"], r["count"]) for r in by_minute] == [
+        ("2025-03-01T12:00", 2), ("2025-03-01T12:05", 1), ("2025-03-01T13:00", 1),
+    ]
+    assert [(r["bucket"], r["client_name"], r["count"]) for r in by_hour] == [
+        ("2025-03-01T12", "a", 3), ("2025-03-01T12", "b", 1), ("2025-03-01T13", "a", 1),
+    ]
+    assert [(r["client_name"], r["count"]) for r in bounded] == [("a", 2), ("b", 1)]
+
+
+def test_retention_prunes_checks_and_rollups_separately(client, monkeypatch):
+    monkeypatch.setenv("STATUS_RETENTION_DAYS", "30")
+    monkeypatch.setenv("STATUS_ROLLUP_RETENTION_DAYS", "365")
+    insert([(f"recent-{i}", "a", NOW - timedelta(days=1, minutes=i)) for i in range(3)])
+    insert([(f"month-{i}", "a", NOW - timedelta(days=40, minutes=i)) for i in range(5)])
+    insert([(f"year-{i}", "a", NOW - timedelta(days=400, minutes=i)) for i in range(2)])
+
+    removed = client.portal.call(prune_once, NOW)
+    again = client.portal.call(prune_once, NOW)
+
+    assert removed == (7, 2)
+    assert again == (0, 0)
+    assert sorted(ids(client.get("/api/status"))) == ["recent-0", "recent-1", "recent-2"]
+    # Rollups outlive the raw checks
+    assert sum(r["count"] for r in client.get("/api/status/aggregate").json()) == 8
+
+
+def test_pruning_runs_in_chunks_until_nothing_is_left(client):
+    insert((f"old-{i}", "a", NOW - timedelta(minutes=i)) for i in range(5))
+
+    removed = client.portal.call(lambda: database.prune_status_checks(NOW.isoformat(), chunk_size=2))
+
+    # The cutoff itself is kept
+    assert removed == (4, 0)
+    assert ids(client.get("/api/status")) == ["old-0"]